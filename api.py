@@ -0,0 +1,392 @@
+import collections
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import requests
+from python_graphql_client import GraphqlClient as BaseGraphqlClient
+
+import metrics
+
+
+# Directory to save every response to, keyed by endpoint and query, set with record_to() or GRAPHQL_RECORD
+record_dir = os.getenv("GRAPHQL_RECORD")
+
+# Directory to answer queries from instead of the network, set with replay_from() or GRAPHQL_REPLAY
+replay_dir = os.getenv("GRAPHQL_REPLAY")
+
+# Optional function (endpoint, query) -> response used instead of the network, e.g. a synthetic league
+transport = None
+
+# GraphQL endpoint -> URL to send its queries to instead, e.g. a local stand-in server
+endpoints = {}
+
+# Seconds a single attempt at a query may wait to connect, and between bytes of the answer
+timeout = float(os.getenv("GRAPHQL_TIMEOUT", 5))
+
+# Seconds a whole call may take, retries included
+deadline = float(os.getenv("GRAPHQL_DEADLINE", 12))
+
+# Extra attempts for queries that failed with a connection error, a timeout or a 5xx. Mutations are never retried
+retries = int(os.getenv("GRAPHQL_RETRIES", 2))
+
+# Retry n waits a random time up to backoff * 2 ** n seconds, so clients that failed together don't retry together
+backoff = float(os.getenv("GRAPHQL_BACKOFF", 0.25))
+
+# Failed calls in a row that open an endpoint's circuit, and seconds it stays open before a single trial call
+breaker_failures = int(os.getenv("GRAPHQL_BREAKER_FAILURES", 5))
+breaker_cooldown = float(os.getenv("GRAPHQL_BREAKER_COOLDOWN", 30))
+
+# Last good responses kept to answer with, marked stale, while an endpoint is failing
+stale_entries = int(os.getenv("GRAPHQL_STALE_ENTRIES", 512))
+
+
+class ApiUnavailable(Exception):
+    """
+    Raised when a call failed, or was not made because the endpoint's circuit is open, and there is no earlier response
+    to answer with
+    """
+    pass
+
+
+def query_name(query: str):
+    """
+    :param query: GraphQL query
+    :return: Name of the first field queried, e.g. "findManyMatch", used to label metrics
+    """
+    match = re.search(r"\{\s*(\w+)", query)
+
+    if match is None:
+        return "query"
+
+    return match.group(1)
+
+
+def is_mutation(query: str):
+    """
+    :param query: GraphQL query
+    :return: Whether the query is a mutation, which isn't safe to retry or answer from an earlier response
+    """
+    return re.match(r"\s*mutation\b", query) is not None
+
+
+def query_key(endpoint: str, query: str):
+    """
+    :param endpoint: GraphQL endpoint
+    :param query: GraphQL query
+    :return: Hash of the endpoint and query. Whitespace is ignored so reformatting a query doesn't change it
+    """
+    return hashlib.sha1((endpoint + " ".join(query.split())).encode()).hexdigest()
+
+
+def fixture_path(directory: str, endpoint: str, query: str):
+    """
+    :param directory: Fixture directory
+    :param endpoint: GraphQL endpoint
+    :param query: GraphQL query
+    :return: File path of the recorded response for the query. Whitespace is ignored so reformatting a query doesn't
+    invalidate its fixture.
+    """
+    return os.path.join(directory, f"{query_name(query)}-{query_key(endpoint, query)}.json")
+
+
+def record_to(directory: str):
+    """
+    Saves every response to a directory from now on
+
+    :param directory: Fixture directory, or None to stop recording
+    :return: Nothing
+    """
+    global record_dir
+    record_dir = directory
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+
+
+def replay_from(directory: str):
+    """
+    Answers every query from recorded responses from now on. Queries without a recorded response raise
+    FileNotFoundError.
+
+    :param directory: Fixture directory, or None to go back to the network
+    :return: Nothing
+    """
+    global replay_dir
+    replay_dir = directory
+
+
+class CircuitBreaker:
+    """
+    Tracks failed calls to one endpoint. After enough failures in a row the circuit opens and calls fail straight away
+    instead of waiting on an endpoint that is down. Once the cooldown has passed a single trial call is let through,
+    which closes the circuit if it works and opens it again if it doesn't.
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 30):
+        """
+        :param failures: Failed calls in a row that open the circuit
+        :param cooldown: Seconds the circuit stays open before a trial call
+        """
+        self.failures = failures
+        self.cooldown = cooldown
+
+        self._failed = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        :return: "closed", "open", or "half-open" while the cooldown has passed and a trial call can be made
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return "open"
+
+            return "half-open"
+
+    def allow(self):
+        """
+        :return: Whether a call can be made now. Only one call is allowed while half-open, until it succeeds or fails
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+
+            self._trial = True
+
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failed = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+
+            if self._trial or (self._opened_at is None and self._failed >= self.failures):
+                if not self._trial:
+                    metrics.count("graphql.breaker_opened")
+
+                self._opened_at = time.monotonic()
+
+            self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# query_key -> last good response, least recently stored first
+_last_good = collections.OrderedDict()
+_last_good_lock = threading.Lock()
+
+# Budget of the calls made in the current context, see call_budget
+_budget = contextvars.ContextVar("graphql_budget", default=None)
+
+
+def breaker(endpoint: str):
+    """
+    :param endpoint: GraphQL endpoint
+    :return: The endpoint's CircuitBreaker
+    """
+    with _breakers_lock:
+        if endpoint not in _breakers.keys():
+            _breakers[endpoint] = CircuitBreaker(breaker_failures, breaker_cooldown)
+
+        return _breakers[endpoint]
+
+
+def reset():
+    """
+    Closes every circuit and forgets every stored response
+
+    :return: Nothing
+    """
+    with _breakers_lock:
+        _breakers.clear()
+
+    with _last_good_lock:
+        _last_good.clear()
+
+
+class CallBudget:
+    """
+    Time left for every GraphQL call made while building one response, and whether any of them was answered with stale
+    data
+    """
+
+    def __init__(self, seconds: float):
+        """
+        :param seconds: Seconds the calls may take together
+        """
+        self.expires_at = time.monotonic() + seconds
+        self.stale = False
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+
+@contextlib.contextmanager
+def call_budget(seconds: float):
+    """
+    Limits the time every GraphQL call made in the block may take together, so a response built from many calls has a
+    bounded latency however slow the API is. Calls past the budget fail straight away, and are answered with stale data
+    when there is any. The budget follows the current context, so set it in the thread that makes the calls.
+
+    :param seconds: Seconds the calls may take together
+    :return: CallBudget, with stale set if any call was answered with stale data
+    """
+    budget = CallBudget(seconds)
+    token = _budget.set(budget)
+
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def _retryable(error: Exception):
+    # Client errors will fail the same way again, everything else from requests is the network or the server
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+
+    return isinstance(error, requests.RequestException)
+
+
+class GraphqlClient(BaseGraphqlClient):
+    """
+    Drop in replacement for python_graphql_client.GraphqlClient that records the latency of every query, and can
+    record responses to or replay them from fixture files.
+
+    Calls are limited to the module deadline, or the current call_budget if that ends first, and queries that fail with
+    a connection error, a timeout or a 5xx are retried with jittered backoff. When a query still fails, or its endpoint's
+    circuit is open, it is answered with the last good response to the same query, with "stale" set to True.
+    """
+
+    def _fetch(self, query: str, seconds: float, variables: dict = None, operation_name: str = None,
+               headers: dict = None, **kwargs):
+        if transport is not None:
+            return transport(self.endpoint, query)
+
+        body = {"query": query}
+
+        if variables is not None:
+            body["variables"] = variables
+
+        if operation_name is not None:
+            body["operationName"] = operation_name
+
+        result = requests.post(endpoints.get(self.endpoint, self.endpoint), json=body,
+                               headers={**self.headers, **(headers or {})},
+                               **{**self.options, "timeout": seconds, **kwargs})
+
+        result.raise_for_status()
+
+        return result.json()
+
+    def _call(self, query: str, *args, **kwargs):
+        budget = _budget.get()
+        expires_at = time.monotonic() + deadline
+
+        if budget is not None:
+            expires_at = min(expires_at, budget.expires_at)
+
+        attempts = 1 if is_mutation(query) else retries + 1
+        circuit = breaker(self.endpoint)
+
+        for attempt in range(attempts):
+            remaining = expires_at - time.monotonic()
+
+            if remaining <= 0:
+                raise ApiUnavailable(f"Out of time for {query_name(query)} on {self.endpoint}")
+
+            if not circuit.allow():
+                raise ApiUnavailable(f"Circuit open for {self.endpoint}")
+
+            try:
+                data = self._fetch(query, min(timeout, remaining), *args, **kwargs)
+            except Exception as e:
+                if not _retryable(e):
+                    # The endpoint answered, so it is up
+                    circuit.success()
+                    raise
+
+                circuit.failure()
+
+                if attempt == attempts - 1:
+                    raise
+
+                metrics.count("graphql.retries")
+
+                # Full jitter, without sleeping past the deadline
+                time.sleep(min(random.uniform(0, backoff * 2 ** attempt), max(expires_at - time.monotonic(), 0)))
+                continue
+
+            circuit.success()
+
+            return data
+
+    def execute(self, query: str, *args, **kwargs):
+        with metrics.timed("graphql." + query_name(query)):
+            if replay_dir is not None:
+                with open(fixture_path(replay_dir, self.endpoint, query)) as f:
+                    return json.load(f)
+
+            key = query_key(self.endpoint, query)
+
+            try:
+                data = self._call(query, *args, **kwargs)
+            except (ApiUnavailable, requests.RequestException) as e:
+                if is_mutation(query) or (isinstance(e, requests.RequestException) and not _retryable(e)):
+                    raise
+
+                with _last_good_lock:
+                    data = _last_good.get(key)
+
+                if data is None:
+                    metrics.count("graphql.unavailable")
+
+                    if isinstance(e, ApiUnavailable):
+                        raise
+
+                    raise ApiUnavailable(f"{query_name(query)} failed on {self.endpoint}: {e}") from e
+
+                metrics.count("graphql.stale")
+
+                budget = _budget.get()
+
+                if budget is not None:
+                    budget.stale = True
+
+                return {**data, "stale": True}
+
+            if not is_mutation(query):
+                with _last_good_lock:
+                    _last_good[key] = data
+                    _last_good.move_to_end(key)
+
+                    while len(_last_good) > stale_entries:
+                        _last_good.popitem(last=False)
+
+            if record_dir is not None:
+                with open(fixture_path(record_dir, self.endpoint, query), "w") as f:
+                    json.dump(data, f)
+
+            return data
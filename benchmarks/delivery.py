@@ -0,0 +1,87 @@
+"""
+Benchmark of scouting report delivery against a local Discord webhook stand-in. Sends one report with a synthetic
+PDF attached per team, first one message at a time like the old blocking webhook calls, then through a WebhookQueue,
+and checks every message arrived whole.
+
+Usage (from the repository root):
+    python -m benchmarks.delivery --teams 16 --webhooks 4 --pdf-mb 8 --latency 0.2
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import metrics
+from benchmarks.webhook_stand_in import WebhookStandIn
+from delivery import WebhookQueue
+
+
+def run(args, workers: int, pdf_path: str):
+    """
+    Sends every report through a queue with the given number of workers
+
+    :return: Dictionary with seconds taken, peak KB allocated, and the stand-in's rate limited and failed requests
+    """
+    with WebhookStandIn(args.limit, args.window, args.latency, args.fail_rate) as stand_in:
+        metrics.reset()
+        tracemalloc.start()
+        start = time.perf_counter()
+
+        with WebhookQueue(workers=workers, backoff=0.05) as queue:
+            deliveries = [
+                queue.submit(stand_in.webhook_url(team % args.webhooks), f"Team {team} Scouting Report",
+                             [(pdf_path, f"Team {team}.pdf")])
+                for team in range(args.teams)
+            ]
+
+            for delivery in deliveries:
+                delivery.result()
+
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        delivered = [message for messages in stand_in.messages.values() for message in messages]
+        size = os.path.getsize(pdf_path)
+
+        if len(delivered) != args.teams or any(received < size for content, received in delivered):
+            raise Exception("Not every report was delivered whole")
+
+        return {"seconds": seconds, "peak_kb": peak / 1024, "rate_limited": stand_in.rate_limited,
+                "failed": stand_in.failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webhook delivery against a local stand-in")
+    parser.add_argument("--teams", type=int, default=16, help="Reports to send")
+    parser.add_argument("--webhooks", type=int, default=4, help="Webhooks the reports are spread over")
+    parser.add_argument("--pdf-mb", type=float, default=8, help="Size of the attached PDF in MB")
+    parser.add_argument("--workers", type=int, default=4, help="WebhookQueue workers")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stand-in takes per request")
+    parser.add_argument("--limit", type=int, default=5, help="Requests per webhook per rate limit window")
+    parser.add_argument("--window", type=float, default=2.0, help="Rate limit window in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="Fraction of requests answered with a 500")
+    args = parser.parse_args()
+
+    metrics.enable()
+
+    with tempfile.TemporaryDirectory() as folder:
+        pdf_path = os.path.join(folder, "report.pdf")
+
+        with open(pdf_path, "wb") as f:
+            f.write(os.urandom(int(args.pdf_mb * 1024 * 1024)))
+
+        print("Mode          Seconds   Peak KB    429s   500s")
+
+        for mode, workers in (("one at a time", 1), ("queue", args.workers)):
+            result = run(args, workers, pdf_path)
+
+            seconds = str(round(result["seconds"], 2))
+            peak = str(round(result["peak_kb"], 1))
+            print(mode + " " * (14 - len(mode)) + seconds + " " * (10 - len(seconds)) + peak + " " * (11 - len(peak)) +
+                  str(result["rate_limited"]) + " " * (7 - len(str(result["rate_limited"]))) + str(result["failed"]))
+
+
+if __name__ == "__main__":
+    main()
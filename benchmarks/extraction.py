@@ -0,0 +1,69 @@
+"""
+Memory benchmark of tick extraction for demos of increasing length and sampling density. Compares parsing every
+sampled tick at once with parsing a few rounds at a time, using a synthetic parser in place of demoparser2.
+
+Usage (from the repository root):
+    python -m benchmarks.extraction --chunk 4
+"""
+import argparse
+import time
+import tracemalloc
+
+import visualization
+from benchmarks.synthetic import SyntheticDemoParser
+from rounds import RoundIndex
+
+
+TEAM = "BenchmarkTeam"
+
+# (rounds, samples per round)
+DEMOS = [(24, 1), (30, 1), (54, 1), (24, 16), (54, 16)]
+
+
+def measure(parser: SyntheticDemoParser, rounds: RoundIndex, rounds_per_chunk: int, sample_seconds: tuple):
+    """
+    Extracts the team's positions once
+
+    :return: Tuple of seconds taken, peak KB allocated and positions extracted
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    positions = visualization.extract_round_positions(parser, rounds, TEAM, "benchmark", rounds_per_chunk,
+                                                      sample_seconds)
+
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return seconds, peak / 1024, len(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked tick extraction memory")
+    parser.add_argument("--chunk", type=int, default=visualization.ROUNDS_PER_CHUNK, help="Rounds per chunk")
+    parser.add_argument("--map", default="de_mirage", help="Map to generate positions on")
+    args = parser.parse_args()
+
+    print("Rounds  Samples  Positions  Whole demo (KB)  Chunked (KB)  Whole demo (ms)  Chunked (ms)")
+
+    for round_count, samples in DEMOS:
+        demo = SyntheticDemoParser(TEAM, args.map, round_count)
+        rounds = RoundIndex.from_parser(demo)
+        sample_seconds = tuple(12 + i * 0.5 for i in range(samples))
+
+        whole_seconds, whole_kb, count = measure(demo, rounds, None, sample_seconds)
+        chunk_seconds, chunk_kb, chunk_count = measure(demo, rounds, args.chunk, sample_seconds)
+
+        if chunk_count != count:
+            raise Exception("Chunked extraction found a different number of positions")
+
+        columns = [str(round_count), str(samples), str(count), str(round(whole_kb)), str(round(chunk_kb)),
+                   str(round(whole_seconds * 1000, 1)), str(round(chunk_seconds * 1000, 1))]
+        widths = [8, 9, 11, 17, 14, 17, 0]
+
+        print("".join(column + " " * (width - len(column)) for column, width in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
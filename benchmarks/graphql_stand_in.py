@@ -0,0 +1,148 @@
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GraphqlStandIn:
+    """
+    Minimal local GraphQL server that answers queries with a function like a synthetic league, and injects faults: a
+    fraction of requests are slow, hang without answering, or fail with a 503, and the whole server can be taken down.
+    Every path is one endpoint, install it with api.endpoints.update(stand_in.endpoints(...)).
+    """
+
+    def __init__(self, answer, latency: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 2.0,
+                 hang_rate: float = 0.0, hang_seconds: float = 30.0, fail_rate: float = 0.0, seed: int = 0):
+        """
+        :param answer: Function (endpoint, query) -> response dictionary, e.g. a SyntheticLeague
+        :param latency: Seconds every request takes to answer
+        :param slow_rate: Fraction of requests that take slow_latency seconds longer
+        :param slow_latency: Extra seconds a slow request takes
+        :param hang_rate: Fraction of requests that are never answered, the connection is closed after hang_seconds
+        :param hang_seconds: Seconds a hanging request holds the connection open
+        :param fail_rate: Fraction of requests answered with a 503
+        :param seed: Random seed for faults
+        """
+        self.answer = answer
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+
+        # Answer every request with a 503 while set
+        self.down = False
+
+        self.requests = 0
+        self.slow = 0
+        self.hung = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.address = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def url(self, endpoint: str):
+        """
+        :param endpoint: GraphQL endpoint to stand in for
+        :return: URL of the endpoint on the stand-in
+        """
+        return f"{self.address}/{urllib.parse.quote(endpoint, safe='')}"
+
+    def endpoints(self, endpoints: list):
+        """
+        :param endpoints: GraphQL endpoints to stand in for
+        :return: Dictionary of endpoints to their URLs on the stand-in, for api.endpoints
+        """
+        return {endpoint: self.url(endpoint) for endpoint in endpoints}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def fault(self):
+        """
+        Picks the fault for a request
+
+        :return: "down", "hang", "fail", "slow" or None
+        """
+        with self._lock:
+            self.requests += 1
+
+            if self.down:
+                self.failed += 1
+                return "down"
+
+            roll = self.rng.random()
+
+            if roll < self.hang_rate:
+                self.hung += 1
+                return "hang"
+
+            if roll < self.hang_rate + self.fail_rate:
+                self.failed += 1
+                return "fail"
+
+            if roll < self.hang_rate + self.fail_rate + self.slow_rate:
+                self.slow += 1
+                return "slow"
+
+        return None
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fault = stand_in.fault()
+
+                if fault == "hang":
+                    stand_in._stopping.wait(stand_in.hang_seconds)
+                    self.close_connection = True
+                    return
+
+                if stand_in.latency or fault == "slow":
+                    time.sleep(stand_in.latency + (stand_in.slow_latency if fault == "slow" else 0))
+
+                if fault in ("down", "fail"):
+                    self.respond(503, {"errors": [{"message": "Service Unavailable"}]})
+                    return
+
+                endpoint = urllib.parse.unquote(self.path[1:])
+                self.respond(200, stand_in.answer(endpoint, json.loads(body)["query"]))
+
+            def respond(self, status: int, data: dict):
+                body = json.dumps(data).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
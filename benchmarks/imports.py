@@ -0,0 +1,66 @@
+"""
+Measures the import time and memory of each entry point in a fresh interpreter, and checks that stats-only imports
+never load the plotting, pdf, S3, parser or Discord stacks. Exits with a non-zero status if one does.
+
+Usage (from the repository root):
+    python -m benchmarks.imports
+"""
+import json
+import subprocess
+import sys
+
+
+# Modules that must only be imported on first use
+HEAVY_MODULES = ["matplotlib", "imageio", "demoparser2", "pdfkit", "pypdf", "jinja2", "boto3", "botocore",
+                 "discord_webhook", "discord"]
+
+ENTRY_POINTS = ["bot", "main", "visualization", "league", "match_store"]
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start
+import json
+print(json.dumps({"seconds": seconds, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "modules": sorted(set(m.split(".")[0] for m in sys.modules))}))
+"""
+
+
+def measure(module: str):
+    """
+    Imports a module in a fresh interpreter
+
+    :param module: Module name
+    :return: Dictionary with import seconds, max RSS in KB and the top level modules loaded
+    """
+    result = subprocess.run([sys.executable, "-c", PROBE % module], capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout)
+
+
+def main():
+    failed = False
+
+    print("Module          Import (ms)  Max RSS (MB)  Heavy modules loaded")
+
+    for module in ENTRY_POINTS:
+        result = measure(module)
+
+        heavy = [m for m in HEAVY_MODULES if m in result["modules"]]
+        ms = str(round(result["seconds"] * 1000, 1))
+        rss = str(round(result["max_rss_kb"] / 1024, 1))
+
+        print(module + " " * (16 - len(module)) + ms + " " * (13 - len(ms)) + rss + " " * (14 - len(rss)) +
+              (", ".join(heavy) if heavy else "-"))
+
+        if heavy:
+            failed = True
+
+    if failed:
+        print("Heavy modules were imported eagerly")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
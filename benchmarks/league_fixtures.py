@@ -0,0 +1,157 @@
+import random
+import re
+
+
+TIERS = ["Recruit", "Prospect", "Contender", "Challenger", "Elite", "Premier"]
+
+MAPS = ["de_ancient", "de_anubis", "de_inferno", "de_vertigo", "de_dust2", "de_mirage", "de_nuke"]
+
+PLAYER_STATS = ["rating", "adr", "kast", "hs", "tradesR", "multiR", "adp", "odaR", "odr", "tRatio", "util", "ef",
+                "fAssists", "utilDmg", "awpR", "savesR", "saveRate", "clutchR", "cl_1", "cl_2", "cl_3", "cl_4", "cl_5"]
+
+
+class SyntheticLeague:
+    """
+    Deterministic fake league that answers the core and stats API queries made by bot.py. Install it as
+    api.transport to run the report builders, and record fixtures, without network access.
+    """
+
+    def __init__(self, seasons: list, tiers: list, franchises: int = 16, match_days: int = 10, seed: int = 0):
+        """
+        :param seasons: Season numbers to generate
+        :param tiers: Tier names to generate, every franchise has a team in each
+        :param franchises: Number of franchises
+        :param match_days: Regular season match days per season, two maps each
+        :param seed: Random seed
+        """
+        rng = random.Random(seed)
+
+        self.franchises = []
+        self.teams = {}
+        self.players = {}
+        self.tier_matches = {}
+        self.histories = {}
+        self.bans = {}
+
+        next_id = 1
+
+        for f in range(franchises):
+            franchise = {"prefix": f"F{f}", "name": f"Franchise {f}", "teams": []}
+
+            for tier in tiers:
+                team = {"id": str(next_id), "name": f"Franchise {f} {tier}", "tier": {"name": tier}}
+                next_id += 1
+
+                franchise["teams"].append(team)
+                self.teams[team["name"]] = {"id": team["id"], "prefix": franchise["prefix"], "tier": tier,
+                                            "franchise": franchise["name"],
+                                            "players": [{"name": f"F{f}{tier[:3]}{p}", "type": "SIGNED"}
+                                                        for p in range(5)] +
+                                                       [{"name": f"F{f}{tier[:3]}Sub", "type": "TEMP_SIGNED"}]}
+
+            self.franchises.append(franchise)
+
+        match_id = 1
+
+        for season in seasons:
+            for tier in tiers:
+                names = [f"Franchise {f} {tier}" for f in range(franchises)]
+                self.tier_matches[(season, tier)] = []
+
+                for match_day in range(1, match_days + 1):
+                    rng.shuffle(names)
+
+                    for i in range(0, len(names) - 1, 2):
+                        away, home = self.teams[names[i]], self.teams[names[i + 1]]
+                        stats = []
+
+                        for map_number in (1, 2):
+                            map_name = rng.choice(MAPS)
+                            winner = rng.choice([away, home])
+                            loser_score = rng.randint(0, 11)
+                            away_score = 13 if winner is away else loser_score
+                            home_score = 13 if winner is home else loser_score
+
+                            self.tier_matches[(season, tier)].append({
+                                "id": match_id, "mapName": map_name,
+                                "teamStats": [{"name": names[i], "score": away_score},
+                                              {"name": names[i + 1], "score": home_score}],
+                                "players": [p["name"] for p in away["players"][:5] + home["players"][:5]],
+                            })
+                            match_id += 1
+
+                            stats.append({"awayScore": away_score, "homeScore": home_score, "mapName": map_name,
+                                          "mapNumber": map_number,
+                                          "winner": {"franchise": {"prefix": winner["prefix"]}}})
+
+                        core_match = {
+                            "id": str(match_id),
+                            "away": {"name": names[i], "franchise": {"prefix": away["prefix"]}},
+                            "home": {"name": names[i + 1], "franchise": {"prefix": home["prefix"]}},
+                            "scheduledDate": f"2024-{1 + match_day // 4:02d}-{1 + match_day % 28:02d}T20:00:00",
+                            "location": "", "demoUrl": "",
+                            "stats": stats,
+                            "matchDay": {"number": f"M{match_day:02d}"},
+                            "lobby": {"mapBans": [
+                                {"team": {"name": names[i + number % 2], "id": self.teams[names[i + number % 2]]["id"]},
+                                 "map": MAPS[number], "number": number} for number in range(1, 6)
+                            ]},
+                        }
+
+                        for team in (away, home):
+                            self.histories.setdefault((season, tier, team["franchise"]), []).append(core_match)
+                            self.bans.setdefault((season, team["id"]), []).append(core_match)
+
+        self.player_teams = {p["name"]: name for name, team in self.teams.items() for p in team["players"]}
+        self.rng = rng
+
+    def __call__(self, endpoint: str, query: str):
+        """
+        Answers a query the way the core or stats API would
+
+        :param endpoint: GraphQL endpoint
+        :param query: GraphQL query
+        :return: Response dictionary
+        """
+        season = re.search(r"season: (?:\{equals: )?(\d+)", query)
+        season = int(season.group(1)) if season is not None else None
+
+        if "franchises(" in query:
+            return {"data": {"franchises": self.franchises}}
+
+        if "playerSeasonStats" in query:
+            return {"data": {"playerSeasonStats": {stat: self.rng.random() * 2 for stat in PLAYER_STATS}}}
+
+        if "findManyMatch" in query and "matchStats: {some" in query:
+            player = re.search(r'name: \{equals: "([^"]+)"\}', query).group(1)
+            team = self.teams[self.player_teams[player]]
+
+            return {"data": {"findManyMatch": [
+                {"mapName": m["mapName"], "matchStats": [{"rating": self.rng.random() * 2}]}
+                for m in self.tier_matches.get((season, team["tier"]), []) if player in m["players"]
+            ]}}
+
+        if "findManyMatch" in query:
+            tier = re.search(r"tier: \{equals: (\w+)\}", query).group(1)
+            after = re.search(r"id: \{gt: (\d+)\}", query)
+            after = int(after.group(1)) if after is not None else 0
+
+            return {"data": {"findManyMatch": [
+                {"id": m["id"], "mapName": m["mapName"], "teamStats": m["teamStats"]}
+                for m in self.tier_matches.get((season, tier), []) if m["id"] > after
+            ]}}
+
+        if "teamName:" in query:
+            team = self.teams[re.search(r'teamName: "([^"]+)"', query).group(1)]
+            return {"data": {"team": {"id": team["id"], "players": team["players"]}}}
+
+        if "teamId:" in query:
+            team_id = re.search(r'teamId: "([^"]+)"', query).group(1)
+            return {"data": {"matches": self.bans.get((season, team_id), [])}}
+
+        if "franchise:" in query:
+            tier = re.search(r'tier: "([^"]+)"', query).group(1)
+            franchise = re.search(r'franchise: "([^"]+)"', query).group(1)
+            return {"data": {"matches": self.histories.get((season, tier, franchise), [])}}
+
+        raise ValueError(f"Synthetic league can't answer query: {query}")
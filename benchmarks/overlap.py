@@ -0,0 +1,92 @@
+"""
+Benchmark of the staged download -> extract -> parse -> aggregate pipeline in visualization.get_map_tick_data. Demos
+are served from a local S3 stand-in with added latency and parsed by a synthetic parser with added parse time, then
+the wall time is compared with the sum of the time spent in every stage (what running them one after another costs)
+and with the slowest stage.
+
+Usage (from the repository root):
+    python -m benchmarks.overlap --demos 12 --latency 0.3 --parse-delay 0.1
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+
+import metrics
+from benchmarks.s3_stand_in import S3StandIn
+from benchmarks.synthetic import SyntheticDemoParser, synthetic_demos
+from ingest import DemoManifest
+
+
+TEAM = "BenchmarkTeam"
+
+STAGES = ["download", "extract", "parse", "aggregate"]
+
+
+def run(args, stand_in: S3StandIn, workers: dict):
+    """
+    Runs get_map_tick_data once
+
+    :return: Tuple of wall seconds and dictionary of stage names to busy seconds summed over the stage's workers
+    """
+    import visualization
+
+    maps = itertools.cycle(args.maps)
+    lock = threading.Lock()
+
+    def parser_factory(filename):
+        with lock:
+            map_name = next(maps)
+
+        return SyntheticDemoParser(TEAM, map_name, args.rounds, delay=args.parse_delay)
+
+    metrics.reset()
+    start = time.perf_counter()
+
+    visualization.get_map_tick_data(TEAM, args.season, parser_factory, workers["download"], workers["extract"],
+                                    workers["parse"], args.queue_size, DemoManifest(None), round_dir=None)
+
+    seconds = time.perf_counter() - start
+    histograms = metrics.snapshot()["histograms"]
+
+    return seconds, {stage: histograms["stage." + stage]["sum"] for stage in STAGES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the overlapped demo pipeline")
+    parser.add_argument("--season", type=int, default=13)
+    parser.add_argument("--demos", type=int, default=12, help="Number of demos")
+    parser.add_argument("--demo-mb", type=float, default=5, help="Size of each zipped demo in MB")
+    parser.add_argument("--rounds", type=int, default=24, help="Rounds per demo")
+    parser.add_argument("--maps", nargs="+", default=["de_mirage", "de_inferno", "de_nuke"])
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds the stand-in takes per download")
+    parser.add_argument("--parse-delay", type=float, default=0.1, help="Seconds per synthetic parse_ticks call")
+    parser.add_argument("--queue-size", type=int, default=2, help="Demos that can wait between two stages")
+    args = parser.parse_args()
+
+    metrics.enable()
+
+    objects = synthetic_demos(args.season, TEAM, args.demos, args.demo_mb, args.maps)
+
+    with S3StandIn(objects=objects, latency=args.latency) as stand_in:
+        os.environ["SPACES_ENDPOINT"] = stand_in.endpoint
+
+        print("Workers (dl/ex/parse)  Wall (s)  Sum of stages (s)  Slowest stage (s)")
+
+        for download, extract, parse in ((1, 1, 1), (4, 2, 2), (8, 2, 4)):
+            workers = {"download": download, "extract": extract, "parse": parse}
+            seconds, stages = run(args, stand_in, workers)
+
+            label = f"{download}/{extract}/{parse}"
+            wall = str(round(seconds, 2))
+            total = str(round(sum(stages.values()), 2))
+            # A stage with several workers takes its busy time divided between them
+            slowest = max(stages[stage] / workers.get(stage, 1) for stage in STAGES)
+
+            print(label + " " * (23 - len(label)) + wall + " " * (10 - len(wall)) + total + " " * (19 - len(total)) +
+                  str(round(slowest, 2)))
+
+
+if __name__ == "__main__":
+    main()
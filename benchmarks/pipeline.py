@@ -0,0 +1,175 @@
+"""
+End-to-end benchmark of the download -> extract -> aggregate -> render -> pdf pipeline, without network access or
+real demos. Demos are random zipped blobs served from a local S3 stand-in, and the parse stage is replaced with
+synthetic tick DataFrames since random bytes can't be parsed.
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline --demos 10 --demo-mb 50 --rounds 24 --runs 3
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+
+import metrics
+from benchmarks.s3_stand_in import S3StandIn
+from benchmarks.synthetic import synthetic_demos, synthetic_tick_data
+from rounds import RoundIndex
+
+
+RESULTS_PATH = os.path.join("benchmarks", "results.jsonl")
+
+TEAM = "BenchmarkTeam"
+
+
+def run_once(args, stand_in: S3StandIn):
+    """
+    Runs every pipeline stage once
+
+    :return: Dictionary of stage names to total seconds spent in the stage
+    """
+    import main
+    import visualization
+
+    metrics.reset()
+
+    # Download and extract
+    os.environ["SPACES_ENDPOINT"] = stand_in.endpoint
+    os.environ.setdefault("SPACES_REGION", "nyc3")
+    os.environ.setdefault("SPACES_KEY", "benchmark")
+    os.environ.setdefault("SPACES_SECRET", "benchmark")
+
+    demo_dir, _ = main.fetch_demos(args.season, TEAM)
+    shutil.rmtree(demo_dir)
+
+    # Aggregate synthetic parser output
+    position_info = {}
+
+    for i in range(args.demos):
+        map_name = args.maps[i % len(args.maps)]
+        freeze_time_end_ticks, freeze_time_end_data, tick_data = synthetic_tick_data(
+            TEAM, map_name, args.rounds, seed=i
+        )
+
+        tick_data = tick_data[tick_data["team_clan_name"] == TEAM]
+
+        with metrics.timed("aggregate"):
+            rounds = RoundIndex.from_ticks(map_name, 64, freeze_time_end_ticks, freeze_time_end_data)
+            positions = visualization.get_round_positions(rounds, tick_data, demo=str(i))
+            visualization.merge_positions(position_info, map_name, positions)
+
+    # Render and pdf
+    if not args.skip_render:
+        os.makedirs("temp-images", exist_ok=True)
+        os.makedirs("temp-pdfs", exist_ok=True)
+
+        players = []
+
+        for map_name in position_info.keys():
+            with metrics.timed("render"):
+                players = visualization.get_map_buy_pictures(map_name, position_info[map_name], players,
+                                                               fast=args.fast)
+
+            if args.skip_pdf:
+                continue
+
+            try:
+                with metrics.timed("pdf"):
+                    visualization.to_pdf(TEAM, map_name, "Benchmark", {}, os.path.join("temp-pdfs", "benchmark.pdf"))
+            except OSError as e:
+                print(f"Skipping pdf stage, wkhtmltopdf is not available: {e}")
+                args.skip_pdf = True
+
+    histograms = metrics.snapshot()["histograms"]
+
+    if args.skip_pdf:
+        histograms.pop("pdf", None)
+
+    return {stage: round(histograms[stage]["sum"], 4) for stage in histograms.keys()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(previous: dict, current: dict):
+    """
+    Prints each stage's time next to the last recorded run with the same configuration
+
+    :param previous: Last recorded result, or None
+    :param current: Current result
+    :return: Nothing
+    """
+    print("Stage          Time (s)  Previous  Change")
+
+    for stage, seconds in current["stages"].items():
+        line = stage + " " * (15 - len(stage)) + str(seconds) + " " * (10 - len(str(seconds)))
+
+        if previous is not None and stage in previous["stages"].keys() and previous["stages"][stage] > 0:
+            change = round((seconds - previous["stages"][stage]) / previous["stages"][stage] * 100, 1)
+            line += str(previous["stages"][stage]) + " " * (10 - len(str(previous["stages"][stage])))
+            line += ("+" if change > 0 else "") + str(change) + "%"
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the demo pipeline against a local S3 stand-in")
+    parser.add_argument("--season", type=int, default=13)
+    parser.add_argument("--demos", type=int, default=10, help="Number of synthetic demos")
+    parser.add_argument("--demo-mb", type=float, default=20, help="Size of each synthetic demo in MB")
+    parser.add_argument("--rounds", type=int, default=24, help="Rounds per synthetic demo")
+    parser.add_argument("--maps", nargs="+", default=["de_inferno", "de_mirage", "de_ancient"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--skip-render", action="store_true")
+    parser.add_argument("--skip-pdf", action="store_true")
+    parser.add_argument("--fast", action="store_true", help="Render with the raster compositor instead of matplotlib")
+    args = parser.parse_args()
+
+    config = {
+        "demos": args.demos, "demo_mb": args.demo_mb, "rounds": args.rounds, "maps": args.maps,
+        "render": not args.skip_render, "pdf": not args.skip_pdf,
+    }
+
+    # Only part of the configuration when set, so earlier results still compare
+    if args.fast:
+        config["fast"] = True
+
+    metrics.enable()
+
+    with S3StandIn(objects=synthetic_demos(args.season, TEAM, args.demos, args.demo_mb, args.maps)) as stand_in:
+        runs = [run_once(args, stand_in) for _ in range(args.runs)]
+
+    # Keep the best run of each stage, the least noisy number for comparisons
+    stages = {stage: min(run.get(stage, 0) for run in runs) for stage in runs[0].keys()}
+
+    result = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": config,
+        "stages": stages,
+    }
+
+    previous = None
+
+    if os.path.isfile(RESULTS_PATH):
+        with open(RESULTS_PATH) as f:
+            for line in f:
+                record = json.loads(line)
+
+                if record["config"] == config:
+                    previous = record
+
+    compare(previous, result)
+
+    with open(RESULTS_PATH, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of rendering one report panel, with matplotlib (get_single_plot and savefig at 300 dpi like
+get_map_buy_pictures) and with the raster compositor on a cached base raster. Positions and grenades are random points
+on the map.
+
+Usage (from the repository root):
+    python -m benchmarks.rendering --maps de_inferno de_nuke --players 5 --rounds 24 --runs 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import raster
+import visualization
+
+
+def synthetic_panel(map_name: str, players: int, rounds: int, grenades: int, seed: int = 0):
+    """
+    :return: Tuple of player positions and grenades, shaped like PositionStore.by_player and main.get_scouting_info
+    """
+    rng = np.random.default_rng(seed)
+    data = visualization.MAP_DATA[map_name]
+    scale = data["scale"]
+
+    def point(count: int):
+        x = data["pos_x"] + rng.uniform(100, 924, count) * scale
+        y = data["pos_y"] - rng.uniform(100, 924, count) * scale
+        z = rng.choice([data.get("z_cutoff", 0) - 100, data.get("z_cutoff", 0) + 100], count)
+        return x, y, z
+
+    positions = {f"Player {p}": point(rounds) for p in range(players)}
+
+    throws = {}
+
+    for p in range(players):
+        x1, y1, z1 = point(grenades)
+        x2, y2, z2 = point(grenades)
+        types = rng.choice(list(visualization.GRENADE_COLORS.keys()), grenades)
+
+        throws[f"Player {p}"] = [
+            {"type": t, "X1": a, "Y1": b, "Z1": c, "X2": d, "Y2": e, "Z2": f}
+            for t, a, b, c, d, e, f in zip(types, x1, y1, z1, x2, y2, z2)
+        ]
+
+    return positions, throws
+
+
+def time_matplotlib(map_name: str, positions: dict, grenades: dict, path: str):
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    visualization.get_single_plot(map_name, positions, [], grenades)
+    plt.savefig(path, bbox_inches="tight", dpi=300)
+    plt.close()
+
+    return time.perf_counter() - start
+
+
+def time_raster(map_name: str, positions: dict, grenades: dict, path: str, width: int):
+    start = time.perf_counter()
+    image, _ = raster.render_panel(map_name, positions, [], grenades, width)
+    raster.save_panel(image, path)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark matplotlib and raster panel rendering")
+    parser.add_argument("--maps", nargs="+", default=["de_inferno", "de_nuke"])
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=24, help="Positions per player")
+    parser.add_argument("--grenades", type=int, default=10, help="Grenades per player")
+    parser.add_argument("--width", type=int, default=raster.PANEL_WIDTH, help="Raster panel width in pixels")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print("Map          Matplotlib (ms)  Raster first (ms)  Raster (ms)")
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "panel.png")
+
+        for map_name in args.maps:
+            positions, grenades = synthetic_panel(map_name, args.players, args.rounds, args.grenades)
+
+            slow = min(time_matplotlib(map_name, positions, grenades, path) for _ in range(args.runs))
+
+            # The first raster panel of a map also builds its base raster
+            raster.base_raster.cache_clear()
+            first = time_raster(map_name, positions, grenades, path, args.width)
+            fast = min(time_raster(map_name, positions, grenades, path, args.width) for _ in range(args.runs))
+
+            slow, first, fast = (str(round(seconds * 1000, 1)) for seconds in (slow, first, fast))
+            print(map_name + " " * (13 - len(map_name)) + slow + " " * (17 - len(slow)) + first +
+                  " " * (19 - len(first)) + fast)
+
+
+if __name__ == "__main__":
+    main()
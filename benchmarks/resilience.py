@@ -0,0 +1,157 @@
+"""
+Benchmark of /scout latency against a local GraphQL stand-in that injects slow, hanging and failing requests. Builds
+the response for every team without the resilience settings (no timeout, retries, circuit breaker or stale answers),
+then with them, then with them during a full outage, and prints the latency percentiles and failures of each.
+
+Usage (from the repository root):
+    python -m benchmarks.resilience --builds 60 --hang-rate 0.01 --fail-rate 0.05 --slow-rate 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import api
+import bot
+import metrics
+from benchmarks.graphql_stand_in import GraphqlStandIn
+from benchmarks.league_fixtures import SyntheticLeague, TIERS
+
+ENDPOINTS = ["https://core.csconfederation.com/graphql", "https://stats.csconfederation.com/graphql"]
+
+
+def configure(guarded: bool, args):
+    """
+    Sets the api and bot resilience settings, or turns them off
+
+    :param guarded: Whether to use the resilience settings
+    :return: Nothing
+    """
+    api.reset()
+
+    if guarded:
+        api.timeout = args.timeout
+        api.deadline = args.deadline
+        api.retries = args.retries
+        api.breaker_failures = args.breaker_failures
+        api.breaker_cooldown = args.breaker_cooldown
+        api.stale_entries = 512
+        bot.response_deadline = args.budget
+    else:
+        api.timeout = args.hang_seconds * 2
+        api.deadline = float("inf")
+        api.retries = 0
+        api.breaker_failures = float("inf")
+        api.stale_entries = 0
+        bot.response_deadline = float("inf")
+
+
+def percentile(values: list, share: float):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def run(teams: list, season: int, builds: int):
+    """
+    Builds the /scout response for teams in turn, bypassing the response cache
+
+    :return: Dictionary with the seconds each build took, the builds that failed, and those answered with stale data
+    """
+    seconds = []
+    failed = 0
+    stale = 0
+
+    for i in range(builds):
+        prefix, tier = teams[i % len(teams)]
+
+        start = time.perf_counter()
+
+        try:
+            message = bot.get_scout_response(prefix, tier, season, refresh=True)
+            stale += message.startswith(bot.STALE_NOTE)
+        except Exception:
+            failed += 1
+
+        seconds.append(time.perf_counter() - start)
+
+    return {"seconds": seconds, "failed": failed, "stale": stale}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /scout latency against a faulty GraphQL stand-in")
+    parser.add_argument("--builds", type=int, default=60, help="/scout responses to build per run")
+    parser.add_argument("--teams", type=int, default=8, help="Teams to cycle through")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds every request takes")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fraction of requests that are slow")
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="Extra seconds a slow request takes")
+    parser.add_argument("--hang-rate", type=float, default=0.01, help="Fraction of requests that never answer")
+    parser.add_argument("--hang-seconds", type=float, default=10.0, help="Seconds a hanging request is held open")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="Fraction of requests answered with a 503")
+    parser.add_argument("--timeout", type=float, default=1.0, help="api.timeout")
+    parser.add_argument("--deadline", type=float, default=2.5, help="api.deadline")
+    parser.add_argument("--retries", type=int, default=2, help="api.retries")
+    parser.add_argument("--breaker-failures", type=int, default=5, help="api.breaker_failures")
+    parser.add_argument("--breaker-cooldown", type=float, default=5.0, help="api.breaker_cooldown")
+    parser.add_argument("--budget", type=float, default=4.0, help="bot.response_deadline")
+    args = parser.parse_args()
+
+    league = SyntheticLeague([15], TIERS[2:4])
+    season = 15
+    teams = [(team["prefix"], team["tier"]) for team in league.teams.values()][:args.teams]
+
+    metrics.enable()
+
+    with GraphqlStandIn(league, args.latency, args.slow_rate, args.slow_latency, args.hang_rate, args.hang_seconds,
+                        args.fail_rate) as stand_in:
+        api.endpoints.update(stand_in.endpoints(ENDPOINTS))
+
+        faults = stand_in.hang_rate, stand_in.fail_rate, stand_in.slow_rate
+        stand_in.hang_rate = stand_in.fail_rate = stand_in.slow_rate = 0
+
+        configure(False, args)
+        bot.directory.snapshot_path = os.path.join(tempfile.mkdtemp(prefix="resilience-"), "directory_snapshot.json")
+        bot.directory.refresh()
+        bot.league_indexes.refresh_interval = 0
+
+        results = {"healthy": run(teams, season, len(teams))}
+
+        stand_in.hang_rate, stand_in.fail_rate, stand_in.slow_rate = faults
+        results["faulty"] = run(teams, season, args.builds)
+
+        # Healthy pass with the settings on, so every query has a last good response to fall back on
+        configure(True, args)
+        stand_in.hang_rate = stand_in.fail_rate = stand_in.slow_rate = 0
+        run(teams, season, len(teams))
+        stand_in.hang_rate, stand_in.fail_rate, stand_in.slow_rate = faults
+        metrics.reset()
+
+        results["faulty, guarded"] = run(teams, season, args.builds)
+
+        stand_in.down = True
+        results["outage, guarded"] = run(teams, season, args.builds)
+        breakers = {endpoint: api.breaker(endpoint).state for endpoint in ENDPOINTS}
+
+        counters = metrics.snapshot()["counters"]
+
+    api.endpoints.clear()
+
+    print("Run              Builds  p50 (s)  p99 (s)  max (s)  Failed  Stale")
+
+    for name, result in results.items():
+        seconds = result["seconds"]
+        row = [str(len(seconds)), str(round(percentile(seconds, 0.5), 3)), str(round(percentile(seconds, 0.99), 3)),
+               str(round(max(seconds), 3)), str(result["failed"]), str(result["stale"])]
+        widths = [8, 9, 9, 9, 8, 6]
+
+        print(name + " " * (17 - len(name)) + "".join(value + " " * (width - len(value))
+                                                      for value, width in zip(row, widths)))
+
+    print(f"\nStand-in: {stand_in.requests} requests, {stand_in.slow} slow, {stand_in.hung} hung, "
+          f"{stand_in.failed} failed")
+    print("Guarded counters: " + ", ".join(f"{name}={value}" for name, value in sorted(counters.items())
+                                           if name.startswith(("graphql.", "scout."))))
+    print("Circuits after the outage: " + ", ".join(f"{endpoint} {state}" for endpoint, state in breakers.items()))
+
+
+if __name__ == "__main__":
+    main()
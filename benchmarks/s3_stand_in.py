@@ -0,0 +1,111 @@
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+class S3StandIn:
+    """
+    Minimal local S3 compatible server for a single bucket, supporting ListObjects (v1 and v2, with prefix and
+    delimiter) and GetObject. Good enough for boto3 clients pointed at it with endpoint_url / SPACES_ENDPOINT.
+    """
+
+    def __init__(self, bucket: str = "cscdemos", objects: dict = None, latency: float = 0.0):
+        """
+        :param bucket: Bucket name to serve
+        :param objects: Dictionary of object keys to bytes
+        :param latency: Seconds every GetObject takes to answer, to stand in for a remote endpoint
+        """
+        self.bucket = bucket
+        self.objects = objects if objects is not None else {}
+        self.latency = latency
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def list_xml(self, prefix: str, delimiter: str):
+        contents = []
+        common_prefixes = []
+
+        for key in sorted(self.objects.keys()):
+            if not key.startswith(prefix):
+                continue
+
+            if delimiter and delimiter in key[len(prefix):]:
+                common_prefix = prefix + key[len(prefix):].split(delimiter)[0] + delimiter
+
+                if common_prefix not in common_prefixes:
+                    common_prefixes.append(common_prefix)
+
+                continue
+
+            contents.append(
+                f"<Contents><Key>{escape(key)}</Key><LastModified>2024-01-01T00:00:00.000Z</LastModified>"
+                f"<ETag>\"0\"</ETag><Size>{len(self.objects[key])}</Size><StorageClass>STANDARD</StorageClass>"
+                f"</Contents>"
+            )
+
+        prefixes = "".join(f"<CommonPrefixes><Prefix>{escape(p)}</Prefix></CommonPrefixes>" for p in common_prefixes)
+
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{self.bucket}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(contents)}</KeyCount>"
+            f"<MaxKeys>1000</MaxKeys><IsTruncated>false</IsTruncated>{''.join(contents)}{prefixes}"
+            "</ListBucketResult>"
+        ).encode()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                parts = urllib.parse.unquote(url.path).lstrip("/").split("/", 1)
+                params = urllib.parse.parse_qs(url.query)
+
+                if parts[0] != stand_in.bucket:
+                    self.send_error(404)
+                    return
+
+                if len(parts) == 1 or parts[1] == "":
+                    body = stand_in.list_xml(params.get("prefix", [""])[0], params.get("delimiter", [""])[0])
+                    content_type = "application/xml"
+                elif parts[1] in stand_in.objects.keys():
+                    if stand_in.latency:
+                        time.sleep(stand_in.latency)
+
+                    body = stand_in.objects[parts[1]]
+                    content_type = "application/zip"
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Type", "application/xml")
+                    self.end_headers()
+                    self.wfile.write(b"<Error><Code>NoSuchKey</Code></Error>")
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
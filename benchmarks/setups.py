@@ -0,0 +1,84 @@
+"""
+Benchmark of setup clustering on several seasons of synthetic rounds. Each round is one of a few planted 5 player
+setups with every player moved a little and shuffled, so the clustering can be checked against the planted setups.
+
+Usage (from the repository root):
+    python -m benchmarks.setups --rounds 5000 --setups 5 --map de_inferno
+"""
+import argparse
+import time
+
+import numpy as np
+
+from positions import BUY_TYPES, SIDES, PositionStore
+from setups import find_setups
+from visualization import MAP_DATA
+
+
+def synthetic_store(map_name: str, rounds: int, setups: int, jitter: float, seed: int = 0):
+    """
+    :return: Tuple of a PositionStore with one T side Full Buy position per player per round, and the planted setup of
+    each round
+    """
+    rng = np.random.default_rng(seed)
+    current_map_data = MAP_DATA[map_name]
+    scale = current_map_data["scale"]
+
+    # Radar pixel positions of each setup's 5 players
+    templates = rng.uniform(100, 924, (setups, 5, 2))
+    planted = rng.integers(setups, size=rounds)
+
+    radar = templates[planted] + rng.normal(0, jitter, (rounds, 5, 2))
+    radar = np.take_along_axis(radar, rng.permuted(np.tile(np.arange(5), (rounds, 1)), axis=1)[:, :, None], axis=1)
+
+    store = PositionStore(rounds * 5)
+    demos_per_season = 20
+
+    for demo in range(int(np.ceil(rounds / 24))):
+        selected = slice(demo * 24 * 5, (demo + 1) * 24 * 5)
+        points = radar.reshape(-1, 2)[selected]
+
+        x = current_map_data["pos_x"] + points[:, 0] * scale
+        y = current_map_data["pos_y"] - points[:, 1] * scale
+        z = np.full(len(points), current_map_data.get("z_cutoff", 0) + 100)
+
+        store.append(x, y, z, np.full(len(points), SIDES.index("TERRORIST")),
+                     np.full(len(points), BUY_TYPES.index("Full Buy")),
+                     np.tile([f"Player {p}" for p in range(5)], len(points) // 5),
+                     f"s{demo // demos_per_season}/demo{demo}", np.repeat(np.arange(len(points) // 5), 5))
+
+    return store, planted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark setup clustering")
+    parser.add_argument("--map", default="de_inferno")
+    parser.add_argument("--rounds", type=int, default=5000, help="Rounds, 24 per demo")
+    parser.add_argument("--setups", type=int, default=5, help="Planted setups")
+    parser.add_argument("--jitter", type=float, default=15, help="Radar pixels each player is moved by")
+    args = parser.parse_args()
+
+    store, planted = synthetic_store(args.map, args.rounds, args.setups, args.jitter)
+
+    start = time.perf_counter()
+    setups = find_setups(store, args.map, "TERRORIST", "Full Buy", k=args.setups)
+    seconds = time.perf_counter() - start
+
+    # Share of the rounds in each found setup that were planted as its most common planted setup
+    demo_codes = {demo: code for code, demo in enumerate(store.demos)}
+    correct = 0
+
+    for setup in setups:
+        members = [demo_codes[demo] * 24 + number - 1 for demo, number in setup["members"]]
+        correct += np.bincount(planted[members]).max()
+
+    print(f"Rounds      {args.rounds}")
+    print(f"Seconds     {round(seconds, 3)}")
+    print(f"Purity      {round(correct / args.rounds * 100, 1)}%")
+
+    for setup in setups:
+        print(f"  {round(setup['share'] * 100, 1)}% of rounds, e.g. {setup['representative']}")
+
+
+if __name__ == "__main__":
+    main()
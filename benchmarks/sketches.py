@@ -0,0 +1,72 @@
+"""
+Benchmark of cross-season trend reports, re-aggregating every demo's positions against summing stored per-demo
+sketches. Demos come from the synthetic parser, so the re-aggregate numbers leave out downloading and real parsing and
+understate the difference.
+
+Usage (from the repository root):
+    python -m benchmarks.sketches --seasons 3 --demos 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import visualization
+from benchmarks.synthetic import SyntheticDemoParser
+from rounds import RoundIndex
+from sketches import Sketch, SketchStore, get_trends
+
+
+TEAM = "BenchmarkTeam"
+
+
+def demos(args):
+    """
+    :return: Generator of (season, demo name, parser) for every synthetic demo
+    """
+    for season in range(args.seasons):
+        for i in range(args.demos):
+            map_name = args.maps[i % len(args.maps)]
+            yield season, f"s{season}/demo{i}", SyntheticDemoParser(TEAM, map_name, args.rounds,
+                                                                    seed=season * 1000 + i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trend reports from sketches")
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--demos", type=int, default=20, help="Demos per season")
+    parser.add_argument("--rounds", type=int, default=24, help="Rounds per demo")
+    parser.add_argument("--maps", nargs="+", default=["de_inferno", "de_mirage", "de_nuke"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = SketchStore(folder)
+
+        # Parse and aggregate every demo, as a trend report needs without sketches, and save the sketches
+        start = time.perf_counter()
+
+        for season, name, demo in demos(args):
+            rounds = RoundIndex.from_parser(demo)
+            positions = visualization.extract_round_positions(demo, rounds, TEAM, name)
+            store.save(TEAM, season, Sketch.from_demo(TEAM, name, rounds, positions))
+
+        aggregate = time.perf_counter() - start
+
+        start = time.perf_counter()
+        trends = get_trends(store, TEAM, list(range(args.seasons)))
+        summed = time.perf_counter() - start
+
+        size = sum(os.path.getsize(os.path.join(path, name))
+                   for path, _, names in os.walk(folder) for name in names)
+
+    print(f"Demos                {args.seasons * args.demos}")
+    print(f"Re-aggregate (s)     {round(aggregate, 3)}")
+    print(f"Sum sketches (s)     {round(summed, 3)}")
+    print(f"Sketches KB          {round(size / 1024, 1)} ({round(size / 1024 / (args.seasons * args.demos), 1)} per demo)")
+
+    for map_name, rows in trends.items():
+        print(map_name + "  " + "  ".join(f"s{row['season']} {round(row['round_win_rate'] * 100)}%" for row in rows))
+
+
+if __name__ == "__main__":
+    main()
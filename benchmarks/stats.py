@@ -0,0 +1,113 @@
+"""
+Benchmark of the bot.py report builders against recorded GraphQL fixtures for leagues of increasing size. Fixtures are
+recorded once from a synthetic league, then every builder is timed, and its allocations measured, in replay mode.
+
+Usage (from the repository root):
+    python -m benchmarks.stats --teams 8
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import api
+import bot
+from benchmarks.league_fixtures import SyntheticLeague, TIERS
+from league import LeagueIndexes
+
+
+SIZES = {
+    "1 tier": {"seasons": [15], "tiers": TIERS[2:3]},
+    "all tiers": {"seasons": [15], "tiers": TIERS},
+    "3 seasons": {"seasons": [13, 14, 15], "tiers": TIERS},
+}
+
+BUILDERS = {
+    "get_team_opponent_stats": lambda team, prefix, tier, season: bot.get_team_opponent_stats(team, season, tier),
+    "get_team_players_map_stats": lambda team, prefix, tier, season: bot.get_team_players_map_stats(team, season),
+    "get_team_match_history": lambda team, prefix, tier, season: bot.get_team_match_history(
+        prefix, season, tier, bot.directory.franchise_names),
+    "get_team_advanced_summary_stats": lambda team, prefix, tier, season: bot.get_team_advanced_summary_stats(
+        prefix, season, tier),
+}
+
+
+def run_builders(teams: list, season: int):
+    """
+    Runs every builder for every team
+
+    :return: Dictionary of builder names to (mean seconds per call, mean peak KB allocated per call)
+    """
+    results = {}
+
+    for name, builder in BUILDERS.items():
+        # Start every builder from a cold league index so they are comparable between sizes
+        bot.league_indexes = LeagueIndexes()
+
+        start = time.perf_counter()
+        for team, prefix, tier in teams:
+            builder(team, prefix, tier, season)
+        seconds = (time.perf_counter() - start) / len(teams)
+
+        bot.league_indexes = LeagueIndexes()
+
+        peak = 0
+        for team, prefix, tier in teams:
+            tracemalloc.start()
+            builder(team, prefix, tier, season)
+            peak += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        results[name] = (seconds, peak / len(teams) / 1024)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report builders against recorded fixtures")
+    parser.add_argument("--teams", type=int, default=8, help="Teams to build reports for per league size")
+    parser.add_argument("--fixtures", default=None, help="Directory to keep the recorded fixtures in")
+    args = parser.parse_args()
+
+    fixtures_root = args.fixtures or tempfile.mkdtemp(prefix="stats-fixtures-")
+
+    print("Size           Builder                           ms / call   peak KB / call")
+
+    for size, league_config in SIZES.items():
+        league = SyntheticLeague(league_config["seasons"], league_config["tiers"])
+        season = league_config["seasons"][-1]
+
+        teams = [(name, team["prefix"], team["tier"]) for name, team in league.teams.items()][:args.teams]
+
+        fixture_dir = os.path.join(fixtures_root, size.replace(" ", "_"))
+
+        # Record fixtures from the synthetic league
+        api.transport = league
+        api.record_to(fixture_dir)
+
+        bot.directory.snapshot_path = os.path.join(fixture_dir, "directory_snapshot.json")
+        bot.directory.refresh()
+
+        for builder in BUILDERS.values():
+            bot.league_indexes = LeagueIndexes()
+
+            for team, prefix, tier in teams:
+                builder(team, prefix, tier, season)
+
+        api.transport = None
+        api.record_to(None)
+
+        # Replay them for the measurements
+        api.replay_from(fixture_dir)
+
+        for name, (seconds, peak_kb) in run_builders(teams, season).items():
+            ms = str(round(seconds * 1000, 2))
+            print(size + " " * (15 - len(size)) + name + " " * (34 - len(name)) + ms + " " * (12 - len(ms)) +
+                  str(round(peak_kb, 1)))
+
+        api.replay_from(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import io
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+MAP_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "map_data.json")
+
+with open(MAP_DATA_PATH) as f:
+    MAP_DATA = json.load(f)
+
+
+def synthetic_demo_zip(size_mb: float, member_name: str = "demo.dem"):
+    """
+    Creates a zipped demo of random (incompressible, like a real compressed demo) bytes
+
+    :param size_mb: Size of the demo in MB
+    :param member_name: Name of the demo inside the archive
+    :return: Bytes of the zip archive
+    """
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zipped:
+        zipped.writestr(member_name, os.urandom(int(size_mb * 1024 * 1024)))
+
+    return buffer.getvalue()
+
+
+def synthetic_demos(season: int, team: str, count: int, size_mb: float, maps: list):
+    """
+    Creates zipped demos named like the ones in the demos bucket
+
+    :param season: CSC Season number
+    :param team: Team name, without spaces
+    :param count: Number of demos
+    :param size_mb: Size of each demo in MB
+    :param maps: Maps to cycle through
+    :return: Dictionary of object keys to zip bytes
+    """
+    objects = {}
+
+    for i in range(count):
+        map_name = maps[i % len(maps)]
+        key = f"s{season:02d}/M{i + 1:02d}/mid{i}-{team}-vs-Opponent{i}-{map_name}.dem.zip"
+        objects[key] = synthetic_demo_zip(size_mb, f"mid{i}-{map_name}.dem")
+
+    return objects
+
+
+def random_positions(rng, map_name: str, count: int):
+    """
+    :return: X, Y and Z arrays of random positions inside the radar image of the map
+    """
+    current_map_data = MAP_DATA[map_name]
+    size = 1024 * current_map_data["scale"]
+
+    x = current_map_data["pos_x"] + rng.random(count) * size
+    y = current_map_data["pos_y"] - rng.random(count) * size
+    z = rng.normal(0, 100, count)
+
+    return x, y, z
+
+
+def synthetic_tick_data(team: str, map_name: str, rounds: int = 24, players: int = 5, tick_rate: int = 64,
+                        seed: int = 0):
+    """
+    Creates DataFrames shaped like the demoparser2 output used by visualization.get_map_tick_data, for both teams of a
+    demo
+
+    :param team: Team clan name
+    :param map_name: Name of the map
+    :param rounds: Number of rounds
+    :param players: Players per team
+    :param tick_rate: Tick rate of the demo
+    :param seed: Random seed
+    :return: Tuple of freeze time end ticks, freeze time end DataFrame and tick DataFrame 12 seconds later
+    """
+    rng = np.random.default_rng(seed)
+
+    freeze_time_end_ticks = [1000 + i * tick_rate * 120 for i in range(rounds)]
+
+    rows = rounds * players * 2
+
+    ticks = np.repeat(freeze_time_end_ticks, players * 2)
+    names = np.tile([f"{team} {p}" for p in range(players)] + [f"Opponent {p}" for p in range(players)], rounds)
+    clans = np.tile([team] * players + ["Opponent"] * players, rounds)
+
+    # Teams switch sides after 12 rounds
+    first_half = np.repeat(np.arange(rounds) < 12, players * 2)
+    team_side = np.tile([True] * players + [False] * players, rounds)
+    sides = np.where(first_half == team_side, "TERRORIST", "CT")
+
+    freeze_time_end_data = pd.DataFrame({
+        "tick": ticks,
+        "name": names,
+        "current_equip_value": rng.integers(200, 6000, rows),
+        "team_name": sides,
+        "team_clan_name": clans,
+    })
+
+    x, y, z = random_positions(rng, map_name, rows)
+
+    tick_data = pd.DataFrame({
+        "tick": ticks + tick_rate * 12,
+        "name": names,
+        "X": x,
+        "Y": y,
+        "Z": z,
+        "team_name": sides,
+        "team_clan_name": clans,
+    })
+
+    return freeze_time_end_ticks, freeze_time_end_data, tick_data
+
+
+class SyntheticDemoParser:
+    """
+    Stand-in for demoparser2.DemoParser that generates the events and ticks used by visualization.py for a demo of
+    any length, without a real demo. Ticks are generated on request, so memory use follows what is asked for like the
+    real parser.
+    """
+
+    def __init__(self, team: str, map_name: str, rounds: int = 24, players: int = 5, tick_rate: int = 64,
+                 seed: int = 0, delay: float = 0.0, paths: bool = False):
+        """
+        :param team: Team clan name
+        :param map_name: Name of the map
+        :param rounds: Number of rounds, including overtime
+        :param players: Players per team
+        :param tick_rate: Tick rate of the demo
+        :param seed: Random seed
+        :param delay: Seconds every parse_ticks call takes, to stand in for reading through a real demo
+        :param paths: Move every player in a straight line from a random spot each round and then hold still, instead
+        of putting them somewhere random on every tick
+        """
+        self.paths = paths
+        self.delay = delay
+        self.team = team
+        self.map_name = map_name
+        self.rounds = rounds
+        self.players = players
+        self.tick_rate = tick_rate
+        self.seed = seed
+
+        self.freeze_time_end_ticks = [1000 + i * tick_rate * 120 for i in range(rounds)]
+
+    def parse_header(self):
+        return {"map_name": self.map_name}
+
+    def parse_event(self, event: str):
+        if event == "round_freeze_end":
+            return pd.DataFrame({"tick": self.freeze_time_end_ticks})
+
+        if event == "round_end":
+            rng = np.random.default_rng(self.seed)
+
+            return pd.DataFrame({"tick": [tick + self.tick_rate * 100 for tick in self.freeze_time_end_ticks],
+                                 "winner": rng.choice(["T", "CT"], self.rounds)})
+
+        raise ValueError(f"Synthetic parser has no {event} events")
+
+    def parse_grenades(self, extra: list = None):
+        """
+        :param extra: Thrower fields to add, from name, team_clan_name and team_name
+        :return: DataFrame with a few points of every grenade's flight, one grenade per player in the first 20 seconds
+        of each round
+        """
+        rng = np.random.default_rng([self.seed, 2])
+        per_tick = self.players * 2
+        flight = 4
+
+        throw_ticks = np.array(self.freeze_time_end_ticks)[:, None] + rng.integers(0, self.tick_rate * 20,
+                                                                                    (self.rounds, per_tick))
+        ticks = (throw_ticks.ravel()[:, None] + np.arange(flight)[None, :] * self.tick_rate // 2).ravel()
+        # One row per player per round, in the same order as the throws
+        players = self.parse_ticks(extra or [], self.freeze_time_end_ticks)
+        x, y, z = random_positions(rng, self.map_name, len(ticks))
+
+        columns = {
+            "X": x,
+            "Y": y,
+            "Z": z,
+            "tick": ticks,
+            "thrower_steamid": np.repeat(np.tile(np.arange(per_tick, dtype=np.int64) + 76561190000000000, self.rounds),
+                                         flight),
+            "grenade_type": np.repeat(rng.choice(["SmokeGrenade", "Flashbang", "HeGrenade", "Molotov", "Decoy"],
+                                                 self.rounds * per_tick), flight),
+            "grenade_entity_id": np.repeat(np.arange(self.rounds * per_tick), flight),
+        }
+
+        for field in extra or []:
+            columns[field] = np.repeat(players[field].to_numpy(), flight)
+
+        return pd.DataFrame(columns)
+
+    def parse_ticks(self, fields: list, ticks: list):
+        if self.delay:
+            time.sleep(self.delay)
+
+        ticks = np.asarray(ticks)
+        rng = np.random.default_rng([self.seed, len(ticks), int(ticks.sum()) if len(ticks) else 0])
+
+        per_tick = self.players * 2
+        rows = len(ticks) * per_tick
+
+        round_index = np.searchsorted(self.freeze_time_end_ticks, ticks, side="right") - 1
+        team_side = np.tile([True] * self.players + [False] * self.players, len(ticks))
+        first_half = np.repeat(round_index < 12, per_tick)
+
+        columns = {
+            "tick": np.repeat(ticks, per_tick),
+            "steamid": np.tile(np.arange(per_tick, dtype=np.int64) + 76561190000000000, len(ticks)),
+            "name": np.tile([f"{self.team} {p}" for p in range(self.players)] +
+                            [f"Opponent {p}" for p in range(self.players)], len(ticks)),
+        }
+
+        if self.paths:
+            x, y, z = self.path_positions(ticks)
+        else:
+            x, y, z = random_positions(rng, self.map_name, rows)
+
+        generators = {
+            "X": lambda: x,
+            "Y": lambda: y,
+            "Z": lambda: z,
+            "team_name": lambda: np.where(first_half == team_side, "TERRORIST", "CT"),
+            "team_clan_name": lambda: np.tile([self.team] * self.players + ["Opponent"] * self.players, len(ticks)),
+            "current_equip_value": lambda: rng.integers(200, 6000, rows),
+            "name": lambda: columns["name"],
+        }
+
+        for field in fields:
+            columns[field] = generators[field]()
+
+        return pd.DataFrame(columns)
+
+    def path_positions(self, ticks):
+        """
+        :param ticks: Array of ticks
+        :return: X, Y and Z arrays of every player's position at each tick, running at 250 units a second from a random
+        start in a random direction for a random 5 to 20 seconds of each round, then holding still
+        """
+        per_tick = self.players * 2
+        round_index = np.maximum(np.searchsorted(self.freeze_time_end_ticks, ticks, side="right") - 1, 0)
+        rng = np.random.default_rng([self.seed, 1])
+
+        # One start, direction and running time per player per round
+        start_x, start_y, start_z = random_positions(rng, self.map_name, self.rounds * per_tick)
+        angle = rng.uniform(0, 2 * np.pi, self.rounds * per_tick)
+        running = rng.uniform(5, 20, self.rounds * per_tick)
+
+        track = (round_index[:, None] * per_tick + np.arange(per_tick)[None, :]).ravel()
+        seconds = np.repeat((ticks - np.asarray(self.freeze_time_end_ticks)[round_index]) / self.tick_rate, per_tick)
+        distance = 250 * np.clip(seconds, 0, running[track])
+
+        return (start_x[track] + np.cos(angle[track]) * distance, start_y[track] + np.sin(angle[track]) * distance,
+                start_z[track])
@@ -0,0 +1,75 @@
+"""
+Benchmark of movement track extraction and storage for a season of demos, using a synthetic parser whose players run
+and then hold still. Reports the samples kept after dropping stationary ones and the size of the stored tracks.
+
+Usage (from the repository root):
+    python -m benchmarks.tracks --demos 20 --rounds 24 --stride 16 --seconds 30
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import SyntheticDemoParser
+from rounds import RoundIndex
+from tracks import TrackStore, extract_tracks
+
+
+TEAM = "BenchmarkTeam"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark movement track extraction and storage")
+    parser.add_argument("--demos", type=int, default=20, help="Demos in the season")
+    parser.add_argument("--rounds", type=int, default=24, help="Rounds per demo")
+    parser.add_argument("--maps", nargs="+", default=["de_inferno", "de_mirage", "de_nuke"])
+    parser.add_argument("--seconds", type=float, default=30, help="Seconds tracked per round")
+    parser.add_argument("--stride", type=int, default=16, help="Ticks between samples")
+    parser.add_argument("--min-distance", type=float, default=16, help="Units moved for a sample to be kept")
+    parser.add_argument("--plot", action="store_true", help="Also time plotting every track of each map")
+    args = parser.parse_args()
+
+    sampled = 0
+    kept = 0
+    seconds = 0.0
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = TrackStore(folder)
+
+        for i in range(args.demos):
+            demo = SyntheticDemoParser(TEAM, args.maps[i % len(args.maps)], args.rounds, seed=i, paths=True)
+            rounds = RoundIndex.from_parser(demo)
+
+            start = time.perf_counter()
+            tracks = extract_tracks(demo, rounds, TEAM, f"demo{i}", args.seconds, args.stride, args.min_distance)
+            store.save(f"demo{i}", tracks)
+            seconds += time.perf_counter() - start
+
+            sampled += len(rounds) * 5 * (int(args.seconds * rounds.tick_rate) // args.stride + 1)
+            kept += len(tracks.points["x"])
+
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+
+        print(f"Samples taken     {sampled}")
+        print(f"Samples kept      {kept} ({round(kept / sampled * 100, 1)}%)")
+        print(f"Extract seconds   {round(seconds, 2)}")
+        print(f"Stored KB         {round(size / 1024, 1)} ({round(size / 1024 / args.demos, 1)} per demo)")
+
+        if args.plot:
+            import matplotlib
+
+            matplotlib.use("Agg")
+
+            import matplotlib.pyplot as plt
+            from tracks import get_track_plot
+
+            for map_name, tracks in store.by_map().items():
+                start = time.perf_counter()
+                get_track_plot(tracks, [], side="TERRORIST")
+                plt.savefig(os.path.join(folder, map_name + ".png"), bbox_inches="tight", dpi=100)
+                plt.close()
+                print(f"Plot {map_name}    {round((time.perf_counter() - start) * 1000, 1)} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WebhookStandIn:
+    """
+    Minimal local Discord webhook server. Every path is a webhook with its own rate limit bucket, answered with
+    Discord's X-RateLimit headers, and with a 429 and retry_after once the bucket is used up. Can also fail a fraction
+    of requests with a 500 and add latency to every request.
+    """
+
+    def __init__(self, limit: int = 5, window: float = 2.0, latency: float = 0.0, fail_rate: float = 0.0,
+                 seed: int = 0):
+        """
+        :param limit: Requests allowed per webhook per window
+        :param window: Length of a rate limit window in seconds
+        :param latency: Seconds every request takes to answer
+        :param fail_rate: Fraction of requests answered with a 500
+        :param seed: Random seed for failures
+        """
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+
+        # Webhook path -> list of (content, bytes received) for every delivered message
+        self.messages = {}
+        self.rate_limited = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def webhook_url(self, number: int):
+        """
+        :param number: Webhook number
+        :return: URL of a webhook on the stand-in
+        """
+        return f"{self.endpoint}/api/webhooks/{number}/token"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def take(self, path: str):
+        """
+        Takes a request from a webhook's bucket
+
+        :param path: Webhook path
+        :return: Tuple with the requests remaining in the window (-1 if the bucket was already used up) and the seconds
+        until the window resets
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            window_start, used = self._buckets.get(path, (now, 0))
+
+            if now - window_start >= self.window:
+                window_start, used = now, 0
+
+            reset_after = window_start + self.window - now
+
+            if used >= self.limit:
+                self.rate_limited += 1
+                return -1, reset_after
+
+            self._buckets[path] = (window_start, used + 1)
+
+            return self.limit - used - 1, reset_after
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                received = 0
+                body = b""
+
+                # Read in chunks like a real server, keeping only the start of the body for the content
+                while received < length:
+                    chunk = self.rfile.read(min(64 * 1024, length - received))
+
+                    if not chunk:
+                        break
+
+                    if len(body) < 4096:
+                        body += chunk[:4096]
+
+                    received += len(chunk)
+
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+
+                remaining, reset_after = stand_in.take(self.path)
+
+                if remaining < 0:
+                    self.respond(429, {"message": "You are being rate limited.", "retry_after": reset_after,
+                                       "global": False}, {"Retry-After": str(reset_after)})
+                    return
+
+                with stand_in._lock:
+                    failed = stand_in.rng.random() < stand_in.fail_rate
+
+                    if failed:
+                        stand_in.failed += 1
+
+                if failed:
+                    self.respond(500, {"message": "Internal Server Error"})
+                    return
+
+                content = ""
+
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    content = json.loads(body)["content"]
+                elif b"payload_json" in body:
+                    payload = body.split(b"\r\n\r\n", 1)[1].split(b"\r\n", 1)[0]
+                    content = json.loads(payload)["content"]
+
+                with stand_in._lock:
+                    stand_in.messages.setdefault(self.path, []).append((content, received))
+
+                self.respond(200, {"id": "0", "content": content},
+                             {"X-RateLimit-Limit": str(stand_in.limit), "X-RateLimit-Remaining": str(remaining),
+                              "X-RateLimit-Reset-After": str(round(reset_after, 3))})
+
+            def respond(self, status: int, data: dict, headers: dict = None):
+                body = json.dumps(data).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,81 @@
+"""
+Benchmark of zone assignment, testing every position against shapely polygons and looking positions up in a
+rasterized ZoneMask. Zones are a grid of random quadrilaterals covering the radar, so any map and zone count can be used.
+
+Usage (from the repository root):
+    python -m benchmarks.zones --map de_mirage --zones 30 --points 500000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from visualization import MAP_DATA
+from zones import NO_ZONE, ZoneMask
+
+
+def synthetic_zones(map_name: str, count: int, seed: int = 0):
+    """
+    :return: Dictionary of zone names to zones, jittered grid cells in game coordinates
+    """
+    rng = np.random.default_rng(seed)
+    current_map_data = MAP_DATA[map_name]
+    side = int(np.ceil(np.sqrt(count)))
+    cell = 1024 / side
+
+    def game(px, py):
+        return [current_map_data["pos_x"] + px * current_map_data["scale"],
+                current_map_data["pos_y"] - py * current_map_data["scale"]]
+
+    zones = {}
+
+    for i in range(count):
+        left, top = (i % side) * cell, (i // side) * cell
+        corners = [(left, top), (left + cell, top), (left + cell, top + cell), (left, top + cell)]
+        zones[f"Zone {i}"] = {"points": [game(px + rng.uniform(-5, 5), py + rng.uniform(-5, 5))
+                                         for px, py in corners]}
+
+    return zones
+
+
+def main():
+    import shapely
+
+    parser = argparse.ArgumentParser(description="Benchmark zone assignment")
+    parser.add_argument("--map", default="de_mirage")
+    parser.add_argument("--zones", type=int, default=30)
+    parser.add_argument("--points", type=int, default=500000)
+    args = parser.parse_args()
+
+    current_map_data = MAP_DATA[args.map]
+    zones = synthetic_zones(args.map, args.zones)
+
+    rng = np.random.default_rng(1)
+    x = current_map_data["pos_x"] + rng.uniform(0, 1024, args.points) * current_map_data["scale"]
+    y = current_map_data["pos_y"] - rng.uniform(0, 1024, args.points) * current_map_data["scale"]
+    z = np.zeros(args.points)
+
+    start = time.perf_counter()
+    expected = np.full(args.points, NO_ZONE)
+
+    for code, zone in enumerate(zones.values(), start=1):
+        expected[shapely.contains_xy(shapely.Polygon(zone["points"]), x, y)] = code
+
+    polygons = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mask = ZoneMask.from_zones(args.map, zones)
+    rasterize = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = mask.lookup(x, y, z)
+    lookup = time.perf_counter() - start
+
+    print(f"Polygon tests     {round(polygons * 1000, 1)} ms")
+    print(f"Rasterize         {round(rasterize * 1000, 1)} ms (once per map)")
+    print(f"Mask lookup       {round(lookup * 1000, 1)} ms")
+    print(f"Agreement         {round((codes == expected).mean() * 100, 3)}% (differences are on zone edges)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,58 @@
-import discord
-from discord import app_commands
-from discord.ext import commands
-from python_graphql_client import GraphqlClient
+import api
+from api import GraphqlClient
 from dotenv import load_dotenv
 import os
 import asyncio
 import time
 import datetime
 
+from cache import ResponseCache
+from directory import TeamDirectory
+from history import MatchHistories
+from jobs import JobQueue, JobWorkers, QueueFull
+from league import LeagueIndexes
+from match_store import MatchStore
+import metrics
+import profiling
 
-def get_team_opponent_stats(team: str, season: int, tier: str):
-    client = GraphqlClient(endpoint="https://stats.csconfederation.com/graphql")
-
-    query = """
-    query MyQuery {
-      findManyMatch(
-        where: {season: {equals: %s}, tier: {equals: %s}, matchDay: {not: {equals: ""}}, matchType: {equals: Regulation}}
-      ) {
-        teamStats {
-          name
-          score
-        }
-        mapName
-      }
-    } """ % (season, tier)
-
-    matches = client.execute(query=query)["data"]["findManyMatch"]
-
-    win_loss_stats = {}
-    team_map_opponents = {}
-
-    # Get each team's round wins and losses, and map wins and losses
-    for match in matches:
-        # Handle the first team
-        if match["teamStats"][0]["name"] not in win_loss_stats.keys():
-            win_loss_stats[match["teamStats"][0]["name"]] = {"wins": 0, "losses": 0, "easy_wins": 0, "hard_losses": 0, "close": 0, "round_wins": 0, "round_losses": 0}
-
-        win_loss_stats[match["teamStats"][0]["name"]]["round_wins"] += match["teamStats"][0]["score"]
-        win_loss_stats[match["teamStats"][0]["name"]]["round_losses"] += match["teamStats"][1]["score"]
-
-        if match["teamStats"][0]["score"] > match["teamStats"][1]["score"]:
-            win_loss_stats[match["teamStats"][0]["name"]]["wins"] += 1
-
-            if match["teamStats"][1]["score"] >= 10:
-                win_loss_stats[match["teamStats"][0]["name"]]["close"] += 1
-            else:
-                win_loss_stats[match["teamStats"][0]["name"]]["easy_wins"] += 1
-        else:
-            win_loss_stats[match["teamStats"][0]["name"]]["losses"] += 1
+# Precomputed /scout responses, filled by the warm-up task and interactive commands
+response_cache = ResponseCache()
 
-            if match["teamStats"][0]["score"] >= 10:
-                win_loss_stats[match["teamStats"][0]["name"]]["close"] += 1
-            else:
-                win_loss_stats[match["teamStats"][0]["name"]]["hard_losses"] += 1
+# Match history per team, refreshed incrementally with its rendered /matches response
+match_histories = MatchHistories()
 
-        # Handle the second team
-        if match["teamStats"][1]["name"] not in win_loss_stats.keys():
-            win_loss_stats[match["teamStats"][1]["name"]] = {"wins": 0, "losses": 0, "easy_wins": 0, "hard_losses": 0, "close": 0, "round_wins": 0, "round_losses": 0}
+# Season / tier league tables shared by every scouted team
+league_indexes = LeagueIndexes()
 
-        win_loss_stats[match["teamStats"][1]["name"]]["round_wins"] += match["teamStats"][1]["score"]
-        win_loss_stats[match["teamStats"][1]["name"]]["round_losses"] += match["teamStats"][0]["score"]
+# Franchise and team lookups, loaded from a local snapshot at startup
+directory = TeamDirectory()
 
-        if match["teamStats"][1]["score"] > match["teamStats"][0]["score"]:
-            win_loss_stats[match["teamStats"][1]["name"]]["wins"] += 1
+# Local SQLite mirror of the stats and core APIs, used instead of the APIs when set
+match_store = None
 
-            if match["teamStats"][0]["score"] >= 10:
-                win_loss_stats[match["teamStats"][1]["name"]]["close"] += 1
-            else:
-                win_loss_stats[match["teamStats"][1]["name"]]["easy_wins"] += 1
-        else:
-            win_loss_stats[match["teamStats"][1]["name"]]["losses"] += 1
+# Queued /report jobs and the worker processes that build them, set up at startup
+job_queue = None
+job_workers = None
 
-            if match["teamStats"][1]["score"] >= 10:
-                win_loss_stats[match["teamStats"][1]["name"]]["close"] += 1
-            else:
-                win_loss_stats[match["teamStats"][1]["name"]]["hard_losses"] += 1
+# Times posting a finished report is tried before giving up on it
+MAX_DELIVERY_ATTEMPTS = 10
 
-        # Add the opponent to the list of opponents for the current map
-        if match["teamStats"][0]["name"] == team or match["teamStats"][1]["name"] == team:
-            if match ["mapName"] not in team_map_opponents.keys():
-                team_map_opponents[match["mapName"]] = {"opponents": [], "wins": 0, "losses": 0, "round_wins": 0, "round_losses": 0}
+# Seconds the GraphQL calls behind one interactive response may take together
+response_deadline = 20
 
-            # Get the opponent of the team in question, if applicable
-            if match["teamStats"][0]["name"] == team:
-                team_map_opponents[match["mapName"]]["opponents"].append(match["teamStats"][1]["name"])
+INVALID_TEAM = "Invalid Team and / or Tier Name"
 
-                team_map_opponents[match["mapName"]]["round_wins"] += match["teamStats"][0]["score"]
-                team_map_opponents[match["mapName"]]["round_losses"] += match["teamStats"][1]["score"]
+STALE_NOTE = "-# The stats API is slow or down right now, some of this is from an earlier answer.\n"
 
-                if match["teamStats"][0]["score"] > match["teamStats"][1]["score"]:
-                    team_map_opponents[match["mapName"]]["wins"] += 1
-                else:
-                    team_map_opponents[match["mapName"]]["losses"] += 1
 
-            if match["teamStats"][1]["name"] == team:
-                team_map_opponents[match["mapName"]]["opponents"].append(match["teamStats"][0]["name"])
+def get_team_opponent_stats(team: str, season: int, tier: str):
+    index = league_indexes.get(season, tier)
 
-                team_map_opponents[match["mapName"]]["round_wins"] += match["teamStats"][1]["score"]
-                team_map_opponents[match["mapName"]]["round_losses"] += match["teamStats"][0]["score"]
+    win_loss_stats = index.records
+    team_map_opponents = index.map_records.get(team, {})
 
-                if match["teamStats"][1]["score"] > match["teamStats"][0]["score"]:
-                    team_map_opponents[match["mapName"]]["wins"] += 1
-                else:
-                    team_map_opponents[match["mapName"]]["losses"] += 1
+    if team not in win_loss_stats.keys():
+        return "## " + team + "\nNo regulation matches played yet\n"
 
     title = "## " + team + "\n"
     title += "**" + str(win_loss_stats[team]["wins"]) + "-" + str(win_loss_stats[team]["losses"]) + "**    "\
@@ -142,18 +92,22 @@ def get_team_opponent_stats(team: str, season: int, tier: str):
     return message
 
 
-def get_team_map_bans(team: str, season: int):
+def fetch_team_map_bans(team: str, season: int):
     client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
 
-    query = """
-    query myquery	 {
-        team(teamName: "%s") {
-            id
+    team_id = directory.team_id(team)
+
+    # Teams that are no longer active aren't in the directory
+    if team_id is None:
+        query = """
+        query myquery	 {
+            team(teamName: "%s") {
+                id
+            }
         }
-    }
-    """ % team
+        """ % team
 
-    team_id = client.execute(query=query)["data"]["team"]["id"]
+        team_id = client.execute(query=query)["data"]["team"]["id"]
 
     query = """
     query myquery	 {
@@ -171,7 +125,14 @@ def get_team_map_bans(team: str, season: int):
         }
     } """ % (season, team_id)
 
-    matches = client.execute(query=query)["data"]["matches"]
+    return client.execute(query=query)["data"]["matches"]
+
+
+def get_team_map_bans(team: str, season: int):
+    if match_store is not None:
+        matches = match_store.team_map_bans(season, team)
+    else:
+        matches = fetch_team_map_bans(team, season)
 
     ban_stats = {}
 
@@ -204,14 +165,18 @@ def get_team_map_bans(team: str, season: int):
     return message
 
 
-def get_team_players_map_stats(team: str, season: int):
+def get_team_roster(team: str):
     """
-    Queries core and stats APIs to get stats for currently rostered players on the given team
+    Gets the current roster of a team from the match store if it has been synced, otherwise from core
 
-    :param season: CSC Season number
     :param team: Team name
-    :return: Formatted string to send to discord
+    :return: List of players with name and type
     """
+    if match_store is not None:
+        players = match_store.roster(team)
+
+        if players is not None:
+            return players
 
     client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
 
@@ -221,7 +186,19 @@ def get_team_players_map_stats(team: str, season: int):
         }
         """ % ("\"" + team + "\"")
 
-    data = client.execute(query=query)["data"]["team"]["players"]
+    return client.execute(query=query)["data"]["team"]["players"]
+
+
+def get_team_players_map_stats(team: str, season: int):
+    """
+    Queries core and stats APIs to get stats for currently rostered players on the given team
+
+    :param season: CSC Season number
+    :param team: Team name
+    :return: Formatted string to send to discord
+    """
+
+    data = get_team_roster(team)
 
     active_players = []
     sub_players = []
@@ -237,6 +214,10 @@ def get_team_players_map_stats(team: str, season: int):
     player_data = {}
 
     for player in active_players:
+        if match_store is not None:
+            player_data[player] = match_store.player_matches(season, player)
+            continue
+
         query = """
                query MyQuery {
                   findManyMatch( 
@@ -311,15 +292,7 @@ def get_team_players_various_stats(team: str, season: int, stats: dict):
     :return: Formatted string to send to discord
     """
 
-    client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
-
-    query = """
-            query myquery	 {
-                team(teamName: %s){players{name, type}}
-            }
-            """ % ("\"" + team + "\"")
-
-    data = client.execute(query=query)["data"]["team"]["players"]
+    data = get_team_roster(team)
 
     active_players = []
     sub_players = []
@@ -378,34 +351,10 @@ def get_team_summary_stats(franchise: str, season: int, tier: str):
     tier = tier[0:1].upper() + tier[1:].lower()
 
     # Get team name from franchise name and tier
-    client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
-
-    query = """
-        query myquery {
-            franchises(active: true) {
-                teams {
-                    tier {
-                        name
-                    }
-                    name
-                }
-                prefix
-            }
-        }
-        """
-
-    franchises = client.execute(query=query)["data"]["franchises"]
-
-    team = ""
-
-    for f in franchises:
-        if f["prefix"] == franchise:
-            for t in f["teams"]:
-                if t["tier"]["name"] == tier:
-                    team = t["name"]
+    team = directory.team_name(franchise, tier)
 
     if team == "":
-        return "Invalid Team and / or Tier Name"
+        return INVALID_TEAM
 
     message = get_team_opponent_stats(team, season, tier)
     message += get_team_map_bans(team, season)
@@ -426,34 +375,10 @@ def get_team_advanced_summary_stats(franchise: str, season: int, tier: str):
     tier = tier[0:1].upper() + tier[1:].lower()
 
     # Get team name from franchise name and tier
-    client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
-
-    query = """
-        query myquery {
-            franchises(active: true) {
-                teams {
-                    tier {
-                        name
-                    }
-                    name
-                }
-                prefix
-            }
-        }
-        """
-
-    franchises = client.execute(query=query)["data"]["franchises"]
-
-    team = ""
-
-    for f in franchises:
-        if f["prefix"] == franchise:
-            for t in f["teams"]:
-                if t["tier"]["name"] == tier:
-                    team = t["name"]
+    team = directory.team_name(franchise, tier)
 
     if team == "":
-        return "Invalid Team and / or Tier Name"
+        return INVALID_TEAM
 
     message = get_team_opponent_stats(team, season, tier)
     message += get_team_map_bans(team, season)
@@ -475,7 +400,16 @@ def get_team_advanced_summary_stats(franchise: str, season: int, tier: str):
     return (message, message_2)
 
 
-def get_team_match_history(franchise: str, season: int, tier: str, franchise_names: dict):
+def render_match_history(franchise: str, season: int, tier: str, matches: list):
+    """
+    Formats a team's match history
+
+    :param franchise: Franchise prefix
+    :param season: CSC Season number
+    :param tier: Tier name
+    :param matches: List of core matches
+    :return: Message text
+    """
     map_emojis = {
         "de_ancient": ":leafy_green:",
         "de_anubis": ":desert:",
@@ -486,80 +420,46 @@ def get_team_match_history(franchise: str, season: int, tier: str, franchise_nam
         "de_nuke": ":radioactive:"
     }
 
-    franchise_name = franchise_names[franchise]
+    def pad_left(value, width: int):
+        return " " * (width - len(str(value))) + str(value)
 
-    client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
-
-    query = """
-        query myquery {
-            matches(season: %s, tier: "%s", franchise: "%s") {
-                away {
-                    name,
-                    franchise {
-                        prefix
-                    }
-                },
-                home {
-                    name,
-                    franchise {
-                        prefix
-                    }
-                },
-            scheduledDate,
-            location,
-            demoUrl,
-            stats {
-                awayScore,
-                homeScore,
-                mapName,
-                mapNumber,
-                winner {
-                    franchise {
-                        prefix
-                    }
-                }
-            },
-            matchDay {
-                number
-            }
-        }
-    } """ % (season, tier, franchise_name)
+    def pad_right(value, width: int):
+        return str(value) + " " * (width - len(str(value)))
 
-    matches = client.execute(query=query)["data"]["matches"]
+    def map_name(name: str):
+        return name[3].upper() + name[4:]
 
-    message = f"## {franchise} {tier} S{season} Match History\n"
+    message = [f"## {franchise} {tier} S{season} Match History\n"]
 
-    upcoming = ""
+    upcoming = []
 
     for match in matches:
         if 'P' in match['matchDay']['number']:
             continue
 
-        if len(match['stats']) == 0:
-            upcoming += f"`{match['matchDay']['number']}: "
-            upcoming += f"{' ' * (3 - len(match['away']['franchise']['prefix'])) + match['away']['franchise']['prefix']}"
-            upcoming += " vs "
-            upcoming += f"{match['home']['franchise']['prefix'] + ' ' * (3 - len(match['home']['franchise']['prefix']))}` "
+        match_day = match['matchDay']['number']
+        away = match['away']['franchise']['prefix']
+        home = match['home']['franchise']['prefix']
 
+        if len(match['stats']) == 0:
             unix_time = time.mktime(datetime.datetime.fromisoformat(match['scheduledDate']).timetuple())
-            upcoming += f"<t:{int(unix_time) - 60 * 60 * 4}:D>\n"
+
+            upcoming.append(f"`{match_day}: {pad_left(away, 3)} vs {pad_right(home, 3)}` "
+                            f"<t:{int(unix_time) - 60 * 60 * 4}:D>\n")
 
         elif len(match['stats']) == 1:
-            if match['stats'][0]['winner'] is None or match['stats'][0]['winner']['franchise']['prefix'] == franchise:
-                message += ":green_square:\t"
-            else:
-                message += ":red_square:\t"
+            stats = match['stats'][0]
 
-            message += f"`{match['matchDay']['number']}: "
-            message += f"{' ' * (3 - len(match['away']['franchise']['prefix'])) + match['away']['franchise']['prefix']} "
-            message += f"{' ' * (2 - len(str(match['stats'][0]['awayScore']))) + str(match['stats'][0]['awayScore'])} - "
-            message += f"{str(match['stats'][0]['homeScore']) + ' ' * (2 - len(str(match['stats'][0]['homeScore'])))} "
-            message += f"{match['home']['franchise']['prefix'] + ' ' * (3 - len(match['home']['franchise']['prefix']))}`\t"
+            if stats['winner'] is None or stats['winner']['franchise']['prefix'] == franchise:
+                message.append(":green_square:\t")
+            else:
+                message.append(":red_square:\t")
 
-            message += map_emojis[match['stats'][0]['mapName']] + " "
-            message += f"{match['stats'][0]['mapName'][3].upper() + match['stats'][0]['mapName'][4:]}\t"
+            message.append(f"`{match_day}: {pad_left(away, 3)} {pad_left(stats['awayScore'], 2)} - "
+                           f"{pad_right(stats['homeScore'], 2)} {pad_right(home, 3)}`\t"
+                           f"{map_emojis[stats['mapName']]} {map_name(stats['mapName'])}\t")
 
-            # message += f"\t[Demo]({match['demoUrl']})"
+            # message.append(f"\t[Demo]({match['demoUrl']})")
         else:
             maps_won = 0
             maps_lost = 0
@@ -572,60 +472,131 @@ def get_team_match_history(franchise: str, season: int, tier: str, franchise_nam
 
                 if m['winner']['franchise']['prefix'] == franchise:
                     maps_won += 1
+                    result = ":green_circle:\t"
                 else:
                     maps_lost += 1
+                    result = ":red_circle:\t"
 
-                maps[m['mapNumber'] - 1] = ""
-
-                if m['winner'] is None or m['winner']['franchise']['prefix'] == franchise:
-                    maps[m['mapNumber'] - 1] += ":green_circle:\t"
-                else:
-                    maps[m['mapNumber'] - 1] += ":red_circle:\t"
-
-                maps[m['mapNumber'] - 1] += f"`     "
-
-                maps[m['mapNumber'] - 1] += f"{' ' * (3 - len(match['away']['franchise']['prefix'])) + match['away']['franchise']['prefix']} "
-                maps[m['mapNumber'] - 1] += f"{' ' * (2 - len(str(m['awayScore']))) + str(m['awayScore'])} - "
-                maps[m['mapNumber'] - 1] += f"{str(m['homeScore']) + ' ' * (2 - len(str(m['homeScore'])))} "
-                maps[m['mapNumber'] - 1] += f"{match['home']['franchise']['prefix'] + ' ' * (3 - len(match['home']['franchise']['prefix']))}`\t"
-
-                maps[m['mapNumber'] - 1] += map_emojis[m['mapName']] + " "
-                maps[m['mapNumber'] - 1] += f"{m['mapName'][3].upper() + m['mapName'][4:]}"
+                maps[m['mapNumber'] - 1] = (f"{result}`     {pad_left(away, 3)} {pad_left(m['awayScore'], 2)} - "
+                                            f"{pad_right(m['homeScore'], 2)} {pad_right(home, 3)}`\t"
+                                            f"{map_emojis[m['mapName']]} {map_name(m['mapName'])}")
 
             if maps_won > maps_lost:
-                message += ":green_square:\t"
+                message.append(":green_square:\t")
             else:
-                message += ":red_square:\t"
+                message.append(":red_square:\t")
 
-            message += f"`{match['matchDay']['number']}: "
-
-            if match['away']['franchise']['prefix'] ==  franchise:
-                message += f"{' ' * (3 - len(match['away']['franchise']['prefix'])) + match['away']['franchise']['prefix']} "
-                message += f"{' ' * (2 - len(str(maps_won))) + str(maps_won)} - "
-                message += f"{str(maps_lost) + ' ' * (2 - len(str(maps_lost)))} "
-                message += f"{match['home']['franchise']['prefix'] + ' ' * (3 - len(match['home']['franchise']['prefix']))}`\t"
+            if away == franchise:
+                away_maps, home_maps = maps_won, maps_lost
             else:
-                message += f"{' ' * (3 - len(match['away']['franchise']['prefix'])) + match['away']['franchise']['prefix']} "
-                message += f"{' ' * (2 - len(str(maps_lost))) + str(maps_lost)} - "
-                message += f"{str(maps_won) + ' ' * (2 - len(str(maps_won)))} "
-                message += f"{match['home']['franchise']['prefix'] + ' ' * (3 - len(match['home']['franchise']['prefix']))}`\t"
+                away_maps, home_maps = maps_lost, maps_won
+
+            message.append(f"`{match_day}: {pad_left(away, 3)} {pad_left(away_maps, 2)} - "
+                           f"{pad_right(home_maps, 2)} {pad_right(home, 3)}`\t")
 
             for m in maps:
                 if m is None:
                     continue
 
-                message += f"\n{m}"
+                message.append(f"\n{m}")
 
-        message += "\n"
+        message.append("\n")
 
-    if upcoming != "":
-        message += "## Upcoming:\n"
+    if len(upcoming) > 0:
+        message.append("## Upcoming:\n")
         message += upcoming
 
+    return "".join(message)
+
+
+def get_team_match_history(franchise: str, season: int, tier: str, franchise_names: dict):
+    """
+    Gets a team's match history message, answered from the match history cache. The message is only rendered again
+    when the team's matches have changed.
+
+    :param franchise: Franchise prefix
+    :param season: CSC Season number
+    :param tier: Tier name
+    :param franchise_names: Dictionary of franchise prefixes to franchise names
+    :return: Message text
+    """
+    history = match_histories.get(season, tier, franchise_names[franchise])
+
+    return history.message(lambda matches: render_match_history(franchise, season, tier, matches))
+
+
+def get_scout_response(franchise: str, tier: str, season: int, refresh: bool = False):
+    """
+    Gets the /scout response from the cache, or builds it with the GraphQL calls limited to response_deadline seconds.
+    Responses built from stale data aren't cached, and say so.
+
+    :param franchise: Franchise prefix
+    :param tier: Tier name
+    :param season: CSC Season number
+    :param refresh: Build the response even if there is a cached one
+    :return: Message text
+    """
+    key = ("scout", franchise, tier, season)
+    message = None if refresh else response_cache.get(key)
+
+    if message is not None:
+        return message
+
+    with api.call_budget(response_deadline) as budget:
+        message = get_team_summary_stats(franchise, season, tier)
+
+    # Not cached, the team may be in the directory after its next refresh
+    if message == INVALID_TEAM:
+        return message
+
+    if budget.stale:
+        metrics.count("scout.stale")
+        return STALE_NOTE + message
+
+    response_cache.set(key, message)
+
     return message
 
 
+def warm_team(franchise: str, tier: str, season: int, franchise_names: dict):
+    """
+    Computes and caches the /scout and /matches responses for a single team
+
+    :param franchise: Franchise prefix
+    :param tier: Tier name
+    :param season: CSC Season number
+    :param franchise_names: Dictionary of franchise prefixes to franchise names
+    :return: Nothing
+    """
+    get_scout_response(franchise, tier, season, refresh=True)
+    get_team_match_history(franchise, season, tier, franchise_names)
+
+
+async def warm_cache(teams: list, season: int, franchise_names: dict, delay: float):
+    """
+    Precomputes responses for every active franchise and tier, one team at a time so interactive commands still get
+    served in between
+
+    :param teams: List of (franchise prefix, tier name) tuples
+    :param season: CSC Season number
+    :param franchise_names: Dictionary of franchise prefixes to franchise names
+    :param delay: Seconds to wait between teams
+    :return: Nothing
+    """
+    for franchise, tier in teams:
+        try:
+            with metrics.timed("warmup.team"):
+                await asyncio.to_thread(warm_team, franchise, tier, season, franchise_names)
+        except Exception as e:
+            print(f"Cache warm-up failed for {franchise} {tier}: {e}")
+
+        await asyncio.sleep(delay)
+
+
 if __name__ == "__main__":
+    import discord
+    from discord import app_commands
+    from discord.ext import commands, tasks
 
     load_dotenv()
 
@@ -636,32 +607,135 @@ if __name__ == "__main__":
 
     token = os.getenv("BOT_TOKEN")
 
-    # Get franchise prefixes
-    client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+    response_cache.ttl = int(os.getenv("RESPONSE_CACHE_TTL", 60 * 60 * 6))
+    response_deadline = float(os.getenv("RESPONSE_DEADLINE_SECONDS", 20))
 
-    query = """
-            query myquery {
-                franchises(active: true) {
-                    prefix,
-                    name
-                }
-            }
-            """
+    metrics.enable_from_env()
+    # The bot is usually stopped with SIGTERM, which skips atexit, so profiles are written as it runs
+    profiling.enable_from_env(dump_interval=float(os.getenv("PROFILE_DUMP_INTERVAL", 60)))
 
-    franchises = client.execute(query=query)["data"]["franchises"]
+    # Serve reports from the local match store instead of the live APIs
+    if os.getenv("MATCH_STORE") is not None:
+        match_store = MatchStore(os.getenv("MATCH_STORE"))
+        league_indexes.store = match_store
+        match_histories.store = match_store
+
+    match_histories.refresh_interval = int(os.getenv("MATCH_HISTORY_REFRESH_SECONDS", 60))
+
+    # Get franchise prefixes
+    directory.snapshot_path = os.getenv("DIRECTORY_SNAPSHOT", "directory_snapshot.json")
+    directory.load()
 
     franchise_choices = []
-    franchise_names = {}
 
-    for f in franchises:
-        franchise_choices.append(app_commands.Choice(name=f['prefix'], value=f['prefix']))
-        franchise_names[f['prefix']] = f['name']
+    for prefix in directory.franchise_names.keys():
+        franchise_choices.append(app_commands.Choice(name=prefix, value=prefix))
+
+    current_season = int(os.getenv("CURRENT_SEASON", 15))
+
+    # Scouting report pdfs are built in worker processes, so they never hold up interactive commands
+    job_queue = JobQueue(os.getenv("JOBS_DB", "jobs.db"), int(os.getenv("MAX_QUEUED_REPORTS", 20)))
+    job_workers = JobWorkers(job_queue, int(os.getenv("REPORT_WORKERS", 1)))
+    job_workers.start()
+
+    # Tries so far at posting each (job id, channel id, user id) that failed for a reason that may pass
+    delivery_attempts = {}
+    report_retention = float(os.getenv("REPORT_RETENTION_HOURS", 24)) * 60 * 60
+
+    def describe_job(job: dict):
+        description = f"{job['args']['team']} season {job['args']['season']}"
+
+        if job["args"].get("maps"):
+            description += " on " + ", ".join(job["args"]["maps"])
+
+        return description
+
+    @tasks.loop(seconds=float(os.getenv("REPORT_POLL_SECONDS", 5)))
+    async def deliver_reports():
+        for job, channel_id, user_id in await asyncio.to_thread(job_queue.undelivered):
+            mention = f"<@{user_id}> " if user_id is not None else ""
+            key = (job["id"], channel_id, user_id)
+            channel = None
+
+            try:
+                channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+
+                with metrics.timed("discord.send"):
+                    if job["status"] == "done":
+                        await channel.send(f"{mention}Scouting report for {describe_job(job)}",
+                                           file=discord.File(job["result"]))
+                    else:
+                        await channel.send(f"{mention}Scouting report for {describe_job(job)} failed: {job['error']}")
+            except (discord.NotFound, discord.Forbidden) as e:
+                print(f"Report {job['id']} can't be posted: {e}")
+            except (discord.HTTPException, FileNotFoundError) as e:
+                if isinstance(e, discord.HTTPException) and not (400 <= e.status < 500 and e.status != 429):
+                    delivery_attempts[key] = delivery_attempts.get(key, 0) + 1
+
+                    if delivery_attempts[key] < MAX_DELIVERY_ATTEMPTS:
+                        print(f"Posting report {job['id']} failed: {e}")
+                        continue
+
+                # Retrying won't help, e.g. the pdf is over the channel's upload limit or was deleted
+                print(f"Report {job['id']} can't be posted: {e}")
+
+                if isinstance(e, FileNotFoundError):
+                    reason = "the pdf is gone"
+                elif e.status == 413:
+                    reason = "the pdf is too large for this channel"
+                else:
+                    reason = str(e)
+
+                if channel is not None:
+                    try:
+                        await channel.send(f"{mention}Scouting report for {describe_job(job)} couldn't be posted: "
+                                           f"{reason}")
+                    except Exception as e:
+                        print(f"Posting report {job['id']} error failed: {e}")
+            except Exception as e:
+                delivery_attempts[key] = delivery_attempts.get(key, 0) + 1
+
+                if delivery_attempts[key] < MAX_DELIVERY_ATTEMPTS:
+                    # Try again on the next run
+                    print(f"Posting report {job['id']} failed: {e}")
+                    continue
+
+                print(f"Giving up on posting report {job['id']}: {e}")
+
+            delivery_attempts.pop(key, None)
+            await asyncio.to_thread(job_queue.mark_delivered, job["id"], channel_id, user_id)
+
+        try:
+            await asyncio.to_thread(job_queue.prune, report_retention)
+        except Exception as e:
+            print(f"Removing old reports failed: {e}")
+
+    @tasks.loop(minutes=float(os.getenv("DIRECTORY_REFRESH_MINUTES", 60)))
+    async def refresh_directory():
+        try:
+            await asyncio.to_thread(directory.refresh)
+        except Exception as e:
+            print(f"Directory refresh failed: {e}")
+
+    @tasks.loop(minutes=float(os.getenv("WARMUP_INTERVAL_MINUTES", 60)))
+    async def warm_up():
+        await warm_cache(directory.active_teams(), current_season, directory.franchise_names,
+                         float(os.getenv("WARMUP_DELAY_SECONDS", 5)))
 
     @bot.event
     async def on_ready():
         print("Bot Started")
         await bot.change_presence(activity=discord.Game('/scout'))
 
+        if not refresh_directory.is_running():
+            refresh_directory.start()
+
+        if not warm_up.is_running():
+            warm_up.start()
+
+        if not deliver_reports.is_running():
+            deliver_reports.start()
+
         try:
             synced = await bot.tree.sync()
             print(f"Synced {len(synced)} command(s)")
@@ -688,7 +762,13 @@ if __name__ == "__main__":
     async def scout(interaction: discord.Interaction, franchise: str, tier: str, season: int):
         try:
             await interaction.response.defer()
-            await interaction.followup.send(get_team_summary_stats(franchise, int(season), tier))
+            with metrics.timed("scout.build"):
+                message = await asyncio.to_thread(get_scout_response, franchise, tier, int(season))
+
+            with metrics.timed("discord.send"):
+                await interaction.followup.send(message)
+        except api.ApiUnavailable:
+            await interaction.followup.send("The stats API is down right now, try again in a bit : (")
         except:
             await interaction.followup.send("Something went wrong : (")
 
@@ -713,7 +793,101 @@ if __name__ == "__main__":
     async def matches(interaction: discord.Interaction, franchise: str, tier: str, season: int):
         try:
             await interaction.response.defer()
-            await interaction.followup.send(get_team_match_history(franchise, season, tier, franchise_names))
+            with metrics.timed("matches.build"):
+                message = await asyncio.to_thread(get_team_match_history, franchise, season, tier,
+                                                  directory.franchise_names)
+
+            with metrics.timed("discord.send"):
+                await interaction.followup.send(message)
+        except:
+            await interaction.followup.send("Something went wrong : (")
+
+
+    @bot.tree.command(name="report", description="Queue a scouting report pdf for a team.")
+    @app_commands.choices(franchise=franchise_choices)
+    @app_commands.choices(tier=[
+        app_commands.Choice(name="Recruit", value="Recruit"),
+        app_commands.Choice(name="Prospect", value="Prospect"),
+        app_commands.Choice(name="Contender", value="Contender"),
+        app_commands.Choice(name="Challenger", value="Challenger"),
+        app_commands.Choice(name="Elite", value="Elite"),
+        app_commands.Choice(name="Premier", value="Premier")
+    ])
+    @app_commands.choices(season=[
+        app_commands.Choice(name="15", value=15),
+        app_commands.Choice(name="14", value=14),
+        app_commands.Choice(name="13", value=13),
+        app_commands.Choice(name="12", value=12),
+        app_commands.Choice(name="11", value=11)
+    ])
+    @app_commands.choices(map_name=[
+        app_commands.Choice(name=map_name[3:].capitalize(), value=map_name)
+        for map_name in ["de_ancient", "de_anubis", "de_dust2", "de_inferno", "de_mirage", "de_nuke", "de_overpass",
+                         "de_vertigo"]
+    ])
+    async def report(interaction: discord.Interaction, franchise: str, tier: str, season: int, map_name: str = None):
+        try:
+            await interaction.response.defer()
+
+            team = directory.team_name(franchise, tier)
+
+            if not team:
+                await interaction.followup.send(f"{franchise} has no {tier} team")
+                return
+
+            try:
+                args = {"team": team, "season": int(season)}
+
+                if map_name is not None:
+                    args["maps"] = [map_name]
+
+                job, position, joined = await asyncio.to_thread(job_queue.submit, "report", args,
+                                                                interaction.channel_id, interaction.user.id)
+            except QueueFull:
+                await interaction.followup.send("The report queue is full, try again later")
+                return
+
+            job_workers.notify()
+
+            if position == 0:
+                message = f"A report for {describe_job(job)} is already being built ({job['progress']}), " \
+                          f"it will be posted here when it's done"
+            elif joined:
+                message = f"A report for {describe_job(job)} is already queued at position {position}, " \
+                          f"it will be posted here when it's done"
+            else:
+                message = f"Queued a report for {describe_job(job)} at position {position}, " \
+                          f"it will be posted here when it's done"
+
+            await interaction.followup.send(message)
+        except:
+            await interaction.followup.send("Something went wrong : (")
+
+
+    @bot.tree.command(name="reports", description="Show queued scouting reports and their progress.")
+    async def reports(interaction: discord.Interaction):
+        try:
+            await interaction.response.defer()
+
+            jobs = await asyncio.to_thread(job_queue.jobs)
+
+            if not jobs:
+                await interaction.followup.send("No reports are queued")
+                return
+
+            lines = ["```"]
+            position = 0
+
+            for job in jobs:
+                if job["status"] == "queued":
+                    position += 1
+                    lines.append(f"{position}. {describe_job(job)} - {job['progress']}")
+                else:
+                    lines.append(f"*. {describe_job(job)} - {job['progress']}")
+
+            lines.append("```")
+
+            await interaction.followup.send("\n".join(lines))
         except:
             await interaction.followup.send("Something went wrong : (")
 
@@ -721,3 +895,5 @@ if __name__ == "__main__":
 
     bot.run(token)
 
+    job_workers.stop()
+
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Thread safe in-memory cache for formatted bot responses, keyed by command name and arguments
+    """
+
+    def __init__(self, ttl: int = 60 * 60):
+        """
+        :param ttl: Seconds a cached response is considered fresh
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """
+        Gets a fresh cached response
+
+        :param key: Cache key, usually (command, *args)
+        :return: The cached value, or None if there is no fresh entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+
+        return entry[1]
+
+    def set(self, key: tuple, value):
+        """
+        Stores a response in the cache
+
+        :param key: Cache key, usually (command, *args)
+        :param value: Value to store
+        :return: Nothing
+        """
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+
+    def get_or_compute(self, key: tuple, func, *args):
+        """
+        Gets a fresh cached response, or computes and stores it if there isn't one
+
+        :param key: Cache key, usually (command, *args)
+        :param func: Function to compute the value with
+        :param args: Arguments passed to func
+        :return: The cached or newly computed value
+        """
+        value = self.get(key)
+
+        if value is None:
+            value = func(*args)
+            self.set(key, value)
+
+        return value
+
+    def invalidate(self, key: tuple):
+        """
+        Removes an entry from the cache
+
+        :param key: Cache key to remove
+        :return: Nothing
+        """
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,223 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+
+
+class MultipartStream:
+    """
+    multipart/form-data body for a Discord webhook message that reads attached files from disk in chunks while it is
+    uploaded, instead of holding them in memory. Its length is known up front so it's sent with a Content-Length.
+    """
+
+    def __init__(self, content: str, files: list, chunk_size: int = 64 * 1024):
+        """
+        :param content: Message content
+        :param files: List of (file path, file name shown in Discord) tuples
+        :param chunk_size: Bytes read from a file at a time
+        """
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.parts = []
+
+        self.parts.append(
+            (f"--{self.boundary}\r\n"
+             f"Content-Disposition: form-data; name=\"payload_json\"\r\n"
+             f"Content-Type: application/json\r\n\r\n"
+             f"{json.dumps({'content': content})}\r\n").encode()
+        )
+
+        for i, (path, filename) in enumerate(files):
+            self.parts.append(
+                (f"--{self.boundary}\r\n"
+                 f"Content-Disposition: form-data; name=\"files[{i}]\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode()
+            )
+            self.parts.append(path)
+            self.parts.append(b"\r\n")
+
+        self.parts.append(f"--{self.boundary}--\r\n".encode())
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def __len__(self):
+        return sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+
+            with open(part, "rb") as f:
+                chunk = f.read(self.chunk_size)
+
+                while chunk:
+                    yield chunk
+                    chunk = f.read(self.chunk_size)
+
+
+class WebhookQueue:
+    """
+    Delivers Discord webhook messages from a pool of threads. Messages to different webhooks are uploaded concurrently,
+    and messages to the same webhook one at a time, waiting out its rate limit when Discord says it is used up. 429s,
+    5xx responses and connection errors are retried with exponential backoff.
+    """
+
+    def __init__(self, workers: int = 4, retries: int = 5, backoff: float = 1.0, timeout: float = 60):
+        """
+        :param workers: Number of messages uploaded at once
+        :param retries: Number of times a message is retried before giving up
+        :param backoff: Seconds to wait before the first retry after an error, doubled for each retry after
+        :param timeout: Seconds to wait for Discord to respond to an upload
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+
+        self._lock = threading.Lock()
+        self._webhook_locks = {}
+        # Webhook URL (or None for the global limit) -> time.monotonic() to wait until before the next request
+        self._blocked_until = {}
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self, wait: bool = True):
+        """
+        Stops accepting messages
+
+        :param wait: Whether to wait for queued messages to be delivered
+        :return: Nothing
+        """
+        self.executor.shutdown(wait=wait)
+
+    def submit(self, url: str, content: str, files: list = None):
+        """
+        Queues a message
+
+        :param url: Webhook URL
+        :param content: Message content
+        :param files: List of (file path, file name shown in Discord) tuples to attach
+        :return: Future resolving to the response, or raising the error that made delivery fail
+        """
+        return self.executor.submit(self.send, url, content, files)
+
+    def send(self, url: str, content: str, files: list = None):
+        """
+        Delivers a message, blocking until it's delivered or has failed
+
+        :param url: Webhook URL
+        :param content: Message content
+        :param files: List of (file path, file name shown in Discord) tuples to attach
+        :return: Response from Discord
+        """
+        with self._lock:
+            webhook_lock = self._webhook_locks.setdefault(url, threading.Lock())
+
+        with webhook_lock:
+            attempt = 0
+
+            while True:
+                self._wait(url)
+
+                try:
+                    response = self._post(url, content, files if files is not None else [])
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.retries:
+                        raise
+
+                    metrics.count("discord.retries")
+                    self._sleep_backoff(attempt)
+                    attempt += 1
+                    continue
+
+                self._update_limits(url, response)
+
+                if response.status_code == 429:
+                    if attempt >= self.retries:
+                        response.raise_for_status()
+
+                    metrics.count("discord.rate_limited")
+                    attempt += 1
+                    continue
+
+                if response.status_code >= 500 and attempt < self.retries:
+                    metrics.count("discord.retries")
+                    self._sleep_backoff(attempt)
+                    attempt += 1
+                    continue
+
+                response.raise_for_status()
+
+                return response
+
+    def _session(self):
+        # Sessions aren't thread safe, so every worker reuses its own connection pool
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+
+        return self._local.session
+
+    def _post(self, url: str, content: str, files: list):
+        with metrics.timed("discord.send"):
+            if len(files) == 0:
+                return self._session().post(url, json={"content": content}, timeout=self.timeout)
+
+            body = MultipartStream(content, files)
+
+            return self._session().post(url, data=body, headers={"Content-Type": body.content_type},
+                                        timeout=self.timeout)
+
+    def _wait(self, url: str):
+        while True:
+            with self._lock:
+                blocked_until = max(self._blocked_until.get(url, 0), self._blocked_until.get(None, 0))
+
+            delay = blocked_until - time.monotonic()
+
+            if delay <= 0:
+                return
+
+            time.sleep(delay)
+
+    def _sleep_backoff(self, attempt: int):
+        # Full jitter, so webhooks that failed together don't retry together
+        time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def _update_limits(self, url: str, response):
+        now = time.monotonic()
+        headers = response.headers
+
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json()["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                retry_after = float(headers.get("Retry-After", self.backoff))
+
+            key = None if headers.get("X-RateLimit-Global", "").lower() == "true" else url
+
+            with self._lock:
+                self._blocked_until[key] = max(self._blocked_until.get(key, 0), now + retry_after)
+
+            return
+
+        if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset-After" in headers:
+            with self._lock:
+                self._blocked_until[url] = now + float(headers["X-RateLimit-Reset-After"])
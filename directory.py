@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+
+from api import GraphqlClient
+
+
+class TeamDirectory:
+    """
+    Franchise prefix -> franchise name, (prefix, tier) -> team name and team name -> team id mappings for all active
+    franchises. Loaded from a local snapshot so startup doesn't wait on core, then refreshed in the background. Loads
+    itself on first use if load() or refresh() hasn't been called, so importers of bot.py get a working directory.
+    """
+
+    def __init__(self, snapshot_path: str = "directory_snapshot.json"):
+        """
+        :param snapshot_path: File path to the json snapshot of the directory
+        """
+        self.snapshot_path = snapshot_path
+        self._franchises = []
+        self._franchise_names = {}
+        self._team_names = {}
+        self._team_ids = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+
+        with self._load_lock:
+            if not self._loaded:
+                self.load()
+
+    @property
+    def franchises(self):
+        self._ensure_loaded()
+        return self._franchises
+
+    @property
+    def franchise_names(self):
+        self._ensure_loaded()
+        return self._franchise_names
+
+    @property
+    def team_names(self):
+        self._ensure_loaded()
+        return self._team_names
+
+    @property
+    def team_ids(self):
+        self._ensure_loaded()
+        return self._team_ids
+
+    def _build(self, franchises: list):
+        franchise_names = {}
+        team_names = {}
+        team_ids = {}
+
+        for f in franchises:
+            franchise_names[f["prefix"]] = f["name"]
+
+            for t in f["teams"]:
+                team_names[(f["prefix"], t["tier"]["name"])] = t["name"]
+                team_ids[t["name"]] = t["id"]
+
+        with self._lock:
+            self._franchises = franchises
+            self._franchise_names = franchise_names
+            self._team_names = team_names
+            self._team_ids = team_ids
+            self._loaded = True
+
+    def load(self):
+        """
+        Loads the directory from the local snapshot, falling back to core if there is no snapshot yet
+
+        :return: Nothing
+        """
+        if os.path.isfile(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                self._build(json.load(f))
+        else:
+            self.refresh()
+
+    def refresh(self):
+        """
+        Fetches all active franchises and their teams from core and updates the snapshot
+
+        :return: Nothing
+        """
+        client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+
+        query = """
+            query myquery {
+                franchises(active: true) {
+                    prefix,
+                    name,
+                    teams {
+                        id,
+                        name,
+                        tier {
+                            name
+                        }
+                    }
+                }
+            }
+            """
+
+        franchises = client.execute(query=query)["data"]["franchises"]
+
+        self._build(franchises)
+
+        # Write to a temp file first so a crash mid-write never leaves a broken snapshot behind
+        with open(self.snapshot_path + ".tmp", "w") as f:
+            json.dump(franchises, f)
+
+        os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+
+    def team_name(self, franchise: str, tier: str):
+        """
+        :param franchise: Franchise prefix
+        :param tier: Tier name
+        :return: Name of the franchise's team in the tier, or an empty string if there isn't one
+        """
+        return self.team_names.get((franchise, tier), "")
+
+    def team_id(self, team: str):
+        """
+        :param team: Team name
+        :return: Core id of the team, or None if it isn't an active team
+        """
+        return self.team_ids.get(team)
+
+    def active_teams(self):
+        """
+        :return: List of (franchise prefix, tier name) tuples for every active team
+        """
+        return list(self.team_names.keys())
@@ -0,0 +1,238 @@
+import threading
+import time
+
+from api import GraphqlClient
+
+
+# Fields of a match that change when it is rescheduled, played or corrected
+PROBE_FIELDS = """
+    matchDay {
+        number
+    },
+    away {
+        name
+    },
+    home {
+        name
+    },
+    scheduledDate,
+    stats {
+        mapNumber,
+        mapName,
+        awayScore,
+        homeScore,
+        winner {
+            franchise {
+                prefix
+            }
+        }
+    }
+"""
+
+HISTORY_FIELDS = """
+    away {
+        name,
+        franchise {
+            prefix
+        }
+    },
+    home {
+        name,
+        franchise {
+            prefix
+        }
+    },
+    scheduledDate,
+    location,
+    demoUrl,
+    stats {
+        awayScore,
+        homeScore,
+        mapName,
+        mapNumber,
+        winner {
+            franchise {
+                prefix
+            }
+        }
+    },
+    matchDay {
+        number
+    }
+"""
+
+
+def match_signature(match: dict):
+    """
+    :param match: Core match with at least the probe fields
+    :return: Tuple that changes whenever the match is rescheduled, a map is played, or a result is corrected (e.g. a
+    forfeit or a fixed map name)
+    """
+    return (
+        match["matchDay"]["number"],
+        match["away"]["name"],
+        match["home"]["name"],
+        match["scheduledDate"],
+        tuple(sorted((m["mapNumber"], m["mapName"], m["awayScore"], m["homeScore"],
+                      m["winner"]["franchise"]["prefix"] if m["winner"] is not None else None)
+                     for m in match["stats"])),
+    )
+
+
+class MatchHistory:
+    """
+    Match history of one franchise's team in one tier of one season. After the first sync, refreshes only ask core for
+    the few fields that change when a match is rescheduled or played, and only fetch full matches when one has. The
+    rendered message is kept until the matches change. Reads don't take the lock, only refreshes do.
+    """
+
+    def __init__(self, season: int, tier: str, franchise_name: str, store=None):
+        """
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param franchise_name: Franchise name
+        :param store: Optional MatchStore to read the history from instead of core
+        """
+        self.season = season
+        self.tier = tier
+        self.franchise_name = franchise_name
+        self.store = store
+        self.signatures = None
+        self.refreshed_at = 0
+        self.lock = threading.Lock()
+        # (version, matches), replaced as a whole so readers never see a version with the wrong matches
+        self._state = (0, None)
+        self._message = (None, None)
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    @property
+    def matches(self):
+        return self._state[1]
+
+    def _query(self, fields: str):
+        client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+
+        query = """
+            query myquery {
+                matches(season: %s, tier: "%s", franchise: "%s") {
+                    %s
+                }
+            } """ % (self.season, self.tier, self.franchise_name, fields)
+
+        return client.execute(query=query)["data"]["matches"]
+
+    def _fetch(self):
+        if self.store is not None:
+            matches = self.store.match_history(self.season, self.tier, self.franchise_name)
+
+            if matches is not None:
+                return matches
+
+        return self._query(HISTORY_FIELDS)
+
+    def refresh(self):
+        """
+        Brings the history up to date
+
+        :return: Whether any match changed
+        """
+        if self.matches is not None and self.store is None:
+            signatures = [match_signature(match) for match in self._query(PROBE_FIELDS)]
+
+            if signatures == self.signatures:
+                self.refreshed_at = time.time()
+                return False
+
+        matches = self._fetch()
+        signatures = [match_signature(match) for match in matches]
+
+        changed = signatures != self.signatures
+
+        if changed:
+            self.signatures = signatures
+            self._state = (self.version + 1, matches)
+
+        self.refreshed_at = time.time()
+
+        return changed
+
+    def message(self, render):
+        """
+        Gets the rendered message, rendering it again only if the matches changed since it was last rendered
+
+        :param render: Function taking the list of matches and returning the message
+        :return: Rendered message
+        """
+        version, matches = self._state
+        message_version, message = self._message
+
+        if message_version != version:
+            message = render(matches)
+            self._message = (version, message)
+
+        return message
+
+
+class MatchHistories:
+    """
+    Shared MatchHistory per (season, tier, franchise). Stale histories keep answering from cache while they refresh in
+    the background, so only the first request for a team waits on core.
+    """
+
+    def __init__(self, refresh_interval: int = 60, store=None):
+        """
+        :param refresh_interval: Minimum seconds between refreshes of a single history
+        :param store: Optional MatchStore to read histories from instead of core
+        """
+        self.refresh_interval = refresh_interval
+        self.store = store
+        self._histories = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _refresh(self, key: tuple, history: MatchHistory):
+        try:
+            with history.lock:
+                history.refresh()
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, season: int, tier: str, franchise_name: str):
+        """
+        Gets the history for a team, syncing it first if it has never been synced, and starting a background refresh if
+        it is stale
+
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param franchise_name: Franchise name
+        :return: MatchHistory
+        """
+        key = (season, tier, franchise_name)
+
+        with self._lock:
+            if key not in self._histories.keys():
+                self._histories[key] = MatchHistory(season, tier, franchise_name, self.store)
+
+            history = self._histories[key]
+
+        if history.matches is None:
+            with history.lock:
+                if history.matches is None:
+                    history.refresh()
+
+            return history
+
+        with self._lock:
+            stale = time.time() - history.refreshed_at > self.refresh_interval and key not in self._refreshing
+
+            if stale:
+                self._refreshing.add(key)
+
+        if stale:
+            threading.Thread(target=self._refresh, args=(key, history), daemon=True).start()
+
+        return history
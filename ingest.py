@@ -0,0 +1,177 @@
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+
+# Bytes copied at a time when extracting a demo
+CHUNK_SIZE = 1024 * 1024
+
+
+def demo_members(zipped: zipfile.ZipFile):
+    """
+    :param zipped: Demo archive
+    :return: List of every .dem member of the archive
+    """
+    return [info for info in zipped.infolist() if not info.is_dir() and info.filename.endswith(".dem")]
+
+
+def extract_member(zipped: zipfile.ZipFile, info: zipfile.ZipInfo, path: str):
+    """
+    Decompresses an archive member straight to a file, a chunk at a time, without holding the demo in memory
+
+    :param zipped: Demo archive
+    :param info: Member to extract
+    :param path: File path to write the demo to
+    :return: The file path
+    """
+    with zipped.open(info) as source, open(path, "wb") as output:
+        shutil.copyfileobj(source, output, CHUNK_SIZE)
+
+    return path
+
+
+class ExtractedDemo:
+    """
+    A demo extracted from an archive into its own private temp directory, so demos parsed at the same time never share
+    a file name. demoparser2 only reads demos from a path, and memory maps the file, so the demo is written once and
+    read once by the parser. Call cleanup() (or use as a context manager) once it's parsed.
+    """
+
+    def __init__(self, key: str, zipped: zipfile.ZipFile, info: zipfile.ZipInfo):
+        """
+        :param key: Key of the archive the demo came from
+        :param zipped: Demo archive
+        :param info: Member of the archive to extract
+        """
+        self.key = key
+        self.member = info.filename
+        self.directory = tempfile.mkdtemp(prefix="demo-")
+        self.path = extract_member(zipped, info, os.path.join(self.directory, os.path.basename(info.filename)))
+
+    @property
+    def name(self):
+        return f"{self.key}/{self.member}"
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+
+
+def extract_demos(key: str, zipped: zipfile.ZipFile, wanted=None):
+    """
+    Extracts every demo in an archive
+
+    :param key: Key of the archive
+    :param zipped: Demo archive
+    :param wanted: Optional function taking a member name and returning whether to extract it
+    :return: Generator of ExtractedDemos, one per .dem member
+    """
+    for info in demo_members(zipped):
+        if wanted is None or wanted(info.filename):
+            yield ExtractedDemo(key, zipped, info)
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    Holds an exclusive lock on a lock file, so processes sharing a file (like several report workers) take turns
+
+    :param path: File path of the lock file
+    :return: Nothing
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # No flock on Windows, where the bot doesn't run with more than one worker
+        yield
+        return
+
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DemoManifest:
+    """
+    Record of which archive members hold which maps, so a demo's map is known without downloading and parsing it again.
+    Entries are keyed by archive key, then member name. Several processes can share a manifest file, every add takes a
+    file lock and picks up the entries the others have saved first.
+    """
+
+    def __init__(self, path: str = "demo_manifest.json"):
+        """
+        :param path: File path to the json manifest, or None to keep it in memory only
+        """
+        self.path = path
+        self.archives = {}
+        self._lock = threading.Lock()
+
+        if path is not None:
+            self.archives = self._read()
+
+    def _read(self):
+        if not os.path.isfile(self.path):
+            return {}
+
+        with open(self.path) as f:
+            return json.load(f)
+
+    def add(self, key: str, member: str, map_name: str, size: int, rounds: int):
+        """
+        Records a demo and saves the manifest
+
+        :param key: Key of the archive
+        :param member: Name of the demo in the archive
+        :param map_name: Map the demo was played on
+        :param size: Size of the extracted demo in bytes
+        :param rounds: Number of rounds in the demo
+        :return: Nothing
+        """
+        entry = {"map_name": map_name, "size": size, "rounds": rounds}
+
+        with self._lock:
+            if self.path is None:
+                self.archives.setdefault(key, {})[member] = entry
+                return
+
+            with file_lock(self.path + ".lock"):
+                archives = self._read()
+                archives.setdefault(key, {})[member] = entry
+
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+
+                with open(temp_path, "w") as f:
+                    json.dump(archives, f)
+
+                os.replace(temp_path, self.path)
+
+            self.archives = archives
+
+    def members(self, key: str):
+        """
+        :param key: Key of the archive
+        :return: Dictionary of member names to their entries, empty if the archive hasn't been ingested
+        """
+        with self._lock:
+            return dict(self.archives.get(key, {}))
+
+    def maps(self, key: str):
+        """
+        :param key: Key of the archive
+        :return: Set of maps played in the archive's demos
+        """
+        return {entry["map_name"] for entry in self.members(key).values()}
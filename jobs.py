@@ -0,0 +1,428 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import profiling
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT,
+    args TEXT,
+    status TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_kind_args ON jobs (kind, args);
+
+CREATE TABLE IF NOT EXISTS requesters (
+    job_id INTEGER,
+    channel_id INTEGER,
+    user_id INTEGER,
+    delivered INTEGER DEFAULT 0,
+    PRIMARY KEY (job_id, channel_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS requesters_delivered ON requesters (delivered, job_id);
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Persistent queue of heavy jobs (like scouting report pdfs) in SQLite, so queued jobs, finished jobs that haven't been
+    posted yet, and the people waiting on them all survive restarts. Identical jobs that are still queued or running are
+    shared, with everyone who asked for one told when it's done. Every process opens its own JobQueue on the same file.
+    """
+
+    def __init__(self, path: str = "jobs.db", max_queued: int = 20):
+        """
+        :param path: File path to the SQLite database
+        :param max_queued: Most jobs that can wait at once before new ones are turned away
+        """
+        self.path = path
+        self.max_queued = max_queued
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._connection.close()
+
+    def _position(self, job_id: int):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND id <= ?", (QUEUED, job_id)
+        ).fetchone()[0]
+
+    def submit(self, kind: str, args: dict, channel_id: int = None, user_id: int = None):
+        """
+        Queues a job, or joins the identical job if one is already queued or running
+
+        :param kind: Job kind, a key of HANDLERS
+        :param args: Json serializable keyword arguments for the handler
+        :param channel_id: Discord channel to post the result in
+        :param user_id: Discord user to mention with the result
+        :return: Tuple of the job dictionary, its position in the queue (0 once it's running), and whether an existing
+        job was joined
+        :raises QueueFull: If max_queued jobs are already waiting
+        """
+        args = json.dumps(args, sort_keys=True)
+
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND args = ? AND status IN (?, ?) ORDER BY id LIMIT 1",
+                (kind, args, QUEUED, RUNNING)
+            ).fetchone()
+
+            joined = row is not None
+
+            if joined:
+                job_id = row["id"]
+            else:
+                queued = self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+                if queued >= self.max_queued:
+                    raise QueueFull(f"{queued} jobs are already queued")
+
+                now = time.time()
+                job_id = self._connection.execute(
+                    "INSERT INTO jobs (kind, args, status, progress, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, args, QUEUED, "Queued", now, now)
+                ).lastrowid
+
+            if channel_id is not None:
+                self._connection.execute("INSERT OR IGNORE INTO requesters (job_id, channel_id, user_id) VALUES (?, ?, ?)",
+                                         (job_id, channel_id, user_id))
+
+            return self._get(job_id), self._position(job_id), joined
+
+    def _get(self, job_id: int):
+        row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["args"] = json.loads(job["args"])
+
+        return job
+
+    def get(self, job_id: int):
+        """
+        :param job_id: Job id
+        :return: Job dictionary with id, kind, args, status, progress, result, error, created and updated, or None
+        """
+        with self._lock:
+            return self._get(job_id)
+
+    def position(self, job_id: int):
+        """
+        :param job_id: Job id
+        :return: Position of the job in the queue, starting at 1, or 0 if it isn't waiting
+        """
+        with self._lock:
+            job = self._get(job_id)
+
+            if job is None or job["status"] != QUEUED:
+                return 0
+
+            return self._position(job_id)
+
+    def jobs(self, statuses: tuple = (QUEUED, RUNNING)):
+        """
+        :param statuses: Statuses of the jobs to list
+        :return: List of job dictionaries, oldest first
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM jobs WHERE status IN (%s) ORDER BY id" % ", ".join("?" * len(statuses)), statuses
+            ).fetchall()
+
+            return [self._get(row["id"]) for row in rows]
+
+    def claim(self):
+        """
+        Takes the oldest queued job and marks it running
+
+        :return: Job dictionary, or None if nothing is queued
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                                           (QUEUED,)).fetchone()
+
+            if row is None:
+                return None
+
+            self._connection.execute("UPDATE jobs SET status = ?, progress = ?, updated = ? WHERE id = ?",
+                                     (RUNNING, "Starting", time.time(), row["id"]))
+
+            return self._get(row["id"])
+
+    def _update(self, job_id: int, **fields):
+        fields["updated"] = time.time()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET %s WHERE id = ?" % ", ".join(f"{name} = ?" for name in fields.keys()),
+                (*fields.values(), job_id)
+            )
+
+    def set_progress(self, job_id: int, progress: str):
+        self._update(job_id, progress=progress)
+
+    def finish(self, job_id: int, result: str):
+        """
+        :param job_id: Job id
+        :param result: File path of the finished job's output
+        :return: Nothing
+        """
+        self._update(job_id, status=DONE, progress="Done", result=result)
+
+    def fail(self, job_id: int, error: str):
+        self._update(job_id, status=FAILED, progress="Failed", error=error)
+
+    def requeue(self, job_id: int):
+        """
+        Puts a job that was claimed but never started back in the queue, ahead of newer jobs
+
+        :param job_id: Job id
+        :return: Nothing
+        """
+        self._update(job_id, status=QUEUED, progress="Queued")
+
+    def recover(self):
+        """
+        Puts jobs that were running when the last process stopped back in the queue, ahead of newer jobs
+
+        :return: Number of jobs put back
+        """
+        with self._lock, self._connection:
+            return self._connection.execute("UPDATE jobs SET status = ?, progress = ?, updated = ? WHERE status = ?",
+                                            (QUEUED, "Queued (restarted)", time.time(), RUNNING)).rowcount
+
+    def prune(self, max_age: float):
+        """
+        Deletes the output files of finished jobs once every requester has been given them and they are old enough
+
+        :param max_age: Seconds a finished job's output is kept
+        :return: Number of files deleted
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, result FROM jobs WHERE status = ? AND result IS NOT NULL AND updated < ? AND NOT EXISTS "
+                "(SELECT 1 FROM requesters WHERE job_id = jobs.id AND delivered = 0)", (DONE, time.time() - max_age)
+            ).fetchall()
+
+        for row in rows:
+            try:
+                os.remove(row["result"])
+            except FileNotFoundError:
+                pass
+
+            self._update(row["id"], result=None)
+
+        return len(rows)
+
+    def undelivered(self):
+        """
+        :return: List of (job dictionary, channel_id, user_id) for finished or failed jobs whose requesters haven't been
+        told yet
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT requesters.job_id, channel_id, user_id FROM requesters JOIN jobs ON jobs.id = requesters.job_id "
+                "WHERE delivered = 0 AND jobs.status IN (?, ?) ORDER BY requesters.job_id", (DONE, FAILED)
+            ).fetchall()
+
+            return [(self._get(row["job_id"]), row["channel_id"], row["user_id"]) for row in rows]
+
+    def mark_delivered(self, job_id: int, channel_id: int, user_id: int):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE requesters SET delivered = 1 WHERE job_id = ? AND channel_id = ? AND user_id IS ?",
+                (job_id, channel_id, user_id)
+            )
+
+
+def build_report(job_id: int, progress, team: str, season: int, output_dir: str = "output", maps: list = None):
+    """
+    Builds a team's scouting report pdf
+
+    :param job_id: Job id, used to keep the output file name unique
+    :param progress: Function called with a status message as the report is built
+    :param team: Team name
+    :param season: CSC Season number
+    :param output_dir: Folder for the finished pdf
+    :param maps: Only report on these maps, or None for every map the team played
+    :return: File path of the pdf
+    """
+    import visualization
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_file = os.path.join(output_dir, f"{team.replace(' ', '_')}_S{season}_{job_id}_scouting.pdf")
+
+    return visualization.build_scouting_report(team, season, output_file, progress=progress, maps=maps)
+
+
+# Job kinds to the functions that run them. Each takes the job id, a progress function and the job's args
+HANDLERS = {
+    "report": build_report,
+}
+
+
+def run_job(path: str, job_id: int, kind: str, args: dict, profile_dir: str = None):
+    """
+    Runs a job in a worker process, saving its progress to the queue as it goes
+
+    :param path: File path to the queue's database
+    :param job_id: Job id
+    :param kind: Job kind, a key of HANDLERS
+    :param args: Keyword arguments for the handler
+    :param profile_dir: Optional folder to profile the job into, as <profile_dir>/job-<job id>. Worker processes never
+    run atexit, so the profile is written when the job ends
+    :return: The handler's result
+    """
+    queue = JobQueue(path)
+
+    if profile_dir is not None:
+        # Worker processes run many jobs, so each job's profile starts empty
+        profiling.reset()
+        metrics.reset()
+        profiling.enable(os.path.join(profile_dir, f"job-{job_id}"))
+
+    try:
+        return HANDLERS[kind](job_id, lambda message: queue.set_progress(job_id, message), **args)
+    finally:
+        queue.close()
+
+        if profile_dir is not None:
+            profiling.dump()
+
+
+class JobWorkers:
+    """
+    Runs queued jobs in a pool of worker processes, at most `workers` at a time. Rendering happens outside the bot's
+    process, so a heavy report never holds the GIL or the event loop while interactive commands are being answered.
+    """
+
+    def __init__(self, queue: JobQueue, workers: int = 1, poll_interval: float = 1.0):
+        """
+        :param queue: JobQueue to take jobs from
+        :param workers: Jobs run at once
+        :param poll_interval: Seconds between checks for new jobs while every job has been taken
+        """
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._running = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        """
+        Puts jobs interrupted by the last shutdown back in the queue and starts taking jobs
+
+        :return: Nothing
+        """
+        self.queue.recover()
+
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _new_executor(self):
+        # Spawned rather than forked, so workers don't inherit the bot's threads and open connections
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def notify(self):
+        """
+        Wakes the dispatcher after a job was submitted, instead of waiting out the poll interval
+
+        :return: Nothing
+        """
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            while True:
+                with self._lock:
+                    if self._running >= self.workers:
+                        break
+
+                    job = self.queue.claim()
+
+                    if job is None:
+                        break
+
+                    self._running += 1
+
+                started = time.perf_counter()
+
+                try:
+                    future = self._executor.submit(run_job, self.queue.path, job["id"], job["kind"], job["args"],
+                                                   profiling.output_directory())
+                except Exception as e:
+                    # A worker process died (out of memory, a parser crash) and broke the pool. The job never started,
+                    # so it goes back in the queue, and the next one runs in a new pool
+                    print(f"Job pool broken, restarting it: {e}")
+                    metrics.count("jobs.pool_restarts")
+
+                    self.queue.requeue(job["id"])
+
+                    with self._lock:
+                        self._running -= 1
+
+                    self._executor.shutdown(wait=False)
+                    self._executor = self._new_executor()
+                    break
+
+                future.add_done_callback(lambda f, job=job, started=started: self._done(job, started, f))
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _done(self, job: dict, started: float, future):
+        metrics.observe("jobs." + job["kind"], time.perf_counter() - started)
+
+        try:
+            self.queue.finish(job["id"], future.result())
+        except Exception as e:
+            metrics.count("jobs.failed")
+            self.queue.fail(job["id"], str(e) or type(e).__name__)
+
+        with self._lock:
+            self._running -= 1
+
+        self._wake.set()
@@ -0,0 +1,206 @@
+import copy
+import threading
+import time
+
+from api import GraphqlClient
+
+
+def new_record():
+    return {"wins": 0, "losses": 0, "easy_wins": 0, "hard_losses": 0, "close": 0, "round_wins": 0, "round_losses": 0}
+
+
+def new_map_record():
+    return {"opponents": [], "wins": 0, "losses": 0, "round_wins": 0, "round_losses": 0}
+
+
+class LeagueIndex:
+    """
+    Team records, round totals and per map opponents for every team in one tier of one season, built from a single
+    query and then kept up to date by only fetching matches newer than the last one seen. Refreshes add to copies of
+    the records, so a snapshot taken before a refresh never changes under its reader
+    """
+
+    def __init__(self, season: int, tier: str, store=None):
+        """
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param store: Optional MatchStore to read matches from instead of the stats API
+        """
+        self.season = season
+        self.tier = tier
+        self.store = store
+        self.records = {}
+        self.map_records = {}
+        self.last_match_id = None
+        self.refreshed_at = 0
+        self.rebuilt_at = 0
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        """
+        :return: LeagueSnapshot of the current records, call with the lock held
+        """
+        return LeagueSnapshot(self.season, self.tier, self.records, self.map_records, self.refreshed_at)
+
+    def add_match(self, match: dict):
+        """
+        Adds a single regulation match to the index
+
+        :param match: Match from the stats API with teamStats and mapName
+        :return: Nothing
+        """
+        for team, opponent in ((match["teamStats"][0], match["teamStats"][1]),
+                               (match["teamStats"][1], match["teamStats"][0])):
+            if team["name"] not in self.records.keys():
+                self.records[team["name"]] = new_record()
+                self.map_records[team["name"]] = {}
+
+            record = self.records[team["name"]]
+
+            record["round_wins"] += team["score"]
+            record["round_losses"] += opponent["score"]
+
+            if team["score"] > opponent["score"]:
+                record["wins"] += 1
+
+                if opponent["score"] >= 10:
+                    record["close"] += 1
+                else:
+                    record["easy_wins"] += 1
+            else:
+                record["losses"] += 1
+
+                if team["score"] >= 10:
+                    record["close"] += 1
+                else:
+                    record["hard_losses"] += 1
+
+            # Add the opponent to the list of opponents for the current map
+            if match["mapName"] not in self.map_records[team["name"]].keys():
+                self.map_records[team["name"]][match["mapName"]] = new_map_record()
+
+            map_record = self.map_records[team["name"]][match["mapName"]]
+
+            map_record["opponents"].append(opponent["name"])
+            map_record["round_wins"] += team["score"]
+            map_record["round_losses"] += opponent["score"]
+
+            if team["score"] > opponent["score"]:
+                map_record["wins"] += 1
+            else:
+                map_record["losses"] += 1
+
+        # Match ids are integers in the stats API, compare them as such so the id filter and this agree
+        match_id = int(match["id"])
+
+        if self.last_match_id is None or match_id > self.last_match_id:
+            self.last_match_id = match_id
+
+    def refresh(self, full: bool = False):
+        """
+        Fetches matches played since the last refresh and adds them to the index
+
+        :param full: Rebuild the index from every match instead, picking up matches that were corrected or entered out
+            of id order
+        :return: Number of matches added
+        """
+        after_id = None if full else self.last_match_id
+
+        if self.store is not None:
+            matches = self.store.tier_matches(self.season, self.tier, after_id)
+        else:
+            matches = self._fetch(after_id)
+
+        if full:
+            self.records, self.map_records, self.last_match_id = {}, {}, None
+            self.rebuilt_at = time.time()
+        elif matches:
+            self.records, self.map_records = copy.deepcopy(self.records), copy.deepcopy(self.map_records)
+
+        for match in matches:
+            self.add_match(match)
+
+        self.refreshed_at = time.time()
+
+        return len(matches)
+
+    def _fetch(self, after_id=None):
+        """
+        :param after_id: Only fetch matches with an id greater than this
+        :return: Regulation match day matches from the stats API
+        """
+        client = GraphqlClient(endpoint="https://stats.csconfederation.com/graphql")
+
+        id_filter = ""
+        if after_id is not None:
+            id_filter = ", id: {gt: %d}" % int(after_id)
+
+        query = """
+        query MyQuery {
+          findManyMatch(
+            where: {season: {equals: %s}, tier: {equals: %s}, matchDay: {not: {equals: ""}}, matchType: {equals: Regulation}%s}
+          ) {
+            id
+            teamStats {
+              name
+              score
+            }
+            mapName
+          }
+        } """ % (self.season, self.tier, id_filter)
+
+        return client.execute(query=query)["data"]["findManyMatch"]
+
+
+class LeagueSnapshot:
+    """
+    Records of a LeagueIndex at one point in time, safe to read while the index refreshes
+    """
+
+    def __init__(self, season: int, tier: str, records: dict, map_records: dict, refreshed_at: float):
+        self.season = season
+        self.tier = tier
+        self.records = records
+        self.map_records = map_records
+        self.refreshed_at = refreshed_at
+
+
+class LeagueIndexes:
+    """
+    Shared LeagueIndex per (season, tier), refreshed at most once every refresh_interval seconds and rebuilt from
+    every match once every rebuild_interval seconds
+    """
+
+    def __init__(self, refresh_interval: int = 5 * 60, store=None, rebuild_interval: int = 60 * 60):
+        """
+        :param refresh_interval: Minimum seconds between refreshes of a single index
+        :param store: Optional MatchStore to build the indexes from instead of the stats API
+        :param rebuild_interval: Seconds between full rebuilds of a single index
+        """
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.store = store
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, season: int, tier: str):
+        """
+        Gets the index for a season and tier, building or refreshing it if needed
+
+        :param season: CSC Season number
+        :param tier: Tier name
+        :return: LeagueSnapshot of the up to date index
+        """
+        with self._lock:
+            if (season, tier) not in self._indexes.keys():
+                self._indexes[(season, tier)] = LeagueIndex(season, tier, self.store)
+
+            index = self._indexes[(season, tier)]
+
+        with index.lock:
+            if time.time() - index.rebuilt_at > self.rebuild_interval:
+                index.refresh(full=True)
+            elif time.time() - index.refreshed_at > self.refresh_interval:
+                index.refresh()
+
+            return index.snapshot()
@@ -1,37 +1,38 @@
 # from awpy.parser import DemoParser
 # from awpy.visualization import plot
 import datetime
-import pdfkit
-import jinja2
 import json
-from matplotlib import pyplot as plt
-from matplotlib import pylab
-import pypdf
 import pathlib
-from discord_webhook import DiscordWebhook
 import io
 import os
 import zipfile
 from typing import Tuple
-from boto3 import client as Client
 from dotenv import load_dotenv
-from python_graphql_client import GraphqlClient
+from api import GraphqlClient
+from delivery import WebhookQueue
+from ingest import demo_members, extract_member
+import metrics
+from rounds import RoundIndex, load_index
+from stages import Pipeline, Stage
 
 # Load environment file with region, key, and secret
 load_dotenv(".env")
 
 
 def fetch_demos(
-        season: int, team: str, include_preseason: bool = False
+        season: int, team: str, include_preseason: bool = False, download_workers: int = 4, extract_workers: int = 2
 ) -> Tuple[str, int]:
     """
-    Fetches all demos for a team from a given season
+    Fetches all demos for a team from a given season. Demos are extracted while the next ones download.
 
     :param season: Season to get demos from
     :param team: Team to fetch demos for
     :param include_preseason: Whether to download preseason matches or not
+    :param download_workers: Demos downloaded at once
+    :param extract_workers: Demos extracted at once
     :return: Tuple containing directory all demos were downloaded in, and how many demos were fetched
     """
+    from boto3 import client as Client
 
     # Create base directory
     dir = os.path.join("temp-demos", team)
@@ -42,7 +43,7 @@ def fetch_demos(
     bucket = "cscdemos"
     client = Client(
         "s3",
-        endpoint_url=f"https://{os.environ['SPACES_REGION']}.digitaloceanspaces.com",
+        endpoint_url=os.getenv("SPACES_ENDPOINT", f"https://{os.environ['SPACES_REGION']}.digitaloceanspaces.com"),
         region_name=os.environ["SPACES_REGION"],
         aws_access_key_id=os.environ["SPACES_KEY"],
         aws_secret_access_key=os.environ["SPACES_SECRET"],
@@ -68,18 +69,34 @@ def fetch_demos(
     demo_paths = [
         x["Key"] for x in all_demos if team in x["Key"] and ".dem" in x["Key"]
     ]
-    for demo_path in demo_paths:
+
+    def download(demo_path):
+        with metrics.timed("download"):
+            yield demo_path, client.get_object(Bucket=bucket, Key=demo_path)["Body"].read()
+
+    def extract(item):
+        demo_path, file = item
         filename = os.path.join(dir, os.path.basename(demo_path))
-        file = client.get_object(Bucket=bucket, Key=demo_path)["Body"].read()
 
-        with (
-            zipfile.ZipFile(io.BytesIO(file)) as zipped,
-            open(filename, "wb") as output,
-        ):
-            with zipped.open(zipped.filelist[0]) as f:
-                output.write(f.read())
+        with metrics.timed("extract"), zipfile.ZipFile(io.BytesIO(file)) as zipped:
+            members = demo_members(zipped)
+
+            if len(members) == 0:
+                print(f"No demos in {demo_path}, skipping it")
+
+            for info in members:
+                # Archives with several demos get one file per demo, named after the archive and the member
+                if len(members) > 1:
+                    filename = os.path.join(dir, f"{pathlib.Path(demo_path).stem}-{os.path.basename(info.filename)}")
 
-    return dir, len(demo_paths)
+                yield extract_member(zipped, info, filename)
+
+    demo_files = Pipeline([
+        Stage("download", download, download_workers),
+        Stage("extract", extract, extract_workers),
+    ]).run(demo_paths)
+
+    return dir, len(demo_files)
 
 
 def get_team_demo_file_paths(team: str, folder: str, use_file_names: bool):
@@ -117,9 +134,7 @@ def parse_and_sort_by_map(files: list, file_folder: str):
         # if demo is already parsed
         print(file[0: (len(file) - 3)] + "json")
         if os.path.isfile(file[0: (len(file) - 3)] + "json"):
-            f = open((file[0: (len(file) - 3)] + "json"))
-            data = json.load(f)
-            f.close()
+            data = get_round_index(file[0: (len(file) - 3)] + "json")
         # else parse the demo
         else:
             print("Parsing")
@@ -133,14 +148,116 @@ def parse_and_sort_by_map(files: list, file_folder: str):
 
             # data = demo_parser.parse(clean=True)
 
-        if data["mapName"] in maps.keys():
-            maps[data["mapName"]].append(file[0: (len(file) - 3)] + "json")
+        if data.map_name in maps.keys():
+            maps[data.map_name].append(file[0: (len(file) - 3)] + "json")
         else:
-            maps[data["mapName"]] = [file[0: (len(file) - 3)] + "json"]
+            maps[data.map_name] = [file[0: (len(file) - 3)] + "json"]
 
     return maps
 
 
+def get_round_index(json_file: str, data: dict = None):
+    """
+    Gets the round index stored beside a parsed demo, building it from the parsed demo the first time
+
+    :param json_file: File path to the parsed demo
+    :param data: The parsed demo, if it has already been loaded
+    :return: RoundIndex for the demo
+    """
+    def build():
+        if data is not None:
+            return RoundIndex.from_game_rounds(data)
+
+        f = open(json_file)
+        index = RoundIndex.from_game_rounds(json.load(f))
+        f.close()
+
+        return index
+
+    return load_index(json_file, build)
+
+
+def new_buy_types():
+    """
+    :return: Dictionary with an empty dictionary for every type of buy for T and CT
+    """
+    return {
+        "t": {
+            "Pistol": {},
+            "Full Eco": {},
+            "Semi Eco": {},
+            "Semi Buy": {},
+            "Full Buy": {},
+        },
+        "ct": {
+            "Pistol": {},
+            "Full Eco": {},
+            "Semi Eco": {},
+            "Semi Buy": {},
+            "Full Buy": {},
+        },
+    }
+
+
+def add_match_scouting_info(team: str, data: dict, rounds: RoundIndex, positions: dict, grenades: dict,
+                            map_opponents: list):
+    """
+    Adds a team's positions 12 seconds into each round of a parsed demo and its grenades thrown before then, and the
+    opponent and score of the match
+
+    :param team: Name of team
+    :param data: Parsed demo
+    :param rounds: RoundIndex for the demo
+    :param positions: Position info for the map from new_buy_types(), updated in place
+    :param grenades: Grenade info for the map from new_buy_types(), updated in place
+    :param map_opponents: List of opponents on the map, updated in place
+    :return: Nothing
+    """
+    tickrate = rounds.tick_rate
+
+    for r in data["gameRounds"]:
+        if rounds.side(team, r["roundNum"]) == "CT":
+            side = "ct"
+        else:
+            side = "t"
+
+        buy = rounds.buy(team, r["roundNum"])
+
+        start_tick = r["freezeTimeEndTick"]
+
+        for f in r["frames"]:
+            if (f["tick"] - start_tick) / tickrate > 12:
+                for p in f[side]["players"]:
+                    if p["name"] not in positions[side][buy].keys():
+                        positions[side][buy][p["name"]] = []
+
+                    positions[side][buy][p["name"]].append(
+                        {"x": p["x"], "y": p["y"], "z": p["z"]}
+                    )
+
+                break
+
+        for g in r["grenades"]:
+            if g["throwSeconds"] <= 12 and g["throwerSide"] == side.upper():
+                if g["throwerName"] not in grenades[side][buy].keys():
+                    grenades[side][buy][g["throwerName"]] = []
+
+                grenades[side][buy][g["throwerName"]].append(
+                    {
+                        "type": g["grenadeType"],
+                        "X1": g["throwerX"],
+                        "Y1": g["throwerY"],
+                        "Z1": g["throwerZ"],
+                        "X2": g["grenadeX"],
+                        "Y2": g["grenadeY"],
+                        "Z2": g["grenadeZ"],
+                    }
+                )
+
+    score, opponent_score = rounds.final_score(team)
+    map_opponents.append(rounds.opponent(team) + " (" + str(score) + "-" + str(opponent_score) + ")")
+
+
 def get_scouting_info(team: str, map_files: dict):
     """
     Gets opponents and position and grenade info for the first 12 seconds of rounds for many types of buys for T and CT
@@ -155,100 +272,15 @@ def get_scouting_info(team: str, map_files: dict):
     opponents = {}
     for map_name in map_files.keys():
         map_opponents = []
-        positions = {
-            "t": {
-                "Pistol": {},
-                "Full Eco": {},
-                "Semi Eco": {},
-                "Semi Buy": {},
-                "Full Buy": {},
-            },
-            "ct": {
-                "Pistol": {},
-                "Full Eco": {},
-                "Semi Eco": {},
-                "Semi Buy": {},
-                "Full Buy": {},
-            },
-        }
-        grenades = {
-            "t": {
-                "Pistol": {},
-                "Full Eco": {},
-                "Semi Eco": {},
-                "Semi Buy": {},
-                "Full Buy": {},
-            },
-            "ct": {
-                "Pistol": {},
-                "Full Eco": {},
-                "Semi Eco": {},
-                "Semi Buy": {},
-                "Full Buy": {},
-            },
-        }
-
-        side = ""
+        positions = new_buy_types()
+        grenades = new_buy_types()
 
         for match in map_files[map_name]:
             f = open(match)
             data = json.load(f)
             f.close()
 
-            tickrate = data["tickRate"]
-
-            for r in data["gameRounds"]:
-                if r["ctTeam"] == team:
-                    side = "ct"
-                else:
-                    side = "t"
-
-                if r["roundNum"] == 1:
-                    if side == "ct":
-                        map_opponents.append(r["tTeam"])
-                    else:
-                        map_opponents.append(r["ctTeam"])
-
-                if r["roundNum"] in [1, 16]:
-                    buy = "Pistol"
-                else:
-                    buy = r[side + "BuyType"]
-
-                start_tick = r["freezeTimeEndTick"]
-
-                for f in r["frames"]:
-                    if (f["tick"] - start_tick) / tickrate > 12:
-                        for p in f[side]["players"]:
-                            if p["name"] not in positions[side][buy].keys():
-                                positions[side][buy][p["name"]] = []
-
-                            positions[side][buy][p["name"]].append(
-                                {"x": p["x"], "y": p["y"], "z": p["z"]}
-                            )
-
-                        break
-
-                for g in r["grenades"]:
-                    if g["throwSeconds"] <= 12 and g["throwerSide"] == side.upper():
-                        if g["throwerName"] not in grenades[side][buy].keys():
-                            grenades[side][buy][g["throwerName"]] = []
-
-                        grenades[side][buy][g["throwerName"]].append(
-                            {
-                                "type": g["grenadeType"],
-                                "X1": g["throwerX"],
-                                "Y1": g["throwerY"],
-                                "Z1": g["throwerZ"],
-                                "X2": g["grenadeX"],
-                                "Y2": g["grenadeY"],
-                                "Z2": g["grenadeZ"],
-                            }
-                        )
-
-            if side == "ct":
-                map_opponents[-1] += " (" + str(r["endCTScore"]) + "-" + str(r["endTScore"]) + ")"
-            else:
-                map_opponents[-1] += " (" + str(r["endTScore"]) + "-" + str(r["endCTScore"]) + ")"
+            add_match_scouting_info(team, data, get_round_index(match, data), positions, grenades, map_opponents)
 
         position_info[map_name] = positions
         grenades_info[map_name] = grenades
@@ -257,6 +289,58 @@ def get_scouting_info(team: str, map_files: dict):
     return opponents, position_info, grenades_info
 
 
+def get_many_scouting_info(teams: list, folder: str):
+    """
+    Gets scouting info and map results for many teams in a single pass over the parsed demos in a folder. Each demo is
+    loaded once and used for every listed team that played in it, instead of once per team per report section.
+
+    :param teams: List of team names
+    :param folder: File path to folder containing demos
+    :return: Dictionary of team names to dictionaries with "opponents", "positions" and "grenades" by map, as returned
+    by get_scouting_info, and "results", a list of RoundIndex.result tuples by map
+    """
+    info = {team: {"opponents": {}, "positions": {}, "grenades": {}, "results": {}} for team in teams}
+
+    for file in os.listdir(folder):
+        if file[(len(file) - 3): len(file)] != "dem":
+            continue
+
+        playing = [team for team in teams if team.replace(" ", "") in file]
+        json_file = folder + "/" + file[0: (len(file) - 3)] + "json"
+
+        if len(playing) == 0:
+            continue
+
+        if not os.path.isfile(json_file):
+            print("Skipping unparsed demo " + file)
+            continue
+
+        with metrics.timed("parse"):
+            f = open(json_file)
+            data = json.load(f)
+            f.close()
+
+            rounds = get_round_index(json_file, data)
+
+        map_name = rounds.map_name
+
+        with metrics.timed("aggregate"):
+            for team in playing:
+                team_info = info[team]
+
+                if map_name not in team_info["opponents"].keys():
+                    team_info["opponents"][map_name] = []
+                    team_info["positions"][map_name] = new_buy_types()
+                    team_info["grenades"][map_name] = new_buy_types()
+                    team_info["results"][map_name] = []
+
+                add_match_scouting_info(team, data, rounds, team_info["positions"][map_name],
+                                        team_info["grenades"][map_name], team_info["opponents"][map_name])
+                team_info["results"][map_name].append(rounds.result(team))
+
+    return info
+
+
 # map_position_info: {"t": {"Pistol": player_positions, "Full Eco": {}, "Semi Eco": {}, ...}, "ct": {}}
 def get_map_buy_pictures(
         map_name: str, map_position_info: dict, grenades_info: dict, players
@@ -271,6 +355,9 @@ def get_map_buy_pictures(
     :param players: List of all players plotted so far. Used to keep colors on plots for players consistent
     :return: Updated list of players plotted so far
     """
+    from matplotlib import pyplot as plt
+    from matplotlib import pylab
+
     for side in map_position_info.keys():
         for buy in map_position_info[side].keys():
             figure, axes, players = get_single_plot(
@@ -316,94 +403,18 @@ def get_single_plot(
     :param players: List of players plotted so far. Used to keep colors on plots for players consistent
     :return: The figure and axes for the plot, and an updated list of plotted players
     """
-    # figure, axes = plot.plot_map(map_name=map_name, dark=False)
-    #
-    # total_dots = 0
-    #
-    # for key in player_positions.keys():
-    #     total_dots += len(player_positions[key])
-    #
-    # if map_name in ("de_vertigo", "de_nuke"):
-    #     if total_dots > 50:
-    #         dot_size = 10
-    #     else:
-    #         dot_size = 10
-    # else:
-    #     if total_dots > 50:
-    #         dot_size = 40
-    #     else:
-    #         dot_size = 40
-    #
-    # for player in grenades.keys():
-    #     if player not in players:
-    #         players.append(player)
-    #     for grenade in grenades[player]:
-    #         if grenade["type"] == "Decoy Grenade":
-    #             continue
-    #
-    #         if map_name not in ("de_vertigo", "de_nuke"):
-    #             x1, y1, z1 = plot.position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z1"])
-    #             )
-    #             x2, y2, z2 = plot.position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #         elif map_name == "de_vertigo":
-    #             # Don't plot a grenade that went off the map
-    #             if grenade["Z2"] < 10000:
-    #                 continue
-    #
-    #             x1, y1, z1 = plot.position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z2"])
-    #             )
-    #             x2, y2, z2 = plot.position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #         else:
-    #             x1, y1, z1 = plot.position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z2"])
-    #             )
-    #             x2, y2, z2 = plot.position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #
-    #         # From awpy.visualization.plot.plot_nades()
-    #         g_color = {
-    #             "Incendiary Grenade": "red",
-    #             "Molotov": "red",
-    #             "Smoke Grenade": "gray",
-    #             "HE Grenade": "green",
-    #             "Flashbang": "gold",
-    #         }[grenade["type"]]
-    #
-    #         axes.plot(
-    #             [x1, x2], [y1, y2], color=("C" + str(players.index(player))), alpha=0.1
-    #         )
-    #         axes.scatter(x2, y2, color=g_color, s=dot_size, alpha=0.6, marker="x")
-    #
-    # for player in player_positions.keys():
-    #     if player not in players:
-    #         players.append(player)
-    #     for position in player_positions[player]:
-    #         x, y, z = plot.position_transform_all(
-    #             map_name, (position["x"], position["y"], position["z"])
-    #         )
-    #
-    #         axes.scatter(
-    #             x,
-    #             y,
-    #             color=("C" + str(players.index(player))),
-    #             label=player,
-    #             s=dot_size,
-    #             zorder=100,
-    #         )
-    #
-    # axes.get_xaxis().set_visible(b=False)
-    # axes.get_yaxis().set_visible(b=False)
-    #
-    # figure.set_size_inches(10, 10)
-    #
-    # return figure, axes, players
+    import numpy as np
+
+    import visualization
+
+    position_arrays = {}
+
+    for player in player_positions.keys():
+        position_arrays[player] = tuple(
+            np.array([position[axis] for position in player_positions[player]]) for axis in ("x", "y", "z")
+        )
+
+    return visualization.get_single_plot(map_name, position_arrays, players, grenades)
 
 
 def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file: str):
@@ -417,6 +428,9 @@ def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file:
     :param output_file: File path for pdf output
     :return: Nothing
     """
+    import jinja2
+    import pdfkit
+
     template_loader = jinja2.FileSystemLoader("./")
     template_env = jinja2.Environment(loader=template_loader)
 
@@ -454,17 +468,29 @@ def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file:
     )
 
 
-def get_scouting_report(team: str, file_path: str):
+def get_scouting_report(team: str, file_path: str, scouting_info: dict = None):
     """
     Creates a pdf with player positions 12 seconds into every round, sorted by side and team buy type.
 
     :param team: The team to create the pdf for
     :param file_path: File path to folder with demos
+    :param scouting_info: The team's info from get_many_scouting_info, if it has already been gathered
     :return: Nothing
     """
-    demo_files = get_team_demo_file_paths(team, file_path, True)
-    sorted_json_files = parse_and_sort_by_map(demo_files, file_path)
-    opponents, position_info, grenades_info = get_scouting_info(team, sorted_json_files)
+    import pypdf
+
+    if scouting_info is None:
+        demo_files = get_team_demo_file_paths(team, file_path, True)
+
+        with metrics.timed("parse"):
+            sorted_json_files = parse_and_sort_by_map(demo_files, file_path)
+
+        with metrics.timed("aggregate"):
+            opponents, position_info, grenades_info = get_scouting_info(team, sorted_json_files)
+    else:
+        opponents = scouting_info["opponents"]
+        position_info = scouting_info["positions"]
+        grenades_info = scouting_info["grenades"]
 
     path = str(pathlib.Path(__file__).parent.resolve())
 
@@ -486,11 +512,13 @@ def get_scouting_report(team: str, file_path: str):
     players = []
 
     for m in opponents.keys():
-        players = get_map_buy_pictures(m, position_info[m], grenades_info[m], players)
+        with metrics.timed("render"):
+            players = get_map_buy_pictures(m, position_info[m], grenades_info[m], players)
 
         opps = ", ".join([str(elem) for elem in opponents[m]])
 
-        to_pdf(team, m, opps, images, "./temp-pdfs/" + m + ".pdf")
+        with metrics.timed("pdf"):
+            to_pdf(team, m, opps, images, "./temp-pdfs/" + m + ".pdf")
 
         merger.append("./temp-pdfs/" + m + ".pdf")
 
@@ -498,21 +526,36 @@ def get_scouting_report(team: str, file_path: str):
     merger.close()
 
 
-def get_team_map_win_info(team: str, file_path: str, season: int):
+def get_team_map_win_info(team: str, file_path: str, season: int, results: dict = None, rwp_cache: dict = None):
     """
     Gets Win-Loss, RWP, and OARWP information for a given team on each map they have played
 
     :param season: CSC Season num
     :param team: Name of team
     :param file_path: File path to folder with demos
+    :param results: The team's results from get_many_scouting_info, if they have already been gathered
+    :param rwp_cache: Dictionary of team names to get_team_overall_rwp results, shared between calls so each opponent
+    is only queried once
     :return: A list with strings containing the map info for each map
     """
-    demo_files = get_team_demo_file_paths(team, file_path, True)
-    sorted_json_files = parse_and_sort_by_map(demo_files, file_path)
+    if results is None:
+        demo_files = get_team_demo_file_paths(team, file_path, True)
+        sorted_json_files = parse_and_sort_by_map(demo_files, file_path)
+
+        results = {}
+
+        for map in sorted_json_files.keys():
+            results[map] = []
+
+            for match in sorted_json_files[map]:
+                results[map].append(get_round_index(match).result(team))
+
+    if rwp_cache is None:
+        rwp_cache = {}
 
     team_win_info = []
 
-    for map in sorted_json_files.keys():
+    for map in results.keys():
         wins = 0
         losses = 0
         round_wins = 0
@@ -521,34 +564,19 @@ def get_team_map_win_info(team: str, file_path: str, season: int):
         opp_round_wins = 0
         opp_round_losses = 0
 
-        for match in sorted_json_files[map]:
-            file = open(match)
-            data = json.load(file)
-            file.close()
+        for opp_team, won, match_round_wins, match_round_losses in results[map]:
+            round_wins += match_round_wins
+            round_losses += match_round_losses
 
-            if data["gameRounds"][0]["ctTeam"] == team:
-                opp_team = data["gameRounds"][0]["tTeam"]
-            else:
-                opp_team = data["gameRounds"][0]["ctTeam"]
-
-            for r in data["gameRounds"]:
-                if r["winningTeam"] == team:
-                    round_wins += 1
-                else:
-                    round_losses += 1
-
-            if r["endTScore"] > r["endCTScore"] and r["tTeam"] == team:
-                wins += 1
-            elif r["endTScore"] < r["endCTScore"] and r["tTeam"] == team:
-                losses += 1
-            elif r["endTScore"] > r["endCTScore"] and r["ctTeam"] == team:
-                losses += 1
-            elif r["endTScore"] < r["endCTScore"] and r["ctTeam"] == team:
+            if won:
                 wins += 1
             else:
-                raise Exception("Tie game")
+                losses += 1
+
+            if opp_team not in rwp_cache.keys():
+                rwp_cache[opp_team] = get_team_overall_rwp(opp_team, season)
 
-            opp_info = get_team_overall_rwp(opp_team, season)
+            opp_info = rwp_cache[opp_team]
             opp_round_wins += opp_info[0]
             opp_round_losses += opp_info[1]
 
@@ -930,7 +958,8 @@ def get_team_summary_stats(team: str, season: int, tier: str):
     return message
 
 
-def send_discord_message(team: str, webhook_url: str, file_path: str, season: int):
+def send_discord_message(team: str, webhook_url: str, file_path: str, season: int, scouting_info: dict = None,
+                         rwp_cache: dict = None, queue: WebhookQueue = None):
     """
     Send a discord message with the scouting report PDF, and team map stats for a given team for demos from a given
     folder
@@ -938,11 +967,17 @@ def send_discord_message(team: str, webhook_url: str, file_path: str, season: in
     :param team: Name of team
     :param webhook_url: URL of webhook to send discord messages to
     :param file_path: File path to folder with demos
-    :return: Nothing
+    :param scouting_info: The team's info from get_many_scouting_info, if it has already been gathered
+    :param rwp_cache: Dictionary of opponent round wins and losses shared between teams, see get_team_map_win_info
+    :param queue: WebhookQueue to deliver the message with in the background, or None to deliver it before returning
+    :return: Future for the delivery if a queue is given, else nothing
     """
-    get_scouting_report(team, file_path)
+    get_scouting_report(team, file_path, scouting_info)
 
-    win_info = get_team_map_win_info(team, file_path, season)
+    if scouting_info is None:
+        win_info = get_team_map_win_info(team, file_path, season, rwp_cache=rwp_cache)
+    else:
+        win_info = get_team_map_win_info(team, file_path, season, scouting_info["results"], rwp_cache)
 
     info_message = team + " Scouting Report:```\n"
     info_message = info_message + "Map\t\t\t\tW-L\tRWP \tOARWP\n"
@@ -953,12 +988,13 @@ def send_discord_message(team: str, webhook_url: str, file_path: str, season: in
 
     info_message = info_message + get_team_players_map_stats(team, season) + get_team_players_awp_stats(team, season)
 
-    webhook = DiscordWebhook(url=webhook_url, content=info_message)
+    files = [("./output/" + team + "_scouting.pdf", team + ".pdf")]
 
-    with open("./output/" + team + "_scouting.pdf", "rb") as f:
-        webhook.add_file(file=f.read(), filename=team + ".pdf")
+    if queue is not None:
+        return queue.submit(webhook_url, info_message, files)
 
-    webhook.execute()
+    with WebhookQueue(workers=1) as queue:
+        queue.send(webhook_url, info_message, files)
 
 
 # teams_and_webhooks: {"team1": "webhook1", "team2": "webhook2", ...}
@@ -972,13 +1008,38 @@ def send_many_discord_messages(teams_and_webhooks: dict, file_path: str, season:
     :param file_path: File path to folder with demos
     :return: Nothing
     """
-    for t, w in teams_and_webhooks.items():
-        send_discord_message(t, w, file_path, season)
+    # Read every demo once for all teams, and query each opponent's round record once
+    scouting_info = get_many_scouting_info(list(teams_and_webhooks.keys()), file_path)
+    rwp_cache = {}
+
+    # Reports upload in the background while the next one is built
+    with WebhookQueue() as queue:
+        deliveries = {}
+
+        for t, w in teams_and_webhooks.items():
+            deliveries[t] = send_discord_message(t, w, file_path, season, scouting_info[t], rwp_cache, queue)
+
+        for t, delivery in deliveries.items():
+            try:
+                delivery.result()
+            except Exception as e:
+                print("Failed to send scouting report for " + t + ": " + str(e))
 
 
 if __name__ == "__main__":
+    import profiling
+
+    metrics_enabled = metrics.enable_from_env()
+    profiling_enabled = profiling.enable_from_env()
+
     team_name = "Assassins"
     season_num = 13
     tier_name = "Contender"
 
-    print(get_team_summary_stats(team_name, season_num, tier_name))
\ No newline at end of file
+    print(get_team_summary_stats(team_name, season_num, tier_name))
+
+    if metrics_enabled:
+        print(metrics.summary())
+
+    if profiling_enabled:
+        print(profiling.summary())
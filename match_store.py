@@ -0,0 +1,491 @@
+import json
+import sqlite3
+import sys
+import threading
+
+from api import GraphqlClient
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    season INTEGER,
+    tier TEXT,
+    match_day TEXT,
+    match_type TEXT,
+    map_name TEXT
+);
+CREATE INDEX IF NOT EXISTS matches_season_tier ON matches (season, tier);
+
+CREATE TABLE IF NOT EXISTS team_stats (
+    match_id INTEGER,
+    position INTEGER,
+    name TEXT,
+    score INTEGER,
+    ct_r INTEGER,
+    t_r INTEGER,
+    PRIMARY KEY (match_id, position)
+);
+CREATE INDEX IF NOT EXISTS team_stats_name ON team_stats (name);
+
+CREATE TABLE IF NOT EXISTS player_match_stats (
+    match_id INTEGER,
+    name TEXT,
+    side INTEGER,
+    rating REAL,
+    PRIMARY KEY (match_id, name, side)
+);
+CREATE INDEX IF NOT EXISTS player_match_stats_name ON player_match_stats (name, side);
+
+CREATE TABLE IF NOT EXISTS map_bans (
+    match_id INTEGER,
+    season INTEGER,
+    team_id TEXT,
+    team_name TEXT,
+    map TEXT,
+    number INTEGER,
+    PRIMARY KEY (match_id, number)
+);
+CREATE INDEX IF NOT EXISTS map_bans_season_team ON map_bans (season, team_name);
+
+CREATE TABLE IF NOT EXISTS rosters (
+    team TEXT,
+    name TEXT,
+    type TEXT,
+    PRIMARY KEY (team, name)
+);
+
+CREATE TABLE IF NOT EXISTS match_history (
+    id TEXT PRIMARY KEY,
+    season INTEGER,
+    tier TEXT,
+    franchise TEXT,
+    position INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS match_history_team ON match_history (season, tier, franchise);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class MatchStore:
+    """
+    Local SQLite mirror of stats API matches, team stats, player match stats, and core map bans, rosters and match
+    history. Queries return the same shapes as the APIs so the report functions can use either source.
+    """
+
+    def __init__(self, path: str = "matches.db"):
+        """
+        :param path: File path to the SQLite database, or ":memory:"
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._connection.close()
+
+    def _get_state(self, key: str):
+        row = self._connection.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def _set_state(self, key: str, value):
+        self._connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, json.dumps(value)))
+
+    # Inserts
+
+    def add_matches(self, matches: list):
+        """
+        Adds matches from the stats API findManyMatch query (with teamStats and matchStats) to the store
+
+        :param matches: List of matches
+        :return: Nothing
+        """
+        with self._lock, self._connection:
+            for match in matches:
+                match_id = int(match["id"])
+
+                # A match that was corrected upstream may have other players or teams than the stored one
+                self._connection.execute("DELETE FROM team_stats WHERE match_id = ?", (match_id,))
+                self._connection.execute("DELETE FROM player_match_stats WHERE match_id = ?", (match_id,))
+
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?)",
+                    (match_id, match["season"], match["tier"], match["matchDay"], match["matchType"],
+                     match["mapName"])
+                )
+
+                for position, team in enumerate(match["teamStats"]):
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO team_stats VALUES (?, ?, ?, ?, ?, ?)",
+                        (match_id, position, team["name"], team["score"], team["ctR"], team["TR"])
+                    )
+
+                for player in match["matchStats"]:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO player_match_stats VALUES (?, ?, ?, ?)",
+                        (match_id, player["name"], player["side"], player["rating"])
+                    )
+
+    def add_map_bans(self, season: int, matches: list):
+        """
+        Adds map bans from the core matches query to the store
+
+        :param season: CSC Season number
+        :param matches: List of core matches with id and lobby map bans
+        :return: Nothing
+        """
+        with self._lock, self._connection:
+            for match in matches:
+                if match["lobby"] is None:
+                    continue
+
+                for ban in match["lobby"]["mapBans"]:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO map_bans VALUES (?, ?, ?, ?, ?, ?)",
+                        (match["id"], season, ban["team"]["id"], ban["team"]["name"], ban["map"], ban["number"])
+                    )
+
+    def add_roster(self, team: str, players: list):
+        """
+        Replaces the stored roster for a team
+
+        :param team: Team name
+        :param players: List of players with name and type
+        :return: Nothing
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM rosters WHERE team = ?", (team,))
+
+            for player in players:
+                self._connection.execute("INSERT INTO rosters VALUES (?, ?, ?)", (team, player["name"], player["type"]))
+
+    def add_match_history(self, season: int, tier: str, franchise: str, matches: list):
+        """
+        Adds core matches, as returned by the match history query, to the store
+
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param franchise: Franchise name
+        :param matches: List of core matches
+        :return: Nothing
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM match_history WHERE season = ? AND tier = ? AND franchise = ?", (season, tier, franchise)
+            )
+
+            for position, match in enumerate(matches):
+                key = match.get("id", f"{season}-{tier}-{franchise}-{position}")
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO match_history VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(key), season, tier, franchise, position, json.dumps(match))
+                )
+
+    def load_fixture(self, path: str):
+        """
+        Populates the store from a recorded json fixture with "season", "matches", "map_bans", "rosters" and
+        "match_history" keys, each optional
+
+        :param path: File path to the fixture
+        :return: Nothing
+        """
+        with open(path) as f:
+            fixture = json.load(f)
+
+        self.add_matches(fixture.get("matches", []))
+        self.add_map_bans(fixture.get("season"), fixture.get("map_bans", []))
+
+        for team, players in fixture.get("rosters", {}).items():
+            self.add_roster(team, players)
+
+        for history in fixture.get("match_history", []):
+            self.add_match_history(history["season"], history["tier"], history["franchise"], history["matches"])
+
+    # Incremental sync
+
+    def recent_match_days(self, season: int, count: int):
+        """
+        :param season: CSC Season number
+        :param count: Number of match days
+        :return: The season's last count match days in the store, by their newest match
+        """
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                "SELECT match_day FROM matches WHERE season = ? AND match_day != '' "
+                "GROUP BY match_day ORDER BY MAX(id) DESC LIMIT ?",
+                (season, count)
+            )]
+
+    def sync_matches(self, season: int, recent_match_days: int = 2):
+        """
+        Fetches every match of a season newer than the last synced match from the stats API, and fetches the matches of
+        the most recent match days again, since scores and stats are still corrected in the days after they're played
+
+        :param season: CSC Season number
+        :param recent_match_days: Number of stored match days to fetch again, 0 to only fetch new matches
+        :return: Number of matches added or updated
+        """
+        client = GraphqlClient(endpoint="https://stats.csconfederation.com/graphql")
+
+        last_id = self._get_state(f"matches:{season}")
+
+        id_filter = ""
+        if last_id is not None:
+            match_days = self.recent_match_days(season, recent_match_days) if recent_match_days > 0 else []
+
+            if match_days:
+                id_filter = ", OR: [{id: {gt: %d}}, {matchDay: {in: %s}}]" % (int(last_id), json.dumps(match_days))
+            else:
+                id_filter = ", id: {gt: %d}" % int(last_id)
+
+        query = """
+        query MyQuery {
+          findManyMatch(
+            where: {season: {equals: %s}%s}
+          ) {
+            id
+            season
+            tier
+            matchDay
+            matchType
+            mapName
+            teamStats {
+              name
+              score
+              ctR
+              TR
+            }
+            matchStats {
+              name
+              side
+              rating
+            }
+          }
+        } """ % (season, id_filter)
+
+        matches = client.execute(query=query)["data"]["findManyMatch"]
+
+        self.add_matches(matches)
+
+        if matches:
+            with self._lock, self._connection:
+                self._set_state(f"matches:{season}", max([int(m["id"]) for m in matches] +
+                                                         ([int(last_id)] if last_id is not None else [])))
+
+        return len(matches)
+
+    def sync_map_bans(self, season: int, team_ids: dict):
+        """
+        Fetches map bans from core for each team. Matches that are already stored are skipped.
+
+        :param season: CSC Season number
+        :param team_ids: Dictionary of team names to core team ids
+        :return: Number of matches added
+        """
+        client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+
+        added = 0
+
+        for team_id in team_ids.values():
+            query = """
+            query myquery	 {
+                matches(season: %s, teamId: "%s") {
+                    id
+                    lobby {
+                        mapBans {
+                            team {
+                                name
+                                id
+                            }
+                            map
+                            number
+                        }
+                    }
+                }
+            } """ % (season, team_id)
+
+            matches = client.execute(query=query)["data"]["matches"]
+
+            stored = set(row[0] for row in self._connection.execute(
+                "SELECT DISTINCT match_id FROM map_bans WHERE season = ?", (season,)
+            ))
+
+            new_matches = [m for m in matches if m["id"] not in stored]
+            self.add_map_bans(season, new_matches)
+            added += len(new_matches)
+
+        return added
+
+    def sync_rosters(self, teams: list):
+        """
+        Fetches the current roster of each team from core
+
+        :param teams: List of team names
+        :return: Nothing
+        """
+        client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+
+        for team in teams:
+            query = """
+                query myquery	 {
+                    team(teamName: %s){players{name, type}}
+                }
+                """ % ("\"" + team + "\"")
+
+            self.add_roster(team, client.execute(query=query)["data"]["team"]["players"])
+
+    # Queries
+
+    def tier_matches(self, season: int, tier: str, after_id=None):
+        """
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param after_id: Only return matches with an id greater than this
+        :return: Regulation match day matches in the same shape as the stats API findManyMatch query
+        """
+        query = "SELECT id, map_name FROM matches " \
+                "WHERE season = ? AND tier = ? AND match_day != '' AND match_type = 'Regulation'"
+        params = [season, tier]
+
+        if after_id is not None:
+            query += " AND id > ?"
+            params.append(int(after_id))
+
+        matches = []
+
+        with self._lock:
+            for match_id, map_name in self._connection.execute(query + " ORDER BY id", params).fetchall():
+                team_stats = self._connection.execute(
+                    "SELECT name, score FROM team_stats WHERE match_id = ? ORDER BY position", (match_id,)
+                ).fetchall()
+
+                matches.append({
+                    "id": match_id,
+                    "teamStats": [{"name": name, "score": score} for name, score in team_stats],
+                    "mapName": map_name,
+                })
+
+        return matches
+
+    def player_matches(self, season: int, player: str):
+        """
+        :param season: CSC Season number
+        :param player: Player name
+        :return: Regulation match day matches the player played with their overall rating, in the same shape as the
+        stats API findManyMatch query
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT m.map_name, p.rating FROM matches m JOIN player_match_stats p ON p.match_id = m.id "
+                "WHERE m.season = ? AND m.match_day != '' AND m.match_type = 'Regulation' AND p.name = ? "
+                "AND p.side = 4 ORDER BY m.id",
+                (season, player)
+            ).fetchall()
+
+        return [{"mapName": map_name, "matchStats": [{"rating": rating}]} for map_name, rating in rows]
+
+    def team_map_bans(self, season: int, team: str):
+        """
+        :param season: CSC Season number
+        :param team: Team name
+        :return: Matches with map bans the team took part in, in the same shape as the core matches query
+        """
+        with self._lock:
+            match_ids = [row[0] for row in self._connection.execute(
+                "SELECT DISTINCT match_id FROM map_bans WHERE season = ? AND team_name = ?", (season, team)
+            )]
+
+            matches = []
+
+            for match_id in match_ids:
+                bans = self._connection.execute(
+                    "SELECT team_name, team_id, map, number FROM map_bans WHERE match_id = ? ORDER BY number",
+                    (match_id,)
+                ).fetchall()
+
+                matches.append({"lobby": {"mapBans": [
+                    {"team": {"name": name, "id": team_id}, "map": map_name, "number": number}
+                    for name, team_id, map_name, number in bans
+                ]}})
+
+        return matches
+
+    def roster(self, team: str):
+        """
+        :param team: Team name
+        :return: List of players with name and type, or None if the roster hasn't been synced
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT name, type FROM rosters WHERE team = ?", (team,)).fetchall()
+
+        if not rows:
+            return None
+
+        return [{"name": name, "type": player_type} for name, player_type in rows]
+
+    def match_history(self, season: int, tier: str, franchise: str):
+        """
+        :param season: CSC Season number
+        :param tier: Tier name
+        :param franchise: Franchise name
+        :return: List of core matches, or None if the match history hasn't been synced
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT data FROM match_history WHERE season = ? AND tier = ? AND franchise = ? ORDER BY position",
+                (season, tier, franchise)
+            ).fetchall()
+
+        if not rows:
+            return None
+
+        return [json.loads(row[0]) for row in rows]
+
+
+if __name__ == "__main__":
+    # Usage: python match_store.py <season> [database path]
+    from directory import TeamDirectory
+
+    season_num = int(sys.argv[1])
+    store = MatchStore(sys.argv[2] if len(sys.argv) > 2 else "matches.db")
+
+    team_directory = TeamDirectory()
+    team_directory.load()
+
+    print(f"Synced {store.sync_matches(season_num)} new and updated matches")
+    print(f"Synced map bans for {store.sync_map_bans(season_num, team_directory.team_ids)} new matches")
+    store.sync_rosters(list(team_directory.team_ids.keys()))
+
+    for prefix, tier_name in team_directory.active_teams():
+        franchise_name = team_directory.franchise_names[prefix]
+
+        client = GraphqlClient(endpoint="https://core.csconfederation.com/graphql")
+
+        history_query = """
+            query myquery {
+                matches(season: %s, tier: "%s", franchise: "%s") {
+                    id,
+                    away { name, franchise { prefix } },
+                    home { name, franchise { prefix } },
+                    scheduledDate,
+                    location,
+                    demoUrl,
+                    stats { awayScore, homeScore, mapName, mapNumber, winner { franchise { prefix } } },
+                    matchDay { number }
+                }
+            } """ % (season_num, tier_name, franchise_name)
+
+        store.add_match_history(season_num, tier_name, franchise_name,
+                                client.execute(query=history_query)["data"]["matches"])
+
+    store.close()
@@ -0,0 +1,236 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+# Shared do-nothing context manager returned by timed() while metrics are disabled
+_NULL_TIMER = contextlib.nullcontext()
+
+# Optional function (stage, timer) -> context manager wrapping every timed stage, set by profiling.enable()
+_stage_hook = None
+
+
+class _Timer:
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        observe(self.stage, time.perf_counter() - self.start)
+
+        if exc_type is not None:
+            count(self.stage + ".errors")
+
+        return False
+
+
+def timed(stage: str):
+    """
+    Times a block of code and records it in the latency histogram for the stage
+
+    :param stage: Stage name, e.g. "graphql.findManyMatch" or "pdf"
+    :return: Context manager to wrap the stage in
+    """
+    if not _enabled:
+        return _NULL_TIMER
+
+    if _stage_hook is not None:
+        return _stage_hook(stage, _Timer(stage))
+
+    return _Timer(stage)
+
+
+def observe(stage: str, seconds: float):
+    """
+    Records a latency for a stage
+
+    :param stage: Stage name
+    :param seconds: Latency in seconds
+    :return: Nothing
+    """
+    if not _enabled:
+        return
+
+    with _lock:
+        if stage not in _histograms.keys():
+            _histograms[stage] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+
+        histogram = _histograms[stage]
+
+        for i in range(len(BUCKETS)):
+            if seconds <= BUCKETS[i]:
+                histogram["buckets"][i] += 1
+                break
+        else:
+            histogram["buckets"][-1] += 1
+
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def count(name: str, amount: int = 1):
+    """
+    Increments a counter
+
+    :param name: Counter name
+    :param amount: Amount to increment by
+    :return: Nothing
+    """
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot():
+    """
+    :return: Dictionary with a copy of all histograms and counters
+    """
+    with _lock:
+        return {
+            "time": time.time(),
+            "buckets": list(BUCKETS),
+            "histograms": {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                           for k, v in _histograms.items()},
+            "counters": dict(_counters),
+        }
+
+
+def reset():
+    """
+    Clears all histograms and counters
+
+    :return: Nothing
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def render_text():
+    """
+    :return: All metrics in the Prometheus text exposition format
+    """
+    data = snapshot()
+    lines = []
+
+    for stage, histogram in sorted(data["histograms"].items()):
+        cumulative = 0
+
+        for bound, bucket in zip(list(BUCKETS) + ["+Inf"], histogram["buckets"]):
+            cumulative += bucket
+            lines.append(f'stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+
+        lines.append(f'stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+        lines.append(f'stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f'counter_total{{name="{name}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """
+    :return: Human readable table with count, mean and total time per stage
+    """
+    data = snapshot()
+
+    lines = ["Stage" + " " * 35 + "Count     Mean (s)  Total (s)"]
+
+    for stage, histogram in sorted(data["histograms"].items()):
+        mean = str(round(histogram["sum"] / histogram["count"], 4))
+        total = str(round(histogram["sum"], 2))
+
+        lines.append(stage + " " * (40 - len(stage)) + str(histogram["count"]) +
+                     " " * (10 - len(str(histogram["count"]))) + mean + " " * (10 - len(mean)) + total)
+
+    return "\n".join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics.json":
+            body = json.dumps(snapshot()).encode()
+            content_type = "application/json"
+        else:
+            body = render_text().encode()
+            content_type = "text/plain; version=0.0.4"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _dump_loop(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        dump(path)
+
+
+def dump(path: str):
+    """
+    Appends a json snapshot of all metrics as a single line to a file
+
+    :param path: File path to append to
+    :return: Nothing
+    """
+    with open(path, "a") as f:
+        f.write(json.dumps(snapshot()) + "\n")
+
+
+def enable(port: int = None, dump_path: str = None, dump_interval: float = 60):
+    """
+    Turns on metric collection, optionally serving them on a local HTTP endpoint and / or dumping them periodically
+
+    :param port: Port to serve /metrics (Prometheus text) and /metrics.json on, bound to localhost
+    :param dump_path: File path to append json snapshots to
+    :param dump_interval: Seconds between dumps
+    :return: Nothing
+    """
+    global _enabled
+    _enabled = True
+
+    if port is not None:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    if dump_path is not None:
+        threading.Thread(target=_dump_loop, args=(dump_path, dump_interval), daemon=True).start()
+
+
+def enable_from_env():
+    """
+    Turns on metric collection if METRICS_PORT, METRICS_DUMP or METRICS is set
+
+    :return: Whether metrics were enabled
+    """
+    port = os.getenv("METRICS_PORT")
+    dump_path = os.getenv("METRICS_DUMP")
+
+    if port is None and dump_path is None and os.getenv("METRICS") is None:
+        return False
+
+    enable(int(port) if port is not None else None, dump_path, float(os.getenv("METRICS_DUMP_INTERVAL", 60)))
+
+    return True
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+SIDES = ["TERRORIST", "CT"]
+
+BUY_TYPES = ["Pistol", "Full Eco", "Semi Eco", "Semi Buy", "Full Buy"]
+
+
+class PositionStore:
+    """
+    Columnar store of player positions for one map. Coordinates are float32 arrays, and side, buy type, player, demo
+    and round are small integer codes, so a position costs 20 bytes instead of a dict per point. Arrays grow
+    geometrically, so appending and merging don't allocate per point.
+    """
+
+    COLUMNS = {"x": np.float32, "y": np.float32, "z": np.float32, "side": np.int8, "buy": np.int8,
+               "player": np.int16, "demo": np.int16, "round": np.int16}
+
+    def __init__(self, capacity: int = 256):
+        """
+        :param capacity: Number of positions to allocate space for up front
+        """
+        self.size = 0
+        self.players = []
+        self.demos = []
+        self._player_codes = {}
+        self._demo_codes = {}
+        self._columns = {name: np.empty(capacity, dtype) for name, dtype in self.COLUMNS.items()}
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # Expose the used part of each column as an attribute, e.g. store.x
+        if name in PositionStore.COLUMNS and "_columns" in self.__dict__:
+            return self._columns[name][:self.size]
+
+        raise AttributeError(name)
+
+    @property
+    def nbytes(self):
+        return sum(column[:self.size].nbytes for column in self._columns.values())
+
+    def _reserve(self, count: int):
+        capacity = len(self._columns["x"])
+
+        if self.size + count <= capacity:
+            return
+
+        while capacity < self.size + count:
+            capacity *= 2
+
+        for name in self._columns.keys():
+            column = np.empty(capacity, self.COLUMNS[name])
+            column[:self.size] = self._columns[name][:self.size]
+            self._columns[name] = column
+
+    def _codes(self, values, categories: list, codes: dict):
+        # Encode a batch of names with one lookup per distinct name, not per point
+        unique, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+
+        for value in unique:
+            if value not in codes.keys():
+                codes[value] = len(categories)
+                categories.append(value)
+
+        return np.array([codes[value] for value in unique], dtype=np.int16)[inverse]
+
+    def player_code(self, player: str):
+        """
+        :param player: Player name
+        :return: Code of the player, or -1 if the store has no positions for them
+        """
+        return self._player_codes.get(player, -1)
+
+    def append(self, x, y, z, side, buy, players, demo: str, rounds):
+        """
+        Appends a batch of positions from a single demo
+
+        :param x: Array of X coordinates
+        :param y: Array of Y coordinates
+        :param z: Array of Z coordinates
+        :param side: Array of side codes (indexes into SIDES)
+        :param buy: Array of buy type codes (indexes into BUY_TYPES)
+        :param players: Array of player names
+        :param demo: Name of the demo the positions are from
+        :param rounds: Array of round indexes within the demo
+        :return: Nothing
+        """
+        count = len(x)
+
+        if count == 0:
+            return
+
+        self._reserve(count)
+
+        if demo not in self._demo_codes.keys():
+            self._demo_codes[demo] = len(self.demos)
+            self.demos.append(demo)
+
+        end = self.size + count
+
+        self._columns["x"][self.size:end] = x
+        self._columns["y"][self.size:end] = y
+        self._columns["z"][self.size:end] = z
+        self._columns["side"][self.size:end] = side
+        self._columns["buy"][self.size:end] = buy
+        self._columns["player"][self.size:end] = self._codes(players, self.players, self._player_codes)
+        self._columns["demo"][self.size:end] = self._demo_codes[demo]
+        self._columns["round"][self.size:end] = rounds
+
+        self.size = end
+
+    def merge(self, other):
+        """
+        Appends every position of another store, remapping its player and demo codes
+
+        :param other: PositionStore to merge in
+        :return: Nothing
+        """
+        if other.size == 0:
+            return
+
+        self._reserve(other.size)
+
+        player_map = np.array([self._codes([p], self.players, self._player_codes)[0] for p in other.players],
+                              dtype=np.int16)
+        demo_map = np.array([self._codes([d], self.demos, self._demo_codes)[0] for d in other.demos],
+                            dtype=np.int16)
+
+        end = self.size + other.size
+
+        for name in ("x", "y", "z", "side", "buy", "round"):
+            self._columns[name][self.size:end] = other._columns[name][:other.size]
+
+        self._columns["player"][self.size:end] = player_map[other._columns["player"][:other.size]]
+        self._columns["demo"][self.size:end] = demo_map[other._columns["demo"][:other.size]]
+
+        self.size = end
+
+    def mask(self, side: str = None, buy: str = None, player: str = None):
+        """
+        :param side: Side name to select, or None for every side
+        :param buy: Buy type to select, or None for every buy type
+        :param player: Player name to select, or None for every player
+        :return: Boolean array selecting the matching positions
+        """
+        mask = np.ones(self.size, dtype=bool)
+
+        if side is not None:
+            mask &= self.side == SIDES.index(side)
+
+        if buy is not None:
+            mask &= self.buy == BUY_TYPES.index(buy)
+
+        if player is not None:
+            mask &= self.player == self.player_code(player)
+
+        return mask
+
+    def by_player(self, side: str = None, buy: str = None):
+        """
+        Slices the store for rendering
+
+        :param side: Side name to select, or None for every side
+        :param buy: Buy type to select, or None for every buy type
+        :return: {player: (x, y, z)} with coordinate arrays, in the order players were first seen
+        """
+        mask = self.mask(side, buy)
+        codes = self.player[mask]
+        x, y, z = self.x[mask], self.y[mask], self.z[mask]
+
+        positions = {}
+
+        for code in range(len(self.players)):
+            selected = codes == code
+
+            if selected.any():
+                positions[self.players[code]] = (x[selected], y[selected], z[selected])
+
+        return positions
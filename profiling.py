@@ -0,0 +1,246 @@
+import asyncio
+import atexit
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+import metrics
+
+
+# Folder profiles are written to while profiling is on, None while it's off
+_directory = None
+_dump_thread = None
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+
+
+def _stack():
+    # Profiles of the stages running in this thread, innermost last
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+
+    return _local.stack
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+
+    return True
+
+
+def _resume(profile):
+    try:
+        profile.enable()
+    except ValueError:
+        # Another thread holds the profiler (Python 3.12+), the rest of this stage goes unprofiled
+        metrics.count("profiling.skipped")
+
+
+class _ProfiledStage:
+    """
+    Runs a timed stage under cProfile. Only one profiler can run per thread, so a stage inside another pauses the outer
+    stage's profile, and each stage's profile only has the time not spent in the stages inside it.
+
+    Stages timed on an event loop's thread are only timed, not profiled: they wrap awaits, so other coroutines would
+    run under their profiler and they can finish in any order. From Python 3.12 only one profiler can run per process,
+    so a stage that starts while another thread is profiling is only timed as well
+    """
+
+    def __init__(self, stage: str, timer):
+        self.stage = stage
+        self.timer = timer
+        self.profile = None
+
+    def __enter__(self):
+        self.timer.__enter__()
+
+        if _in_event_loop():
+            return self
+
+        stack = _stack()
+
+        if stack:
+            stack[-1].disable()
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            metrics.count("profiling.skipped")
+
+            if stack:
+                _resume(stack[-1])
+
+            return self
+
+        self.profile = profile
+        stack.append(profile)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile is None:
+            self.timer.__exit__(exc_type, exc_value, traceback)
+            return False
+
+        self.profile.disable()
+        self.timer.__exit__(exc_type, exc_value, traceback)
+
+        # Only ever take this stage's own profile off the stack, and only resume the outer one if it was paused for it
+        stack = _stack()
+        innermost = stack[-1] is self.profile
+        stack[:] = [profile for profile in stack if profile is not self.profile]
+
+        with _lock:
+            if self.stage not in _stats.keys():
+                _stats[self.stage] = pstats.Stats(self.profile)
+            else:
+                _stats[self.stage].add(self.profile)
+
+        if innermost and stack:
+            _resume(stack[-1])
+
+        return False
+
+
+def enabled():
+    return _directory is not None
+
+
+def _dump_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        dump()
+
+
+def output_directory():
+    """
+    :return: Folder profiles are written to, or None while profiling is off
+    """
+    return _directory
+
+
+def enable(directory: str = "profiles", dump_interval: float = None):
+    """
+    Profiles every stage timed with metrics.timed from now on (download, extract, parse, aggregate, render, pdf, each
+    GraphQL query, ...), and writes the profiles when the process exits. Turns on metrics for the wall times in the
+    summary. Until this is called, metrics.timed doesn't touch the profiler at all.
+
+    :param directory: Folder to write a <stage>.prof file per stage and summary.txt to
+    :param dump_interval: Optional seconds between writes, for processes that may be killed before they exit cleanly
+    :return: Nothing
+    """
+    global _directory, _dump_thread
+
+    if _directory is None:
+        atexit.register(dump)
+
+    _directory = directory
+    os.makedirs(directory, exist_ok=True)
+
+    metrics.enable()
+    metrics._stage_hook = _ProfiledStage
+
+    if dump_interval is not None and _dump_thread is None:
+        _dump_thread = threading.Thread(target=_dump_loop, args=(dump_interval,), daemon=True)
+        _dump_thread.start()
+
+
+def enable_from_env(argv: list = None, dump_interval: float = None):
+    """
+    Turns on profiling if PROFILE_DIR is set, or the command line has --profile or --profile=<folder>
+
+    :param argv: Command line arguments, sys.argv by default
+    :param dump_interval: Optional seconds between writes, see enable
+    :return: Whether profiling was enabled
+    """
+    if argv is None:
+        argv = sys.argv
+
+    directory = os.getenv("PROFILE_DIR")
+
+    for arg in argv[1:]:
+        if arg == "--profile":
+            directory = directory or "profiles"
+        elif arg.startswith("--profile="):
+            directory = arg.split("=", 1)[1]
+
+    if directory is None:
+        return False
+
+    enable(directory, dump_interval)
+
+    return True
+
+
+def reset():
+    """
+    Clears every profile collected so far
+
+    :return: Nothing
+    """
+    with _lock:
+        _stats.clear()
+
+
+def stage_path(stage: str):
+    """
+    :param stage: Stage name
+    :return: File path of the stage's profile
+    """
+    return os.path.join(_directory, re.sub(r"[^\w.-]", "_", stage) + ".prof")
+
+
+def summary(top: int = 1):
+    """
+    :param top: Functions to list per stage
+    :return: Table with each stage's count and wall time from metrics, and the functions with the most time of their
+    own in the stage's profile
+    """
+    histograms = metrics.snapshot()["histograms"]
+
+    lines = ["Stage" + " " * 35 + "Count     Total (s)  Top functions (own time)"]
+
+    with _lock:
+        stages = {stage: stats for stage, stats in _stats.items()}
+
+    for stage in sorted(stages.keys()):
+        histogram = histograms.get(stage, {"count": 0, "sum": 0.0})
+
+        # (file, line, function) -> (primitive calls, calls, own time, cumulative time, callers)
+        functions = sorted(stages[stage].stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        names = ", ".join(f"{pstats.func_std_string(function)} {round(entry[2], 3)}s" for function, entry in functions)
+
+        total = str(round(histogram["sum"], 3))
+        lines.append(stage + " " * (40 - len(stage)) + str(histogram["count"]) +
+                     " " * (10 - len(str(histogram["count"]))) + total + " " * (11 - len(total)) + names)
+
+    return "\n".join(lines)
+
+
+def dump():
+    """
+    Writes a <stage>.prof file per stage, readable with pstats or snakeviz, and summary.txt
+
+    :return: Nothing
+    """
+    if _directory is None:
+        return
+
+    with _lock:
+        stages = dict(_stats)
+
+    for stage, stats in stages.items():
+        stats.dump_stats(stage_path(stage))
+
+    with open(os.path.join(_directory, "summary.txt"), "w") as f:
+        f.write(summary(top=3) + "\n")
@@ -0,0 +1,253 @@
+import functools
+import os
+
+import numpy as np
+
+from visualization import GRENADE_COLORS, MAP_DATA, get_grenade_segments, position_transform_array
+
+
+# Width and height of one radar image, in radar coordinates
+RADAR_SIZE = 1024
+
+# Default panel width in pixels. Maps with a lower level are twice as tall
+PANEL_WIDTH = 1024
+
+# Matplotlib's default color cycle, so "C0", "C1", ... match the matplotlib plots
+PLAYER_COLORS = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
+]
+
+# Sizes in radar coordinates, scaled with the panel. About the size the matplotlib plots draw them at
+DOT_RADIUS = 6
+MARKER_RADIUS = 6
+LINE_RADIUS = 1
+
+LINE_ALPHA = 0.1
+MARKER_ALPHA = 0.6
+
+
+def hex_color(color: str):
+    """
+    :param color: Color name or hex string
+    :return: Array of the color's red, green and blue values
+    """
+    from PIL import ImageColor
+
+    return np.array(ImageColor.getrgb(color)[:3], dtype=np.float64)
+
+
+def player_color(index: int):
+    """
+    :param index: Index of the player in the list of plotted players
+    :return: Array of the player's red, green and blue values, the same as "C<index>" in matplotlib
+    """
+    return hex_color(PLAYER_COLORS[index % len(PLAYER_COLORS)])
+
+
+def load_radar(map_name: str):
+    """
+    :param map_name: Name of map
+    :return: RGBA array of the map's radar image, with the lower level below it for maps that have one
+    """
+    from PIL import Image
+
+    base_path = os.path.join(os.path.dirname(__file__), "Map Images", map_name)
+
+    radar = np.asarray(Image.open(base_path + ".png").convert("RGBA"))
+
+    if "z_cutoff" in MAP_DATA.get(map_name, {}):
+        radar = np.concatenate([radar, np.asarray(Image.open(base_path + "_lower.png").convert("RGBA"))])
+
+    return radar
+
+
+@functools.lru_cache(maxsize=32)
+def base_raster(map_name: str, width: int = PANEL_WIDTH):
+    """
+    Renders a map's radar on black at the panel size. Built once per map and size, and copied for every panel
+
+    :param map_name: Name of map
+    :param width: Panel width in pixels
+    :return: Read only RGB uint8 array
+    """
+    from PIL import Image
+
+    radar = load_radar(map_name).astype(np.float64)
+    alpha = radar[:, :, 3:] / 255
+
+    base = Image.fromarray((radar[:, :, :3] * alpha).round().astype(np.uint8))
+
+    height = round(width * base.height / base.width)
+
+    if (width, height) != base.size:
+        base = base.resize((width, height), Image.LANCZOS)
+
+    base = np.asarray(base)
+    base.flags.writeable = False
+
+    return base
+
+
+@functools.lru_cache(maxsize=None)
+def disc(radius: int):
+    """
+    :param radius: Radius in pixels
+    :return: Row and column offsets of every pixel in a filled circle
+    """
+    rows, columns = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = rows ** 2 + columns ** 2 <= radius ** 2 + radius
+
+    return rows[inside], columns[inside]
+
+
+@functools.lru_cache(maxsize=None)
+def cross(radius: int):
+    """
+    :param radius: Half the width of the cross in pixels
+    :return: Row and column offsets of every pixel in an "x" marker
+    """
+    steps = np.arange(-radius, radius + 1)
+
+    # Both diagonals, two pixels wide
+    rows = np.concatenate([steps, steps, steps, steps])
+    columns = np.concatenate([steps, steps + 1, -steps, 1 - steps])
+
+    return rows, columns
+
+
+def stamp(image, x, y, colors, shape: tuple, alpha: float = 1.0):
+    """
+    Draws a shape centered on each point, all in one go
+
+    :param image: RGB uint8 array, drawn on in place
+    :param x: Array of pixel X coordinates
+    :param y: Array of pixel Y coordinates
+    :param colors: Array of red, green and blue values, either one for every point or shape (points, 3)
+    :param shape: Tuple of row and column offsets, from disc or cross
+    :param alpha: Opacity of the shape
+    :return: Nothing
+    """
+    x = np.rint(np.asarray(x, dtype=np.float64)).astype(np.int64)
+    y = np.rint(np.asarray(y, dtype=np.float64)).astype(np.int64)
+
+    if len(x) == 0:
+        return
+
+    rows = (y[:, None] + shape[0][None, :]).ravel()
+    columns = (x[:, None] + shape[1][None, :]).ravel()
+    colors = np.broadcast_to(np.asarray(colors, dtype=np.float64), (len(x), 3))
+    colors = np.repeat(colors, len(shape[0]), axis=0)
+
+    inside = (rows >= 0) & (rows < image.shape[0]) & (columns >= 0) & (columns < image.shape[1])
+    rows, columns, colors = rows[inside], columns[inside], colors[inside]
+
+    if alpha >= 1:
+        image[rows, columns] = colors
+    else:
+        image[rows, columns] = (image[rows, columns] * (1 - alpha) + colors * alpha).round()
+
+
+def draw_lines(image, starts, ends, colors, radius: int, alpha: float):
+    """
+    Draws straight lines by stamping a disc at every pixel along them, all in one go
+
+    :param image: RGB uint8 array, drawn on in place
+    :param starts: Array of pixel start points with shape (lines, 2)
+    :param ends: Array of pixel end points with shape (lines, 2)
+    :param colors: Array of red, green and blue values with shape (lines, 3)
+    :param radius: Line radius in pixels
+    :param alpha: Opacity of the lines
+    :return: Nothing
+    """
+    if len(starts) == 0:
+        return
+
+    steps = np.ceil(np.abs(ends - starts).max(axis=1)).astype(np.int64) + 1
+    line = np.repeat(np.arange(len(starts)), steps)
+
+    # Position of every point along its line, from 0 at the start to 1 at the end
+    offsets = np.arange(len(line)) - np.repeat(np.cumsum(steps) - steps, steps)
+    t = offsets / np.maximum(steps[line] - 1, 1)
+
+    points = starts[line] + (ends[line] - starts[line]) * t[:, None]
+
+    stamp(image, points[:, 0], points[:, 1], np.asarray(colors)[line], disc(radius), alpha)
+
+
+def render_panel(map_name: str, player_positions: dict, players: list, grenades: dict = None,
+                 width: int = PANEL_WIDTH):
+    """
+    Draws player positions and grenade trajectories onto a copy of the map's base raster. The same picture as
+    visualization.get_single_plot, without going through matplotlib
+
+    :param map_name: Name of map
+    :param player_positions: Dictionary with X, Y and Z coordinate arrays for each player
+    :param players: List of players plotted so far. Used to keep colors on plots for players consistent
+    :param grenades: Optional dictionary with a list of grenades thrown for each player
+    :param width: Panel width in pixels
+    :return: RGB uint8 array of the panel, and an updated list of plotted players
+    """
+    image = base_raster(map_name, width).copy()
+    scale = width / RADAR_SIZE
+
+    if grenades:
+        starts, ends, player_indexes, types = get_grenade_segments(map_name, grenades, players)
+
+        if len(starts) > 0:
+            colors = np.array([player_color(i) for i in player_indexes])
+            draw_lines(image, starts * scale, ends * scale, colors, max(round(LINE_RADIUS * scale), 0),
+                       LINE_ALPHA)
+
+            for grenade_type in np.unique(types):
+                landed = types == grenade_type
+
+                stamp(image, ends[landed, 0] * scale, ends[landed, 1] * scale, hex_color(GRENADE_COLORS[grenade_type]),
+                      cross(max(round(MARKER_RADIUS * scale), 1)), MARKER_ALPHA)
+
+    dot = disc(max(round(DOT_RADIUS * scale), 1))
+
+    for player in player_positions.keys():
+        if player not in players:
+            players.append(player)
+
+        x, y, z = position_transform_array(map_name, *player_positions[player])
+
+        stamp(image, x * scale, y * scale, player_color(players.index(player)), dot)
+
+    return image, players
+
+
+def save_panel(image, path: str):
+    """
+    :param image: RGB uint8 array of a panel
+    :param path: File path to save the png to
+    :return: Nothing
+    """
+    from PIL import Image
+
+    # Panels are temporary, so trade file size for speed
+    Image.fromarray(image).save(path, compress_level=1)
+
+
+def save_legend(players: list, names: list, path: str):
+    """
+    Saves a legend with the colors the panels used for each player, using matplotlib
+
+    :param players: List of players plotted so far, which decides their colors
+    :param names: Players to include in the legend
+    :param path: File path to save the png to
+    :return: Nothing
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+
+    handles = [
+        Line2D([], [], linestyle="", marker="o", color="C" + str(players.index(name)), label=name)
+        for name in names
+    ]
+
+    figure = plt.figure(figsize=(1.5, 1.3))
+    figure.legend(handles=handles)
+    figure.savefig(path, bbox_inches="tight", dpi=300)
+    plt.close(figure)
@@ -0,0 +1,395 @@
+import json
+import os
+
+import numpy as np
+
+from positions import BUY_TYPES
+
+
+def buy_types(totals):
+    """
+    Classifies team buys by total equipment value at the end of freeze time
+
+    :param totals: Array of total team equipment values
+    :return: Array of buy type codes (indexes into BUY_TYPES)
+    """
+    totals = np.asarray(totals)
+
+    return np.select(
+        [totals < 5000, totals < 10000, totals < 20000],
+        [BUY_TYPES.index("Full Eco"), BUY_TYPES.index("Semi Eco"), BUY_TYPES.index("Semi Buy")],
+        BUY_TYPES.index("Full Buy"),
+    )
+
+
+def side_name(side):
+    """
+    :param side: Side as found in demos, e.g. "CT", "T", "TERRORIST", 2 or 3
+    :return: Side name from SIDES, or None if it isn't a side
+    """
+    return {"CT": "CT", "T": "TERRORIST", "TERRORIST": "TERRORIST", 2: "TERRORIST", 3: "CT"}.get(side)
+
+
+def index_path(demo_path: str):
+    """
+    :param demo_path: File path of a demo, or of its parsed json
+    :return: File path of the demo's round index, beside the demo
+    """
+    return os.path.splitext(demo_path)[0] + ".rounds.json"
+
+
+def load_index(demo_path: str, build):
+    """
+    Loads the round index stored beside a demo, building and storing it first if there isn't one
+
+    :param demo_path: File path of a demo, or of its parsed json
+    :param build: Function that builds the RoundIndex, called only if there is no stored index
+    :return: RoundIndex
+    """
+    path = index_path(demo_path)
+
+    if os.path.isfile(path):
+        return RoundIndex.load(path)
+
+    index = build()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    index.save(path)
+
+    return index
+
+
+class RoundIndex:
+    """
+    Small per-demo index of round metadata, so round-level questions like "which rounds were pistol rounds" or "who won
+    round N" don't need the full parsed demo. Each round is a dictionary with:
+
+    number, freeze_end_tick, end_tick, ct_team, t_team, ct_buy, t_buy, ct_equipment, t_equipment, winner_side, winner,
+    ct_score, t_score
+
+    where buys are names from BUY_TYPES, winner_side is a name from SIDES, and scores are after the round was played.
+    """
+
+    def __init__(self, map_name: str, tick_rate: int, rounds: list):
+        """
+        :param map_name: Name of the map the demo was played on
+        :param tick_rate: Tick rate of the demo
+        :param rounds: List of round dictionaries, in order
+        """
+        self.map_name = map_name
+        self.tick_rate = tick_rate
+        self.rounds = rounds
+
+        # Round numbers come from the demo and can skip or restart, e.g. in cleaned json, so rounds are looked up by
+        # number rather than by position
+        self._by_number = {r["number"]: r for r in rounds}
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def __iter__(self):
+        return iter(self.rounds)
+
+    @classmethod
+    def from_game_rounds(cls, data: dict):
+        """
+        Builds the index from a demo parsed to json with gameRounds
+
+        :param data: Parsed demo
+        :return: RoundIndex
+        """
+        rounds = []
+
+        for r in data["gameRounds"]:
+            if r["roundNum"] in [1, 16]:
+                ct_buy = t_buy = "Pistol"
+            else:
+                ct_buy = r["ctBuyType"]
+                t_buy = r["tBuyType"]
+
+            rounds.append({
+                "number": r["roundNum"],
+                "freeze_end_tick": r["freezeTimeEndTick"],
+                "end_tick": r.get("endTick"),
+                "ct_team": r["ctTeam"],
+                "t_team": r["tTeam"],
+                "ct_buy": ct_buy,
+                "t_buy": t_buy,
+                "ct_equipment": r.get("ctFreezeTimeEndEqVal"),
+                "t_equipment": r.get("tFreezeTimeEndEqVal"),
+                "winner_side": side_name(r.get("winningSide")),
+                "winner": r["winningTeam"],
+                "ct_score": r["endCTScore"],
+                "t_score": r["endTScore"],
+            })
+
+        return cls(data["mapName"], data["tickRate"], rounds)
+
+    @classmethod
+    def from_ticks(cls, map_name: str, tick_rate: int, freeze_time_end_ticks: list, freeze_time_end_data,
+                   round_ends=None, pistol_rounds: tuple = (1, 13)):
+        """
+        Builds the index from demoparser2 style output
+
+        :param map_name: Name of the map the demo was played on
+        :param tick_rate: Tick rate of the demo
+        :param freeze_time_end_ticks: Tick each round's freeze time ended on
+        :param freeze_time_end_data: DataFrame with every player's current_equip_value, team_name and team_clan_name at
+        the end of each freeze time
+        :param round_ends: Optional DataFrame of round_end events with tick and winner columns
+        :param pistol_rounds: Round numbers that are pistol rounds
+        :return: RoundIndex
+        """
+        groups = freeze_time_end_data.groupby(["tick", "team_name"])
+        totals = groups["current_equip_value"].sum().to_dict()
+        clans = groups["team_clan_name"].first().to_dict()
+
+        freeze_ticks = np.asarray(freeze_time_end_ticks)
+
+        if round_ends is not None and len(round_ends) > 0:
+            end_ticks = round_ends["tick"].to_numpy()
+            winners = round_ends["winner"].tolist()
+        else:
+            end_ticks = np.array([], dtype=np.int64)
+            winners = []
+
+        # The first round end after each freeze time, if it's before the next one
+        end_index = np.searchsorted(end_ticks, freeze_ticks, side="right")
+
+        ct_equipment = np.array([totals.get((tick, "CT"), 0) for tick in freeze_ticks])
+        t_equipment = np.array([totals.get((tick, "TERRORIST"), 0) for tick in freeze_ticks])
+        ct_buys = buy_types(ct_equipment)
+        t_buys = buy_types(t_equipment)
+
+        scores = {}
+        rounds = []
+
+        for i, tick in enumerate(freeze_ticks):
+            number = i + 1
+            ct_team = clans.get((tick, "CT"))
+            t_team = clans.get((tick, "TERRORIST"))
+
+            end_tick = None
+            winner_side = None
+
+            if end_index[i] < len(end_ticks) and (i + 1 == len(freeze_ticks) or
+                                                   end_ticks[end_index[i]] < freeze_ticks[i + 1]):
+                end_tick = int(end_ticks[end_index[i]])
+                winner_side = side_name(winners[end_index[i]])
+
+            winner = {"CT": ct_team, "TERRORIST": t_team}.get(winner_side)
+
+            if winner is not None:
+                scores[winner] = scores.get(winner, 0) + 1
+
+            if number in pistol_rounds:
+                ct_buy = t_buy = "Pistol"
+            else:
+                ct_buy = BUY_TYPES[ct_buys[i]]
+                t_buy = BUY_TYPES[t_buys[i]]
+
+            rounds.append({
+                "number": number,
+                "freeze_end_tick": int(tick),
+                "end_tick": end_tick,
+                "ct_team": ct_team,
+                "t_team": t_team,
+                "ct_buy": ct_buy,
+                "t_buy": t_buy,
+                "ct_equipment": int(ct_equipment[i]),
+                "t_equipment": int(t_equipment[i]),
+                "winner_side": winner_side,
+                "winner": winner,
+                "ct_score": scores.get(ct_team, 0),
+                "t_score": scores.get(t_team, 0),
+            })
+
+        return cls(map_name, tick_rate, rounds)
+
+    @classmethod
+    def from_parser(cls, parser, tick_rate: int = 64):
+        """
+        Builds the index from a demo, with one pass over each event and the freeze time end ticks
+
+        :param parser: demoparser2.DemoParser for the demo
+        :param tick_rate: Tick rate of the demo
+        :return: RoundIndex
+        """
+        map_name = parser.parse_header()["map_name"]
+        freeze_time_end_ticks = parser.parse_event("round_freeze_end")["tick"].tolist()
+
+        freeze_time_end_data = parser.parse_ticks(["current_equip_value", "team_name", "team_clan_name"],
+                                                  ticks=freeze_time_end_ticks)
+        round_ends = parser.parse_event("round_end")
+
+        return cls.from_ticks(map_name, tick_rate, freeze_time_end_ticks, freeze_time_end_data, round_ends)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path: File path of a stored index
+        :return: RoundIndex
+        """
+        with open(path) as f:
+            data = json.load(f)
+
+        return cls(data["map_name"], data["tick_rate"], data["rounds"])
+
+    def save(self, path: str):
+        """
+        Stores the index, replacing the file atomically so readers never see half an index
+
+        :param path: File path to store the index at
+        :return: Nothing
+        """
+        with open(path + ".tmp", "w") as f:
+            json.dump({"map_name": self.map_name, "tick_rate": self.tick_rate, "rounds": self.rounds}, f)
+
+        os.replace(path + ".tmp", path)
+
+    def round(self, number: int):
+        """
+        :param number: Round number
+        :return: Round dictionary
+        :raises KeyError: If the demo has no round with that number
+        """
+        return self._by_number[number]
+
+    def side(self, team: str, number: int):
+        """
+        :param team: Team name
+        :param number: Round number
+        :return: "CT" or "TERRORIST", or None if the team didn't play the round
+        """
+        r = self.round(number)
+
+        if r["ct_team"] == team:
+            return "CT"
+
+        if r["t_team"] == team:
+            return "TERRORIST"
+
+        return None
+
+    def buy(self, team: str, number: int):
+        """
+        :param team: Team name
+        :param number: Round number
+        :return: The team's buy type in the round
+        """
+        r = self.round(number)
+
+        if r["ct_team"] == team:
+            return r["ct_buy"]
+
+        return r["t_buy"]
+
+    def winner(self, number: int):
+        """
+        :param number: Round number
+        :return: Name of the team that won the round
+        """
+        return self.round(number)["winner"]
+
+    def select(self, team: str = None, side: str = None, buy: str = None, won: bool = None):
+        """
+        :param team: Team the other filters apply to. Required for side, buy and won
+        :param side: Side name from SIDES the team played, or None for both
+        :param buy: Buy type the team had, or None for every buy type
+        :param won: Whether the team won the round, or None for both
+        :return: List of matching round numbers
+        """
+        numbers = []
+
+        for r in self.rounds:
+            if team is not None:
+                if r["ct_team"] == team:
+                    team_side, team_buy = "CT", r["ct_buy"]
+                elif r["t_team"] == team:
+                    team_side, team_buy = "TERRORIST", r["t_buy"]
+                else:
+                    continue
+
+                if side is not None and side != team_side:
+                    continue
+
+                if buy is not None and buy != team_buy:
+                    continue
+
+                if won is not None and won != (r["winner"] == team):
+                    continue
+
+            numbers.append(r["number"])
+
+        return numbers
+
+    def pistol_rounds(self):
+        """
+        :return: List of pistol round numbers
+        """
+        return [r["number"] for r in self.rounds if r["ct_buy"] == "Pistol"]
+
+    def opponent(self, team: str):
+        """
+        :param team: Team name
+        :return: Name of the team's opponent
+        """
+        r = self.rounds[0]
+
+        if r["ct_team"] == team:
+            return r["t_team"]
+
+        return r["ct_team"]
+
+    def final_score(self, team: str):
+        """
+        :param team: Team name
+        :return: Tuple of the team's and the opponent's rounds won
+        """
+        r = self.rounds[-1]
+
+        if r["ct_team"] == team:
+            return r["ct_score"], r["t_score"]
+
+        return r["t_score"], r["ct_score"]
+
+    def result(self, team: str):
+        """
+        :param team: Team name
+        :return: Tuple with the opponent's name, whether the team won, and the team's round wins and round losses
+        """
+        score, opponent_score = self.final_score(team)
+
+        if score == opponent_score:
+            raise Exception("Tie game")
+
+        round_wins = sum(1 for r in self.rounds if r["winner"] == team)
+
+        return self.opponent(team), score > opponent_score, round_wins, len(self.rounds) - round_wins
+
+    def round_positions(self, ticks):
+        """
+        :param ticks: Array of ticks
+        :return: Array of the position in rounds of the round each tick's freeze time belongs to, -1 before the first
+        """
+        freeze_ticks = np.array([r["freeze_end_tick"] for r in self.rounds])
+
+        return np.searchsorted(freeze_ticks, np.asarray(ticks), side="right") - 1
+
+    def round_numbers(self, ticks):
+        """
+        :param ticks: Array of ticks
+        :return: Array of the number of the round each tick's freeze time belongs to, 0 before the first
+        """
+        numbers = np.array([0] + [r["number"] for r in self.rounds])
+
+        return numbers[self.round_positions(ticks) + 1]
+
+    def buy_codes(self, side: str):
+        """
+        :param side: Side name from SIDES
+        :return: Array of the side's buy type code in each round, indexed by position in rounds
+        """
+        key = "ct_buy" if side == "CT" else "t_buy"
+
+        return np.array([BUY_TYPES.index(r[key]) for r in self.rounds], dtype=np.int8)
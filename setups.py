@@ -0,0 +1,193 @@
+import numpy as np
+
+from positions import BUY_TYPES, SIDES, PositionStore
+
+
+# Cells across the radar image in a setup's feature vector. Each cell is 64 radar pixels, about the size of a callout
+GRID_SIZE = 16
+
+# Setups found per side and buy type
+SETUP_COUNT = 5
+
+
+def setup_features(store: PositionStore, map_name: str, side: str = None, buy: str = None, grid: int = GRID_SIZE):
+    """
+    Turns each round's team positions into a fixed length vector: the share of the team in each cell of a grid over
+    the radar, blurred into the neighbouring cells so setups a few meters apart are still close. The vector doesn't
+    depend on which player stood where, only on where the team was.
+
+    :param store: PositionStore for the map
+    :param map_name: Name of the map
+    :param side: Side name to select, or None for every side
+    :param buy: Buy type to select, or None for every buy type
+    :param grid: Cells across the radar image
+    :return: Tuple of the float32 feature array with shape (rounds, cells) and an array of the (demo code, round
+    index) of each row
+    """
+    from visualization import MAP_DATA, position_transform_array
+
+    mask = store.mask(side, buy)
+    levels = 2 if "z_cutoff" in MAP_DATA[map_name] else 1
+
+    keys = np.column_stack((store.demo[mask], store.round[mask])).astype(np.int64)
+
+    if len(keys) == 0:
+        return np.zeros((0, grid * grid * levels), dtype=np.float32), keys
+
+    rounds, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    radar_x, radar_y, _ = position_transform_array(map_name, store.x[mask], store.y[mask], store.z[mask])
+    columns = np.clip((radar_x / 1024 * grid).astype(np.int64), 0, grid - 1)
+    rows = np.clip((radar_y / 1024 * grid).astype(np.int64), 0, grid * levels - 1)
+
+    cells = np.bincount((inverse * (grid * levels) + rows) * grid + columns,
+                        minlength=len(rounds) * grid * levels * grid)
+    cells = cells.reshape(len(rounds), grid * levels, grid).astype(np.float32)
+
+    # 3x3 blur, with the center weighted the most
+    padded = np.pad(cells, ((0, 0), (1, 1), (1, 1)))
+    blurred = np.zeros_like(cells)
+
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            weight = 4 if dx == dy == 0 else (2 if dx == 0 or dy == 0 else 1)
+            blurred += weight * padded[:, 1 + dy:1 + dy + cells.shape[1], 1 + dx:1 + dx + cells.shape[2]]
+
+    features = blurred.reshape(len(rounds), -1)
+    features /= features.sum(axis=1, keepdims=True)
+
+    return features, rounds
+
+
+def squared_distances(points, centroids, point_norms=None):
+    """
+    :param points: Array with shape (points, features)
+    :param centroids: Array with shape (centroids, features)
+    :param point_norms: Optional array of the squared length of each point, to save working it out again
+    :return: Array of squared euclidean distances with shape (points, centroids)
+    """
+    if point_norms is None:
+        point_norms = np.einsum("ij,ij->i", points, points)
+
+    distances = point_norms[:, None] - 2 * points @ centroids.T + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+
+    return np.maximum(distances, 0)
+
+
+def kmeans(features, k: int, iterations: int = 50, restarts: int = 4, seed: int = 0):
+    """
+    Clusters feature vectors with k-means, seeded with k-means++ and kept from the best of a few restarts
+
+    :param features: Array with shape (points, features)
+    :param k: Number of clusters, lowered to the number of points if there are fewer
+    :param iterations: Most update steps per restart
+    :param restarts: Runs from different seeds
+    :param seed: Random seed
+    :return: Tuple of the cluster of each point, the centroids, and the sum of squared distances to the centroids
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(features))
+    norms = np.einsum("ij,ij->i", features, features)
+
+    best = None
+
+    for _ in range(restarts):
+        # k-means++: each new centroid is picked with probability proportional to its squared distance from the rest
+        centroids = features[[rng.integers(len(features))]]
+
+        for _ in range(1, k):
+            distances = squared_distances(features, centroids, norms).min(axis=1)
+
+            if distances.sum() == 0:
+                break
+
+            centroids = np.vstack((centroids, features[rng.choice(len(features), p=distances / distances.sum())]))
+
+        labels = None
+
+        for _ in range(iterations):
+            new_labels = squared_distances(features, centroids, norms).argmin(axis=1)
+
+            if labels is not None and (new_labels == labels).all():
+                break
+
+            labels = new_labels
+
+            # Sum each cluster's points with one matrix product
+            members = np.zeros((len(centroids), len(features)), dtype=features.dtype)
+            members[labels, np.arange(len(features))] = 1
+            counts = members.sum(axis=1)
+            sums = members @ features
+
+            # Clusters that lost every point keep their old centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        inertia = float(squared_distances(features, centroids, norms)[np.arange(len(features)), labels].sum())
+
+        if best is None or inertia < best[2]:
+            best = (labels, centroids, inertia)
+
+    return best
+
+
+def find_setups(store: PositionStore, map_name: str, side: str, buy: str = None, k: int = SETUP_COUNT,
+                grid: int = GRID_SIZE, seed: int = 0):
+    """
+    Finds the setups a team runs most often on one side
+
+    :param store: PositionStore for the map
+    :param map_name: Name of the map
+    :param side: Side name
+    :param buy: Buy type, or None for every buy type
+    :param k: Most setups to find
+    :param grid: Cells across the radar image, see setup_features
+    :param seed: Random seed
+    :return: List of setups from most to least common, each a dictionary with its share of the rounds, the number of
+    rounds, the representative round (the one closest to the center of the setup) and every round, as (demo name,
+    round number) tuples
+    """
+    features, rounds = setup_features(store, map_name, side, buy, grid)
+
+    if len(features) == 0:
+        return []
+
+    labels, centroids, _ = kmeans(features, k, seed=seed)
+    distances = squared_distances(features, centroids)[np.arange(len(features)), labels]
+
+    setups = []
+
+    for cluster in range(len(centroids)):
+        members = np.flatnonzero(labels == cluster)
+
+        if len(members) == 0:
+            continue
+
+        representative = members[distances[members].argmin()]
+
+        setups.append({
+            "share": len(members) / len(features),
+            "rounds": len(members),
+            "representative": (store.demos[rounds[representative, 0]], int(rounds[representative, 1]) + 1),
+            "members": [(store.demos[demo], int(number) + 1) for demo, number in rounds[members]],
+        })
+
+    return sorted(setups, key=lambda setup: setup["rounds"], reverse=True)
+
+
+def get_setups(position_info: dict, k: int = SETUP_COUNT, by_buy: bool = True):
+    """
+    Finds setups on every map, for each side and buy type
+
+    :param position_info: {map_name: PositionStore}, from visualization.get_map_tick_data
+    :param k: Most setups to find for each side and buy type
+    :param by_buy: Find setups for each buy type, or for every round of a side together
+    :return: {map_name: {side: {buy: setups}}}, see find_setups. buy is None if by_buy is False
+    """
+    buys = BUY_TYPES if by_buy else [None]
+
+    return {
+        map_name: {side: {buy: find_setups(store, map_name, side, buy, k) for buy in buys} for side in SIDES}
+        for map_name, store in position_info.items()
+    }
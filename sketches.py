@@ -0,0 +1,340 @@
+import os
+import re
+
+import numpy as np
+
+from positions import BUY_TYPES, SIDES, PositionStore
+from rounds import RoundIndex
+
+
+# Cells across the radar image in a sketch's position histogram
+HISTOGRAM_SIZE = 64
+
+
+class Sketch:
+    """
+    Small summary of a team's demos on one map that can be added to others without the demos: a histogram of positions,
+    zone visits, buy types, and rounds won, all split by side and buy type, plus map results. A demo's sketch is made
+    once when it's parsed, and season or multi season views are sums of sketches. Every count is indexed
+    [side, buy, ...] by SIDES and BUY_TYPES.
+    """
+
+    def __init__(self, map_name: str, levels: int = 1, histogram_size: int = HISTOGRAM_SIZE):
+        """
+        :param map_name: Name of the map
+        :param levels: 2 for maps with a lower level, stacked below the upper level in the histogram
+        :param histogram_size: Cells across the radar image
+        """
+        self.map_name = map_name
+        self.demos = []
+        self.positions = np.zeros((len(SIDES), len(BUY_TYPES), histogram_size * levels, histogram_size),
+                                  dtype=np.uint32)
+        self.zones = {}
+        self.rounds = np.zeros((len(SIDES), len(BUY_TYPES)), dtype=np.uint32)
+        self.rounds_won = np.zeros((len(SIDES), len(BUY_TYPES)), dtype=np.uint32)
+        self.maps_won = 0
+        self.maps_lost = 0
+
+    @property
+    def maps(self):
+        """
+        :return: Number of decided maps, one per demo
+        """
+        return self.maps_won + self.maps_lost
+
+    @classmethod
+    def from_demo(cls, team: str, demo: str, rounds: RoundIndex, positions: PositionStore, zones=None,
+                  histogram_size: int = HISTOGRAM_SIZE):
+        """
+        Sketches one demo
+
+        :param team: Team name
+        :param demo: Name of the demo
+        :param rounds: RoundIndex for the demo
+        :param positions: PositionStore with the team's positions in the demo
+        :param zones: Optional zones.ZoneMask for the map, to count zone visits
+        :param histogram_size: Cells across the radar image
+        :return: Sketch
+        """
+        from visualization import MAP_DATA, position_transform_array
+
+        levels = 2 if "z_cutoff" in MAP_DATA[rounds.map_name] else 1
+        sketch = cls(rounds.map_name, levels, histogram_size)
+        sketch.demos = [demo]
+
+        for r in rounds:
+            side = rounds.side(team, r["number"])
+
+            if side is None:
+                continue
+
+            index = (SIDES.index(side), BUY_TYPES.index(rounds.buy(team, r["number"])))
+            sketch.rounds[index] += 1
+            sketch.rounds_won[index] += r["winner"] == team
+
+        # Ties and demos without rounds count as neither
+        if len(rounds) > 0:
+            score, opponent_score = rounds.final_score(team)
+
+            if score != opponent_score:
+                sketch.maps_won, sketch.maps_lost = int(score > opponent_score), int(score < opponent_score)
+
+        if len(positions) == 0:
+            return sketch
+
+        radar_x, radar_y, _ = position_transform_array(rounds.map_name, positions.x, positions.y, positions.z)
+        columns = np.clip((radar_x / 1024 * histogram_size).astype(np.int64), 0, histogram_size - 1)
+        rows = np.clip((radar_y / 1024 * histogram_size).astype(np.int64), 0, histogram_size * levels - 1)
+
+        cells = (((positions.side.astype(np.int64) * len(BUY_TYPES) + positions.buy) * histogram_size * levels + rows)
+                 * histogram_size + columns)
+        sketch.positions += np.bincount(cells, minlength=sketch.positions.size).reshape(sketch.positions.shape) \
+            .astype(np.uint32)
+
+        if zones is not None:
+            codes = zones.lookup(positions.x, positions.y, positions.z).astype(np.int64)
+            counts = np.bincount((codes * len(SIDES) + positions.side) * len(BUY_TYPES) + positions.buy,
+                                 minlength=len(zones.names) * len(SIDES) * len(BUY_TYPES))
+            counts = counts.reshape(len(zones.names), len(SIDES), len(BUY_TYPES))
+
+            for code, name in enumerate(zones.names):
+                if name is not None and counts[code].any():
+                    sketch.zones[name] = counts[code].astype(np.uint32)
+
+        return sketch
+
+    def merge(self, other):
+        """
+        Adds another sketch of the same map. Demos already in the sketch are skipped, so sketches can be merged more
+        than once without counting a demo twice
+
+        :param other: Sketch to add
+        :return: Whether it was added
+        """
+        if set(other.demos) & set(self.demos):
+            return False
+
+        self.demos += other.demos
+        self.positions += other.positions
+        self.rounds += other.rounds
+        self.rounds_won += other.rounds_won
+        self.maps_won += other.maps_won
+        self.maps_lost += other.maps_lost
+
+        for name, counts in other.zones.items():
+            self.zones[name] = self.zones.get(name, np.zeros_like(counts)) + counts
+
+        return True
+
+    def win_rate(self, side: str = None, buy: str = None):
+        """
+        :param side: Side name, or None for both
+        :param buy: Buy type, or None for every buy type
+        :return: Share of the selected rounds won, or None if there weren't any
+        """
+        sides = slice(None) if side is None else SIDES.index(side)
+        buys = slice(None) if buy is None else BUY_TYPES.index(buy)
+
+        played = self.rounds[sides, buys].sum()
+
+        if played == 0:
+            return None
+
+        return float(self.rounds_won[sides, buys].sum() / played)
+
+    def buy_distribution(self, side: str):
+        """
+        :param side: Side name
+        :return: Dictionary of buy types to their share of the side's rounds
+        """
+        played = self.rounds[SIDES.index(side)]
+        total = played.sum()
+
+        return {buy: float(played[i] / total) if total else 0.0 for i, buy in enumerate(BUY_TYPES)}
+
+    def zone_shares(self, side: str = None, buy: str = None):
+        """
+        :param side: Side name, or None for both
+        :param buy: Buy type, or None for every buy type
+        :return: Dictionary of zones to their share of the selected positions that were in a zone, most common first
+        """
+        sides = slice(None) if side is None else SIDES.index(side)
+        buys = slice(None) if buy is None else BUY_TYPES.index(buy)
+
+        counts = {name: int(counts[sides, buys].sum()) for name, counts in self.zones.items()}
+        total = sum(counts.values())
+
+        if total == 0:
+            return {}
+
+        return {name: count / total for name, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+                if count > 0}
+
+    def save(self, path: str):
+        """
+        Stores the sketch compressed, replacing the file atomically
+
+        :param path: File path ending in .npz
+        :return: Nothing
+        """
+        zone_names = list(self.zones.keys())
+
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                map_name=np.array(self.map_name),
+                demos=np.array(self.demos, dtype=str),
+                positions=self.positions,
+                zone_names=np.array(zone_names, dtype=str),
+                zones=np.array([self.zones[name] for name in zone_names], dtype=np.uint32).reshape(
+                    len(zone_names), len(SIDES), len(BUY_TYPES)),
+                rounds=self.rounds,
+                rounds_won=self.rounds_won,
+                maps=np.array([self.maps_won, self.maps_lost]),
+            )
+
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path: File path of a stored sketch
+        :return: Sketch
+        """
+        with np.load(path) as data:
+            positions = data["positions"]
+
+            sketch = cls(str(data["map_name"]), positions.shape[2] // positions.shape[3], positions.shape[3])
+            sketch.demos = data["demos"].tolist()
+            sketch.positions = positions
+            sketch.zones = dict(zip(data["zone_names"].tolist(), data["zones"]))
+            sketch.rounds = data["rounds"]
+            sketch.rounds_won = data["rounds_won"]
+            sketch.maps_won, sketch.maps_lost = (int(count) for count in data["maps"])
+
+        return sketch
+
+
+class SketchStore:
+    """
+    Folder of demo sketches, one file per team per season per demo:
+
+    <directory>/<team>/s<season>/<demo>.npz
+    """
+
+    def __init__(self, directory: str = "sketches"):
+        """
+        :param directory: Folder to keep the sketches in
+        """
+        self.directory = directory
+
+    @staticmethod
+    def _file_name(name: str):
+        return re.sub(r"[^\w.-]", "_", name)
+
+    def _season_dir(self, team: str, season: int):
+        return os.path.join(self.directory, self._file_name(team), f"s{season}")
+
+    def path(self, team: str, season: int, demo: str):
+        """
+        :param team: Team name
+        :param season: CSC Season number
+        :param demo: Name of the demo
+        :return: File path of the demo's sketch
+        """
+        return os.path.join(self._season_dir(team, season), self._file_name(demo) + ".npz")
+
+    def has(self, team: str, season: int, demo: str):
+        return os.path.isfile(self.path(team, season, demo))
+
+    def save(self, team: str, season: int, sketch: Sketch):
+        """
+        :param team: Team name
+        :param season: CSC Season number
+        :param sketch: Sketch of a single demo
+        :return: Nothing
+        """
+        os.makedirs(self._season_dir(team, season), exist_ok=True)
+        sketch.save(self.path(team, season, sketch.demos[0]))
+
+    def season(self, team: str, season: int):
+        """
+        Sums a team's demo sketches for a season
+
+        :param team: Team name
+        :param season: CSC Season number
+        :return: {map_name: Sketch}
+        """
+        folder = self._season_dir(team, season)
+        maps = {}
+
+        if not os.path.isdir(folder):
+            return maps
+
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".npz"):
+                continue
+
+            sketch = Sketch.load(os.path.join(folder, name))
+
+            if sketch.map_name not in maps.keys():
+                maps[sketch.map_name] = sketch
+            else:
+                maps[sketch.map_name].merge(sketch)
+
+        return maps
+
+    def seasons(self, team: str, seasons: list):
+        """
+        :param team: Team name
+        :param seasons: CSC Season numbers
+        :return: {season: {map_name: Sketch}}
+        """
+        return {season: self.season(team, season) for season in seasons}
+
+    def combined(self, team: str, seasons: list):
+        """
+        Sums a team's sketches over several seasons
+
+        :param team: Team name
+        :param seasons: CSC Season numbers
+        :return: {map_name: Sketch}
+        """
+        maps = {}
+
+        for season_maps in self.seasons(team, seasons).values():
+            for map_name, sketch in season_maps.items():
+                if map_name not in maps.keys():
+                    maps[map_name] = sketch
+                else:
+                    maps[map_name].merge(sketch)
+
+        return maps
+
+
+def get_trends(store: SketchStore, team: str, seasons: list):
+    """
+    Compares a team season by season from stored sketches, without any demos
+
+    :param store: SketchStore with the team's demo sketches
+    :param team: Team name
+    :param seasons: CSC Season numbers, in order
+    :return: {map_name: [{season, maps, map_win_rate, round_win_rate, ct_win_rate, t_win_rate, ct_buys, t_buys}]}
+    with a row for every season the team played the map
+    """
+    trends = {}
+
+    for season, maps in store.seasons(team, seasons).items():
+        for map_name, sketch in sorted(maps.items()):
+            trends.setdefault(map_name, []).append({
+                "season": season,
+                "maps": sketch.maps,
+                "map_win_rate": sketch.maps_won / sketch.maps if sketch.maps else None,
+                "round_win_rate": sketch.win_rate(),
+                "ct_win_rate": sketch.win_rate("CT"),
+                "t_win_rate": sketch.win_rate("TERRORIST"),
+                "ct_buys": sketch.buy_distribution("CT"),
+                "t_buys": sketch.buy_distribution("TERRORIST"),
+            })
+
+    return trends
@@ -0,0 +1,160 @@
+import queue
+import threading
+
+import metrics
+
+
+class Stage:
+    """
+    One stage of a Pipeline. The function is a generator that takes an item from the previous stage and yields any
+    number of items for the next one, so a stage can drop items or split them (e.g. one zip into several demos).
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, discard=None):
+        """
+        :param name: Stage name, also used to label its metrics as stage.<name>
+        :param func: Generator function taking one item
+        :param workers: Number of threads running the stage
+        :param discard: Optional function called with every item meant for this stage that is dropped because the run
+        failed, e.g. to delete the temp file behind it
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.discard = discard
+
+
+class _Done:
+    # Sentinel telling a worker its input has run out
+    pass
+
+
+class Pipeline:
+    """
+    Runs stages concurrently, each with its own threads, connected by bounded queues. A stage that falls behind fills
+    the queue in front of it, which blocks the stages before it (backpressure), so at most queue_size items wait
+    between any two stages and the whole run takes about as long as its slowest stage instead of the sum of them.
+    """
+
+    def __init__(self, stages: list, queue_size: int = 2):
+        """
+        :param stages: List of Stages, in order
+        :param queue_size: Items that can wait between two stages
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, items):
+        """
+        Feeds items through every stage
+
+        :param items: Iterable of inputs to the first stage
+        :return: List of the outputs of the last stage, in the order they were finished
+        :raises: The first exception raised by a stage, after every thread has stopped
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        errors = []
+        stop = threading.Event()
+
+        lock = threading.Lock()
+        running = [stage.workers for stage in self.stages]
+
+        def discard(index: int, item):
+            if self.stages[index].discard is None:
+                return
+
+            try:
+                self.stages[index].discard(item)
+            except Exception as e:
+                print(f"Discarding an item of stage {self.stages[index].name} failed: {e}")
+
+        def put(index: int, item):
+            # Give up on the item if the run failed, so a full queue can't block forever
+            while not stop.is_set():
+                try:
+                    queues[index].put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+            discard(index, item)
+
+        def feed():
+            try:
+                for item in items:
+                    if stop.is_set():
+                        break
+
+                    put(0, item)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_Done)
+
+        def work(index: int):
+            stage = self.stages[index]
+            last = index == len(self.stages) - 1
+
+            while True:
+                item = queues[index].get()
+
+                if item is _Done:
+                    break
+
+                if stop.is_set():
+                    discard(index, item)
+                    continue
+
+                outputs = []
+
+                try:
+                    with metrics.timed("stage." + stage.name):
+                        for output in stage.func(item):
+                            outputs.append(output)
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+                    stop.set()
+
+                    # Outputs made before the failure will never reach the next stage
+                    if not last:
+                        for output in outputs:
+                            discard(index + 1, output)
+
+                    continue
+
+                for output in outputs:
+                    if last:
+                        with lock:
+                            results.append(output)
+                    else:
+                        put(index + 1, output)
+
+            # The last worker of a stage to finish tells the next stage's workers there is nothing more coming
+            with lock:
+                running[index] -= 1
+                finished = running[index] == 0
+
+            if finished and not last:
+                for _ in range(self.stages[index + 1].workers):
+                    queues[index + 1].put(_Done)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=work, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                        for n in range(stage.workers)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return results
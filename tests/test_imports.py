@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.imports import ENTRY_POINTS, HEAVY_MODULES, measure
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_imports_no_heavy_modules(module):
+    loaded = measure(module)["modules"]
+
+    assert [m for m in HEAVY_MODULES if m in loaded] == []
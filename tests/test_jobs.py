@@ -0,0 +1,39 @@
+import pytest
+
+from jobs import QUEUED, RUNNING, JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_queued=2)
+    yield queue
+    queue.close()
+
+
+def test_identical_jobs_are_shared(queue):
+    job, position, joined = queue.submit("report", {"team": "Alpha", "season": 15}, 1, 10)
+    same, same_position, same_joined = queue.submit("report", {"season": 15, "team": "Alpha"}, 2, 20)
+
+    assert (position, joined) == (1, False)
+    assert same["id"] == job["id"] and same_position == 1 and same_joined
+    assert len(queue.jobs()) == 1
+
+
+def test_queue_full(queue):
+    queue.submit("report", {"team": "Alpha", "season": 15})
+    queue.submit("report", {"team": "Bravo", "season": 15})
+
+    with pytest.raises(QueueFull):
+        queue.submit("report", {"team": "Charlie", "season": 15})
+
+
+def test_recover_requeues_running_jobs(queue):
+    job, _, _ = queue.submit("report", {"team": "Alpha", "season": 15})
+
+    assert queue.claim()["id"] == job["id"]
+    assert queue.get(job["id"])["status"] == RUNNING
+    assert queue.claim() is None
+
+    assert queue.recover() == 1
+    assert queue.get(job["id"])["status"] == QUEUED
+    assert queue.claim()["id"] == job["id"]
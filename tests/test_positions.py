@@ -0,0 +1,33 @@
+import numpy as np
+
+from positions import PositionStore
+
+
+def test_merge_remaps_player_and_demo_codes():
+    first = PositionStore(capacity=1)
+    first.append([1, 2], [1, 2], [0, 0], [0, 1], [4, 4], ["alice", "bob"], "demo-a", [0, 1])
+
+    second = PositionStore(capacity=1)
+    second.append([3, 4, 5], [3, 4, 5], [0, 0, 0], [1, 1, 0], [2, 2, 2], ["carol", "bob", "carol"], "demo-b",
+                  [0, 0, 1])
+
+    first.merge(second)
+
+    assert len(first) == 5
+    assert first.players == ["alice", "bob", "carol"]
+    assert first.demos == ["demo-a", "demo-b"]
+    assert [first.players[code] for code in first.player] == ["alice", "bob", "carol", "bob", "carol"]
+    assert [first.demos[code] for code in first.demo] == ["demo-a", "demo-a", "demo-b", "demo-b", "demo-b"]
+    np.testing.assert_array_equal(first.x, [1, 2, 3, 4, 5])
+    np.testing.assert_array_equal(first.round, [0, 1, 0, 0, 1])
+
+
+def test_merge_of_empty_store_changes_nothing():
+    store = PositionStore()
+    store.append([1], [1], [0], [0], [0], ["alice"], "demo-a", [0])
+
+    store.merge(PositionStore())
+
+    assert len(store) == 1
+    assert store.player_code("alice") == 0
+    assert store.player_code("bob") == -1
@@ -0,0 +1,33 @@
+import asyncio
+import sys
+
+import metrics
+import profiling
+
+
+def test_interleaved_coroutines_leave_no_profile_behind(tmp_path):
+    profiling.enable(str(tmp_path))
+    profiling.reset()
+
+    async def send(seconds):
+        with metrics.timed("discord.send"):
+            await asyncio.sleep(seconds)
+
+    def work():
+        with metrics.timed("scout.build"):
+            sum(range(1000))
+
+    async def main():
+        # The first coroutine in exits before the second
+        await asyncio.gather(send(0.02), send(0.01))
+        await asyncio.to_thread(work)
+
+    try:
+        asyncio.run(main())
+
+        assert profiling._stack() == []
+        assert sys.getprofile() is None
+        assert "scout.build" in profiling._stats and "discord.send" not in profiling._stats
+    finally:
+        metrics._stage_hook = None
+        profiling._directory = None
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from rounds import RoundIndex
+
+
+def make_round(number, freeze_end_tick, winner, ct_score, t_score):
+    return {"number": number, "freeze_end_tick": freeze_end_tick, "end_tick": freeze_end_tick + 1000,
+            "ct_team": "Alpha", "t_team": "Bravo", "ct_buy": "Full Buy", "t_buy": "Semi Eco", "ct_equipment": 25000,
+            "t_equipment": 8000, "winner_side": "CT" if winner == "Alpha" else "TERRORIST", "winner": winner,
+            "ct_score": ct_score, "t_score": t_score}
+
+
+@pytest.fixture
+def rounds():
+    # Round numbers restart partway through, as in some cleaned demos
+    return RoundIndex("de_mirage", 64, [make_round(3, 1000, "Alpha", 1, 0), make_round(4, 3000, "Bravo", 1, 1),
+                                        make_round(7, 5000, "Alpha", 2, 1)])
+
+
+def test_round_lookup_by_number(rounds):
+    assert rounds.round(7)["freeze_end_tick"] == 5000
+    assert rounds.winner(4) == "Bravo"
+    assert rounds.side("Bravo", 3) == "TERRORIST"
+    assert rounds.side("Charlie", 3) is None
+    assert rounds.buy("Alpha", 4) == "Full Buy"
+
+    with pytest.raises(KeyError):
+        rounds.round(1)
+
+
+def test_round_positions_and_numbers(rounds):
+    ticks = [500, 1000, 2999, 3000, 9000]
+
+    np.testing.assert_array_equal(rounds.round_positions(ticks), [-1, 0, 0, 1, 2])
+
+
+def test_final_score_and_result(rounds):
+    assert rounds.final_score("Alpha") == (2, 1)
+    assert rounds.final_score("Bravo") == (1, 2)
+    assert rounds.result("Alpha")[:2] == ("Bravo", True)
+
+
+def test_save_and_load(rounds, tmp_path):
+    path = str(tmp_path / "demo.rounds.json")
+    rounds.save(path)
+
+    loaded = RoundIndex.load(path)
+
+    assert loaded.map_name == "de_mirage"
+    assert loaded.rounds == rounds.rounds
+    assert loaded.round(4)["winner"] == "Bravo"
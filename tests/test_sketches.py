@@ -0,0 +1,44 @@
+import numpy as np
+
+from positions import BUY_TYPES, SIDES
+from sketches import Sketch
+
+
+def make_sketch(demo: str, won: bool):
+    sketch = Sketch("de_mirage", histogram_size=8)
+    sketch.demos = [demo]
+    sketch.positions[0, 4, 2, 3] = 5
+    sketch.rounds[SIDES.index("CT"), BUY_TYPES.index("Full Buy")] = 10
+    sketch.rounds_won[SIDES.index("CT"), BUY_TYPES.index("Full Buy")] = 7 if won else 3
+    sketch.zones["Mid"] = np.ones((len(SIDES), len(BUY_TYPES)), dtype=np.uint32)
+    sketch.maps_won, sketch.maps_lost = int(won), int(not won)
+
+    return sketch
+
+
+def test_merge_adds_counts_once_per_demo():
+    sketch = make_sketch("a", True)
+
+    assert sketch.merge(make_sketch("b", False)) is not False
+    assert sketch.merge(make_sketch("b", False)) is False
+
+    assert sketch.demos == ["a", "b"]
+    assert sketch.positions[0, 4, 2, 3] == 10
+    assert sketch.maps == 2 and sketch.maps_won == 1
+    assert sketch.win_rate("CT", "Full Buy") == 0.5
+    assert sketch.zones["Mid"].sum() == 2 * len(SIDES) * len(BUY_TYPES)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    sketch = make_sketch("a", True)
+    path = str(tmp_path / "a.npz")
+
+    sketch.save(path)
+    loaded = Sketch.load(path)
+
+    assert loaded.map_name == "de_mirage"
+    assert loaded.demos == ["a"]
+    np.testing.assert_array_equal(loaded.positions, sketch.positions)
+    np.testing.assert_array_equal(loaded.rounds_won, sketch.rounds_won)
+    np.testing.assert_array_equal(loaded.zones["Mid"], sketch.zones["Mid"])
+    assert (loaded.maps_won, loaded.maps_lost) == (1, 0)
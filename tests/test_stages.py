@@ -0,0 +1,45 @@
+import threading
+import time
+
+import pytest
+
+from stages import Pipeline, Stage
+
+
+def test_run_passes_items_through_every_stage():
+    def split(item):
+        yield item
+        yield item + 100
+
+    def double(item):
+        yield item * 2
+
+    results = Pipeline([Stage("split", split, 2), Stage("double", double, 3)]).run(range(5))
+
+    assert sorted(results) == sorted([i * 2 for i in range(5)] + [(i + 100) * 2 for i in range(5)])
+
+
+def test_failure_discards_the_items_left_behind():
+    discarded = []
+    lock = threading.Lock()
+
+    def produce(item):
+        yield item
+
+    def consume(item):
+        # Fail on the first item once the stages before have filled up behind it
+        time.sleep(0.2)
+        raise ValueError("broken demo")
+        yield item
+
+    def discard(item):
+        with lock:
+            discarded.append(item)
+
+    pipeline = Pipeline([Stage("produce", produce), Stage("consume", consume, discard=discard)], queue_size=1)
+
+    with pytest.raises(ValueError):
+        pipeline.run(range(20))
+
+    # Item 1 was waiting in the consume queue and item 2 was being put there when 0 failed
+    assert sorted(discarded) == [1, 2]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from visualization import MAP_DATA
+from zones import NO_ZONE, ZoneMask
+
+
+def square(map_name: str, left: int, top: int, size: int):
+    # Polygon covering radar pixels [left, left + size) x [top, top + size), in game coordinates
+    data = MAP_DATA[map_name]
+
+    def game(px, py):
+        return [data["pos_x"] + px * data["scale"], data["pos_y"] - py * data["scale"]]
+
+    return [game(left, top), game(left + size, top), game(left + size, top + size), game(left, top + size)]
+
+
+def center(map_name: str, px: float, py: float):
+    data = MAP_DATA[map_name]
+
+    return data["pos_x"] + px * data["scale"], data["pos_y"] - py * data["scale"]
+
+
+def test_lookup_assigns_points_to_zones():
+    zones = {"Outer": {"points": square("de_mirage", 100, 100, 200)},
+             "Inner": {"points": square("de_mirage", 150, 150, 50)}}
+    mask = ZoneMask.from_zones("de_mirage", zones, cell_size=4)
+
+    points = [center("de_mirage", 110, 110), center("de_mirage", 170, 170), center("de_mirage", 500, 500),
+              (-100000, -100000)]
+    x, y = np.array(points).T
+
+    codes = mask.lookup(x, y, np.zeros(len(points)))
+
+    assert list(mask.zone_names(codes)) == ["Outer", "Inner", None, None]
+    assert codes[2] == NO_ZONE
+
+
+def test_lookup_uses_the_level():
+    cutoff = MAP_DATA["de_nuke"]["z_cutoff"]
+    zones = {"Upper": {"points": square("de_nuke", 400, 400, 100)},
+             "Lower": {"points": square("de_nuke", 400, 400, 100), "level": "lower"}}
+    mask = ZoneMask.from_zones("de_nuke", zones, cell_size=8)
+
+    x, y = center("de_nuke", 450, 450)
+    codes = mask.lookup(np.array([x, x]), np.array([y, y]), np.array([cutoff + 100, cutoff - 100]))
+
+    assert list(mask.zone_names(codes)) == ["Upper", "Lower"]
+
+
+def test_cell_size_must_divide_the_radar():
+    with pytest.raises(ValueError):
+        ZoneMask.from_zones("de_mirage", {}, cell_size=3)
@@ -0,0 +1,441 @@
+import os
+import re
+
+import numpy as np
+
+import metrics
+from positions import BUY_TYPES, SIDES
+from rounds import RoundIndex
+
+
+# Seconds after the end of freeze time each track covers
+TRACK_SECONDS = 30
+
+# Ticks between samples, 4 samples a second at 64 tick
+TRACK_STRIDE = 16
+
+# Game units a player has to move away from the last kept sample for a sample to be kept. Distances are measured from
+# the last kept sample, not the previous one, so slow lurks and rotations still keep a point every 16 units
+MIN_DISTANCE = 16
+
+# Rounds of tick data parsed at once. Tracks sample far more ticks per round than positions do, so chunks are smaller
+ROUNDS_PER_CHUNK = 4
+
+
+def moving_points(track, x, y, z, min_distance: float = MIN_DISTANCE):
+    """
+    Finds the samples worth keeping in a set of tracks: the first and last of each track, and every sample at least
+    min_distance away from the last kept sample of its track
+
+    :param track: Array of the track each sample belongs to, with every track's samples next to each other in order
+    :param x: Array of X coordinates
+    :param y: Array of Y coordinates
+    :param z: Array of Z coordinates
+    :param min_distance: Game units a player has to have moved since the last kept sample
+    :return: Boolean array of the samples to keep
+    """
+    track = np.asarray(track)
+
+    if len(track) == 0:
+        return np.zeros(0, dtype=bool)
+
+    first = np.ones(len(track), dtype=bool)
+    first[1:] = track[1:] != track[:-1]
+
+    last = np.ones(len(track), dtype=bool)
+    last[:-1] = first[1:]
+
+    keep = first | last
+
+    # Each kept sample depends on the one kept before it, so this walks the samples in order
+    min_squared = min_distance ** 2
+    kept_x = kept_y = kept_z = 0.0
+
+    for i, (is_first, px, py, pz) in enumerate(zip(first.tolist(), np.asarray(x, dtype=np.float64).tolist(),
+                                                   np.asarray(y, dtype=np.float64).tolist(),
+                                                   np.asarray(z, dtype=np.float64).tolist())):
+        if is_first or (px - kept_x) ** 2 + (py - kept_y) ** 2 + (pz - kept_z) ** 2 >= min_squared:
+            keep[i] = True
+            kept_x, kept_y, kept_z = px, py, pz
+
+    return keep
+
+
+class Tracks:
+    """
+    Downsampled movement tracks of one team's players on one map, one track per player per round. Samples are stored as
+    int16 game coordinates with the tick offset from the end of freeze time, and tracks as small integer codes like
+    PositionStore, so a season of tracks stays within a few MB.
+    """
+
+    POINT_COLUMNS = {"x": np.int16, "y": np.int16, "z": np.int16, "offset": np.uint16}
+    TRACK_COLUMNS = {"player": np.int16, "demo": np.int16, "round": np.int16, "side": np.int8, "buy": np.int8,
+                     "length": np.int32}
+
+    def __init__(self, map_name: str, tick_rate: int = 64):
+        """
+        :param map_name: Name of the map the tracks are on
+        :param tick_rate: Tick rate of the demos the tracks are from
+        """
+        self.map_name = map_name
+        self.tick_rate = tick_rate
+        self.players = []
+        self.demos = []
+        self.points = {name: np.empty(0, dtype) for name, dtype in self.POINT_COLUMNS.items()}
+        self.tracks = {name: np.empty(0, dtype) for name, dtype in self.TRACK_COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.tracks["length"])
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.points.values()) + \
+            sum(column.nbytes for column in self.tracks.values())
+
+    @property
+    def starts(self):
+        """
+        :return: Array of the index of each track's first sample
+        """
+        return np.cumsum(self.tracks["length"]) - self.tracks["length"]
+
+    @classmethod
+    def from_tick_data(cls, rounds: RoundIndex, tick_data, demo: str = "", min_distance: float = MIN_DISTANCE):
+        """
+        Builds tracks from sampled tick data, dropping samples after the round ended and samples where the player had
+        barely moved
+
+        :param rounds: RoundIndex for the demo
+        :param tick_data: DataFrame with the team's tick, name, X, Y, Z and team_name at ticks sampled after the end of
+        each freeze time
+        :param demo: Name of the demo, used to tell rounds of different demos apart
+        :param min_distance: See moving_points
+        :return: Tracks
+        """
+        tracks = cls(rounds.map_name, rounds.tick_rate)
+
+        if len(tick_data) == 0:
+            return tracks
+
+        tick_data = tick_data.sort_values(["name", "tick"], kind="stable")
+
+        ticks = tick_data["tick"].to_numpy()
+        round_index = np.maximum(rounds.round_positions(ticks), 0)
+
+        freeze_end_ticks = np.array([r["freeze_end_tick"] for r in rounds], dtype=np.int64)
+        end_ticks = np.array([r["end_tick"] if r["end_tick"] is not None else np.iinfo(np.int64).max for r in rounds],
+                             dtype=np.int64)
+
+        players, player_codes = np.unique(tick_data["name"].to_numpy().astype(str), return_inverse=True)
+        x, y, z = (tick_data[column].to_numpy(dtype=np.float64) for column in ("X", "Y", "Z"))
+        side = np.where(tick_data["team_name"].to_numpy() == "CT", SIDES.index("CT"), SIDES.index("TERRORIST"))
+
+        # Samples are sorted by player then tick, so a track is a run of samples with the same player and round
+        track = player_codes.astype(np.int64) * (len(rounds) + 1) + round_index
+
+        keep = ticks <= end_ticks[round_index]
+        track, ticks, round_index, player_codes, side = (a[keep] for a in (track, ticks, round_index, player_codes,
+                                                                           side))
+        x, y, z = x[keep], y[keep], z[keep]
+
+        keep = moving_points(track, x, y, z, min_distance)
+        track, ticks, round_index, player_codes, side = (a[keep] for a in (track, ticks, round_index, player_codes,
+                                                                           side))
+        x, y, z = x[keep], y[keep], z[keep]
+
+        if len(track) == 0:
+            return tracks
+
+        first = np.flatnonzero(np.concatenate([[True], track[1:] != track[:-1]]))
+        lengths = np.diff(np.append(first, len(track)))
+
+        buy = np.where(side[first] == SIDES.index("CT"), rounds.buy_codes("CT")[round_index[first]],
+                       rounds.buy_codes("TERRORIST")[round_index[first]])
+
+        tracks.players = players.tolist()
+        tracks.demos = [demo]
+        tracks.points = {
+            "x": np.rint(x).astype(np.int16),
+            "y": np.rint(y).astype(np.int16),
+            "z": np.rint(z).astype(np.int16),
+            "offset": np.clip(ticks - freeze_end_ticks[round_index], 0, np.iinfo(np.uint16).max).astype(np.uint16),
+        }
+        tracks.tracks = {
+            "player": player_codes[first].astype(np.int16),
+            "demo": np.zeros(len(first), dtype=np.int16),
+            "round": round_index[first].astype(np.int16),
+            "side": side[first].astype(np.int8),
+            "buy": buy.astype(np.int8),
+            "length": lengths.astype(np.int32),
+        }
+
+        return tracks
+
+    def merge(self, other):
+        """
+        Appends every track of another Tracks on the same map, remapping its player and demo codes
+
+        :param other: Tracks to merge in
+        :return: Nothing
+        """
+        if len(other) == 0:
+            return
+
+        def remap(values: list, categories: list):
+            for value in values:
+                if value not in categories:
+                    categories.append(value)
+
+            return np.array([categories.index(value) for value in values], dtype=np.int16)
+
+        player_map = remap(other.players, self.players)
+        demo_map = remap(other.demos, self.demos)
+
+        for name in self.points.keys():
+            self.points[name] = np.concatenate([self.points[name], other.points[name]])
+
+        remapped = dict(other.tracks, player=player_map[other.tracks["player"]], demo=demo_map[other.tracks["demo"]])
+
+        for name in self.tracks.keys():
+            self.tracks[name] = np.concatenate([self.tracks[name], remapped[name].astype(self.TRACK_COLUMNS[name])])
+
+    def mask(self, side: str = None, buy: str = None, player: str = None):
+        """
+        :param side: Side name to select, or None for every side
+        :param buy: Buy type to select, or None for every buy type
+        :param player: Player name to select, or None for every player
+        :return: Boolean array selecting the matching tracks
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if side is not None:
+            mask &= self.tracks["side"] == SIDES.index(side)
+
+        if buy is not None:
+            mask &= self.tracks["buy"] == BUY_TYPES.index(buy)
+
+        if player is not None:
+            mask &= self.tracks["player"] == (self.players.index(player) if player in self.players else -1)
+
+        return mask
+
+    def segments(self, side: str = None, buy: str = None, seconds: float = None):
+        """
+        Splits the selected tracks into straight segments between consecutive samples, for drawing as one collection
+
+        :param side: Side name to select, or None for every side
+        :param buy: Buy type to select, or None for every buy type
+        :param seconds: Only include samples up to this many seconds after the end of freeze time, or None for all
+        :return: Tuple of start and end game coordinate arrays with shape (segments, 3), and the player code of each
+        segment
+        """
+        selected = self.mask(side, buy)
+
+        # Track of every sample, and whether the next sample is in the same selected track
+        track = np.repeat(np.arange(len(self)), self.tracks["length"])
+        points = np.column_stack([self.points["x"], self.points["y"], self.points["z"]]).astype(np.float64)
+
+        joined = (track[:-1] == track[1:]) & selected[track[:-1]]
+
+        if seconds is not None:
+            joined &= self.points["offset"][1:] <= seconds * self.tick_rate
+
+        starts = np.flatnonzero(joined)
+
+        return points[starts], points[starts + 1], self.tracks["player"][track[starts]]
+
+    def save(self, path: str):
+        """
+        Stores the tracks compressed, replacing the file atomically
+
+        :param path: File path ending in .npz
+        :return: Nothing
+        """
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                map_name=np.array(self.map_name),
+                tick_rate=np.array(self.tick_rate),
+                players=np.array(self.players, dtype=str),
+                demos=np.array(self.demos, dtype=str),
+                **{"point_" + name: column for name, column in self.points.items()},
+                **{"track_" + name: column for name, column in self.tracks.items()},
+            )
+
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path: File path of stored tracks
+        :return: Tracks
+        """
+        with np.load(path) as data:
+            tracks = cls(str(data["map_name"]), int(data["tick_rate"]))
+            tracks.players = data["players"].tolist()
+            tracks.demos = data["demos"].tolist()
+            tracks.points = {name: data["point_" + name] for name in cls.POINT_COLUMNS.keys()}
+            tracks.tracks = {name: data["track_" + name] for name in cls.TRACK_COLUMNS.keys()}
+
+        return tracks
+
+
+def extract_tracks(parser, rounds: RoundIndex, team_name: str, demo: str = "", seconds: float = TRACK_SECONDS,
+                   stride: int = TRACK_STRIDE, min_distance: float = MIN_DISTANCE,
+                   rounds_per_chunk: int = ROUNDS_PER_CHUNK):
+    """
+    Extracts a team's movement tracks from a demo, sampling every stride ticks for the first seconds of each round, a
+    few rounds at a time
+
+    :param parser: demoparser2.DemoParser for the demo
+    :param rounds: RoundIndex for the demo
+    :param team_name: Clan name of the team
+    :param demo: Name of the demo, used to tell rounds of different demos apart
+    :param seconds: Seconds after the end of freeze time to track players for
+    :param stride: Ticks between samples
+    :param min_distance: See moving_points
+    :param rounds_per_chunk: Rounds parsed per parse_ticks call
+    :return: Tracks
+    """
+    freeze_time_end_ticks = [r["freeze_end_tick"] for r in rounds]
+    offsets = np.arange(0, int(seconds * rounds.tick_rate) + 1, stride)
+
+    tracks = Tracks(rounds.map_name, rounds.tick_rate)
+
+    for start in range(0, len(freeze_time_end_ticks), rounds_per_chunk):
+        ticks = (np.array(freeze_time_end_ticks[start:start + rounds_per_chunk])[:, None] + offsets).ravel().tolist()
+
+        with metrics.timed("parse"):
+            tick_data = parser.parse_ticks(["X", "Y", "Z", "team_clan_name", "team_name"], ticks=ticks)
+            tick_data = tick_data[tick_data["team_clan_name"] == team_name]
+
+        with metrics.timed("tracks"):
+            tracks.merge(Tracks.from_tick_data(rounds, tick_data, demo, min_distance))
+
+        del tick_data
+
+    return tracks
+
+
+class TrackStore:
+    """
+    Folder of compressed tracks, one file per demo, so tracks are extracted once and loaded per map for plotting
+    """
+
+    def __init__(self, directory: str = "tracks"):
+        """
+        :param directory: Folder to keep the track files in
+        """
+        self.directory = directory
+
+    def path(self, demo: str):
+        """
+        :param demo: Name of the demo
+        :return: File path of the demo's tracks
+        """
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", demo) + ".tracks.npz")
+
+    def has(self, demo: str):
+        return os.path.isfile(self.path(demo))
+
+    def save(self, demo: str, tracks: Tracks):
+        os.makedirs(self.directory, exist_ok=True)
+        tracks.save(self.path(demo))
+
+    def load(self, demo: str):
+        return Tracks.load(self.path(demo))
+
+    def by_map(self):
+        """
+        Loads every stored demo's tracks
+
+        :return: {map_name: Tracks} with every demo on the map merged
+        """
+        maps = {}
+
+        if not os.path.isdir(self.directory):
+            return maps
+
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".tracks.npz"):
+                continue
+
+            tracks = Tracks.load(os.path.join(self.directory, name))
+
+            if tracks.map_name not in maps.keys():
+                maps[tracks.map_name] = Tracks(tracks.map_name, tracks.tick_rate)
+
+            maps[tracks.map_name].merge(tracks)
+
+        return maps
+
+
+def plot_tracks(axes, tracks: Tracks, players: list, side: str = None, buy: str = None, seconds: float = None,
+                alpha: float = 0.4):
+    """
+    Draws the selected tracks as a single LineCollection colored by player. Segments between the two levels of nuke
+    and vertigo are left out, since they would cross the picture
+
+    :param axes: Axes to draw on
+    :param tracks: Tracks to draw
+    :param players: List of players plotted so far. Used to keep colors on plots for players consistent
+    :param side: Side name to select, or None for every side
+    :param buy: Buy type to select, or None for every buy type
+    :param seconds: Only draw the first seconds of each track, or None for all of it
+    :param alpha: Opacity of the lines
+    :return: Updated list of players plotted so far
+    """
+    from matplotlib.collections import LineCollection
+
+    from visualization import MAP_DATA, position_transform_array
+
+    starts, ends, codes = tracks.segments(side, buy, seconds)
+
+    x1, y1, _ = position_transform_array(tracks.map_name, starts[:, 0], starts[:, 1], starts[:, 2])
+    x2, y2, _ = position_transform_array(tracks.map_name, ends[:, 0], ends[:, 1], ends[:, 2])
+
+    if "z_cutoff" in MAP_DATA[tracks.map_name]:
+        same_level = (starts[:, 2] < MAP_DATA[tracks.map_name]["z_cutoff"]) == \
+            (ends[:, 2] < MAP_DATA[tracks.map_name]["z_cutoff"])
+        x1, y1, x2, y2, codes = x1[same_level], y1[same_level], x2[same_level], y2[same_level], codes[same_level]
+
+    for player in tracks.players:
+        if player not in players:
+            players.append(player)
+
+    if len(codes) == 0:
+        return players
+
+    colors = ["C" + str(players.index(tracks.players[code])) for code in codes]
+
+    axes.add_collection(
+        LineCollection(np.stack((np.column_stack((x1, y1)), np.column_stack((x2, y2))), axis=1), colors=colors,
+                       alpha=alpha)
+    )
+
+    return players
+
+
+def get_track_plot(tracks: Tracks, players: list, side: str = None, buy: str = None, seconds: float = None):
+    """
+    Creates a plot of movement tracks over the map
+
+    :param tracks: Tracks on one map
+    :param players: List of players plotted so far. Used to keep colors on plots for players consistent
+    :param side: Side name to select, or None for every side
+    :param buy: Buy type to select, or None for every buy type
+    :param seconds: Only draw the first seconds of each track, or None for all of it
+    :return: The figure and axes for the plot, and an updated list of plotted players
+    """
+    from visualization import plot_map
+
+    figure, axes = plot_map(map_name=tracks.map_name)
+
+    players = plot_tracks(axes, tracks, players, side, buy, seconds)
+
+    axes.get_xaxis().set_visible(False)
+    axes.get_yaxis().set_visible(False)
+
+    figure.set_size_inches(10, 10)
+
+    return figure, axes, players
@@ -1,31 +1,46 @@
-from demoparser2 import DemoParser
+from __future__ import annotations
+
 import os
-import imageio.v3 as imageio
 import json
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.axes import Axes
-from matplotlib.figure import Figure
-from matplotlib import pylab
-
-import boto3
-from botocore import UNSIGNED
-from botocore.client import Config
+from typing import TYPE_CHECKING
 
 import zipfile
 import io
 
-import jinja2
 import datetime
 import pathlib
-import pdfkit
-import pypdf
+
+import metrics
+from ingest import DemoManifest, ExtractedDemo, extract_demos
+from positions import BUY_TYPES, PositionStore, SIDES
+from rounds import RoundIndex, load_index, side_name
+from sketches import Sketch, SketchStore
+from stages import Pipeline, Stage
+from tracks import TrackStore, extract_tracks
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
 
 
 f = open("map_data.json")
 MAP_DATA = json.load(f)
 f.close()
 
+# Rounds of tick data parsed at once by extract_round_positions. Every parse_ticks call reads through the demo, so
+# smaller chunks trade parse time for lower peak memory
+ROUNDS_PER_CHUNK = 8
+
+# From awpy.visualization.plot.plot_nades()
+GRENADE_COLORS = {
+    "Incendiary Grenade": "red",
+    "Molotov": "red",
+    "Smoke Grenade": "gray",
+    "HE Grenade": "green",
+    "Flashbang": "gold",
+}
+
 
 # FROM AWPY VVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVVV
 def plot_map(
@@ -43,6 +58,9 @@ def plot_map(
     Returns:
         matplotlib fig and ax
     """
+    import imageio.v3 as imageio
+    import matplotlib.pyplot as plt
+
     base_path = os.path.join(os.path.dirname(__file__), f"""Map Images/{map_name}""")
     if map_type == "original":
         map_bg = imageio.imread(f"{base_path}.png")
@@ -94,19 +112,175 @@ def position_transform_all(
 # FROM AWPY ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
 
-def get_map_tick_data(team_name: str):
-    team = team_name.replace(" ", "")
+def position_transform_array(map_name: str, x, y, z):
+    """
+    Transforms arrays of game coordinates to radar image coordinates, the same way as position_transform_all
+
+    :param map_name: Name of map
+    :param x: Array of X coordinates
+    :param y: Array of Y coordinates
+    :param z: Array of Z coordinates
+    :return: Tuple of radar X, radar Y and Z arrays
+    """
+    current_map_data = MAP_DATA[map_name]
+    scale = current_map_data["scale"]
+
+    radar_x = (np.asarray(x, dtype=np.float64) - current_map_data["pos_x"]) / scale
+    radar_y = (current_map_data["pos_y"] - np.asarray(y, dtype=np.float64)) / scale
+    z = np.asarray(z)
+
+    if "z_cutoff" in current_map_data:
+        radar_y = np.where(z < current_map_data["z_cutoff"], radar_y + 1024, radar_y)
+
+    return radar_x, radar_y, z
+
+
+def grenades_by_side(grenades_info: dict):
+    """
+    :param grenades_info: Dictionary of sides to buy types to grenades thrown by each player, with sides either from
+    SIDES or as "t" and "ct" like main.get_scouting_info
+    :return: The same dictionary keyed by sides from SIDES
+    """
+    return {side_name(side.upper()): buys for side, buys in grenades_info.items()}
+
+
+def grenade_name(grenade_type: str):
+    """
+    :param grenade_type: Grenade type as found in demoparser2's grenade data, e.g. "HeGrenade" or "smoke"
+    :return: Grenade name from GRENADE_COLORS, or None for grenades that aren't drawn (decoys)
+    """
+    grenade_type = "".join(c for c in str(grenade_type).lower() if c.isalpha())
+
+    for prefix, name in (("smoke", "Smoke Grenade"), ("flash", "Flashbang"), ("he", "HE Grenade"),
+                         ("molotov", "Molotov"), ("inc", "Incendiary Grenade")):
+        if grenade_type.startswith(prefix):
+            return name
+
+    return None
+
+
+def get_grenade_segments(map_name: str, grenades: dict, players: list):
+    """
+    Flattens grenade throws into arrays of radar coordinates, transformed all at once
+
+    :param map_name: Name of map
+    :param grenades: Dictionary with a list of grenades thrown for each player, as gathered by main.get_scouting_info
+    :param players: List of players plotted so far, updated with any new throwers
+    :return: Tuple of throw and landing arrays with shape (grenades, 2), the index of each thrower in players, and the
+    type of each grenade
+    """
+    throws = []
+    player_indexes = []
+    types = []
+
+    for player in grenades.keys():
+        if player not in players:
+            players.append(player)
+
+        for grenade in grenades[player]:
+            if grenade["type"] not in GRENADE_COLORS.keys():
+                continue
+
+            throws.append((grenade["X1"], grenade["Y1"], grenade["Z1"], grenade["X2"], grenade["Y2"], grenade["Z2"]))
+            player_indexes.append(players.index(player))
+            types.append(grenade["type"])
+
+    throws = np.array(throws, dtype=np.float64).reshape(-1, 6)
+    player_indexes = np.array(player_indexes, dtype=np.int64)
+    types = np.array(types, dtype=object)
+
+    if map_name == "de_vertigo":
+        # Don't plot a grenade that went off the map
+        on_map = throws[:, 5] >= 10000
+        throws, player_indexes, types = throws[on_map], player_indexes[on_map], types[on_map]
+
+    if map_name in ("de_vertigo", "de_nuke"):
+        # Draw the whole throw on the level the grenade landed on
+        throw_z = throws[:, 5]
+    else:
+        throw_z = throws[:, 2]
+
+    x1, y1, _ = position_transform_array(map_name, throws[:, 0], throws[:, 1], throw_z)
+    x2, y2, _ = position_transform_array(map_name, throws[:, 3], throws[:, 4], throws[:, 5])
+
+    return np.column_stack((x1, y1)), np.column_stack((x2, y2)), player_indexes, types
+
+
+def plot_grenades(axes: Axes, map_name: str, grenades: dict, players: list, dot_size: int):
+    """
+    Draws every grenade trajectory as a single LineCollection colored by thrower, and landing points as one scatter per
+    grenade type
+
+    :param axes: Axes to draw on
+    :param map_name: Name of map
+    :param grenades: Dictionary with a list of grenades thrown for each player, as gathered by main.get_scouting_info
+    :param players: List of players plotted so far. Used to keep colors on plots for players consistent
+    :param dot_size: Size of landing markers
+    :return: Updated list of players plotted so far
+    """
+    from matplotlib.collections import LineCollection
+
+    starts, ends, player_indexes, types = get_grenade_segments(map_name, grenades, players)
+
+    if len(starts) == 0:
+        return players
+
+    axes.add_collection(
+        LineCollection(
+            np.stack((starts, ends), axis=1),
+            colors=["C" + str(i) for i in player_indexes],
+            alpha=0.1,
+        )
+    )
+
+    for grenade_type in np.unique(types):
+        landed = types == grenade_type
+
+        axes.scatter(
+            ends[landed, 0],
+            ends[landed, 1],
+            color=GRENADE_COLORS[grenade_type],
+            s=dot_size,
+            alpha=0.6,
+            marker="x",
+        )
+
+    return players
+
+
+def get_demos_client():
+    """
+    Creates an anonymous S3 client for the public demos bucket. SPACES_ENDPOINT can point it at another S3 compatible
+    endpoint, such as the benchmark stand-in.
+
+    :return: boto3 S3 client
+    """
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.client import Config
 
     session = boto3.session.Session()
-    client = session.client(
+    return session.client(
         's3',
         region_name='nyc3',
-        endpoint_url='https://nyc3.digitaloceanspaces.com',
+        endpoint_url=os.getenv("SPACES_ENDPOINT", 'https://nyc3.digitaloceanspaces.com'),
         config=Config(signature_version=UNSIGNED)
     )
 
+
+def get_team_demo_keys(client, season: int, team_name: str):
+    """
+    Gets the keys of all match day demos a team played in
+
+    :param client: S3 client for the demos bucket
+    :param season: CSC Season number
+    :param team_name: Team name
+    :return: List of demo keys
+    """
+    team = team_name.replace(" ", "")
+
     # Get a list of all the relevant demos
-    response = client.list_objects(Bucket='cscdemos', Prefix='s13/', Delimiter='/')
+    response = client.list_objects(Bucket='cscdemos', Prefix=f's{season}/', Delimiter='/')
 
     files = []
 
@@ -119,134 +293,320 @@ def get_map_tick_data(team_name: str):
                 if team in file["Key"]:
                     files.append(file["Key"])
 
-    position_info = {}
+    return files
 
-    # Iterate over all relevant demos found
-    for i in range(len(files)):
-        # Download the demo
-        demo = client.get_object(Bucket='cscdemos', Key=files[i])["Body"].read()
 
-        # Unzip the demo and write it to the temp file
-        zip_file = zipfile.ZipFile(io.BytesIO(demo))
+def get_round_positions(rounds: RoundIndex, tick_data, demo: str = ""):
+    """
+    Sorts player positions 12 seconds into each round by side and team buy type
 
-        filename = "tempdemo.dem"
+    :param rounds: RoundIndex for the demo
+    :param tick_data: DataFrame with the team's positions at ticks sampled after the end of each freeze time
+    :param demo: Name of the demo, used to tell rounds of different demos apart
+    :return: PositionStore with the team's positions
+    """
+    round_index = np.maximum(rounds.round_positions(tick_data["tick"].to_numpy()), 0)
 
-        zipped = zipfile.ZipFile(io.BytesIO(demo))
-        output = open(filename, "wb")
+    side = np.where(tick_data["team_name"].to_numpy() == "CT", SIDES.index("CT"), SIDES.index("TERRORIST"))
+    buy = np.where(side == SIDES.index("CT"), rounds.buy_codes("CT")[round_index],
+                   rounds.buy_codes("TERRORIST")[round_index])
 
-        for list_file in range(len(zipped.filelist)):
-            if len(zipped.filelist) > 1 and list_file == 0:
-                continue
+    positions = PositionStore(len(tick_data))
+    positions.append(tick_data["X"].to_numpy(), tick_data["Y"].to_numpy(), tick_data["Z"].to_numpy(), side, buy,
+                     tick_data["name"].to_numpy(), demo, round_index)
 
-            f = zipped.open(zipped.filelist[list_file])
-            output.write(f.read())
+    return positions
 
-            parser = DemoParser(filename)
 
-            header = parser.parse_header()
-            map_name = header["map_name"]
-            tick_rate = 64
+def extract_round_positions(parser, rounds: RoundIndex, team_name: str, demo: str = "",
+                            rounds_per_chunk: int = ROUNDS_PER_CHUNK, sample_seconds: tuple = (12,)):
+    """
+    Extracts a team's positions from a demo a few rounds at a time, so only one chunk of tick data is held at once and
+    peak memory is set by the chunk size instead of the length of the demo
+
+    :param parser: demoparser2.DemoParser for the demo
+    :param rounds: RoundIndex for the demo
+    :param team_name: Clan name of the team
+    :param demo: Name of the demo, used to tell rounds of different demos apart
+    :param rounds_per_chunk: Rounds parsed per parse_ticks call, or None for every round at once
+    :param sample_seconds: Seconds after the end of freeze time to sample positions at in each round
+    :return: PositionStore with the team's positions
+    """
+    freeze_time_end_ticks = [r["freeze_end_tick"] for r in rounds]
 
-            freeze_time_end_ticks = parser.parse_event("round_freeze_end")["tick"].tolist()
+    if rounds_per_chunk is None:
+        rounds_per_chunk = max(len(freeze_time_end_ticks), 1)
 
-            freeze_time_end_data = parser.parse_ticks(["current_equip_value", "team_name", "team_clan_name"], ticks=freeze_time_end_ticks)
-            freeze_time_end_data = freeze_time_end_data[freeze_time_end_data["team_clan_name"] == team_name]
+    positions = PositionStore(len(freeze_time_end_ticks) * len(sample_seconds) * 5)
 
-            buy_types = {"TERRORIST": {}, "CT": {}}
+    for start in range(0, len(freeze_time_end_ticks), rounds_per_chunk):
+        ticks = [int(round(tick + rounds.tick_rate * seconds))
+                 for tick in freeze_time_end_ticks[start:start + rounds_per_chunk] for seconds in sample_seconds]
 
-            for tick in freeze_time_end_ticks:
-                buy_types["TERRORIST"][tick] = 0
-                buy_types["CT"][tick] = 0
+        with metrics.timed("parse"):
+            tick_data = parser.parse_ticks(["X", "Y", "Z", "team_clan_name", "team_name"], ticks=ticks)
+            tick_data = tick_data[tick_data["team_clan_name"] == team_name]
 
-            for _, row in freeze_time_end_data.iterrows():
-                buy_types[row["team_name"]][row["tick"]] += row["current_equip_value"]
+        with metrics.timed("aggregate"):
+            positions.merge(get_round_positions(rounds, tick_data, demo))
 
-            for i in range(len(freeze_time_end_ticks)):
-                freeze_time_end_ticks[i] += tick_rate * 12
+        del tick_data
 
-            tick_data = parser.parse_ticks(["X", "Y", "Z", "team_clan_name", "team_name"], ticks=freeze_time_end_ticks)
-            tick_data = tick_data[tick_data["team_clan_name"] == team_name]
+    return positions
+
+
+def extract_round_grenades(parser, rounds: RoundIndex, team_name: str, seconds: float = 12):
+    """
+    Finds the grenades a team threw in the first seconds of each round, from where each grenade was first seen to
+    where it came to rest
+
+    :param parser: demoparser2.DemoParser for the demo
+    :param rounds: RoundIndex for the demo
+    :param team_name: Clan name of the team
+    :param seconds: Seconds after the end of freeze time to take grenades from
+    :return: {side: {buy: {player: [grenade]}}} with sides from SIDES, and grenades like main.get_scouting_info
+    """
+    with metrics.timed("parse"):
+        grenade_data = parser.parse_grenades(extra=["name", "team_clan_name", "team_name"])
+
+    grenade_data = grenade_data[grenade_data["team_clan_name"] == team_name].sort_values("tick")
+    grenades = {}
+
+    if len(grenade_data) == 0:
+        return grenades
+
+    # Older demoparser2 versions have no entity id, so a player's grenades of one type in a round are one throw
+    keys = ["grenade_entity_id"] if "grenade_entity_id" in grenade_data.columns else ["name", "grenade_type"]
+
+    if "grenade_entity_id" not in grenade_data.columns:
+        grenade_data = grenade_data.assign(round=rounds.round_positions(grenade_data["tick"].to_numpy()))
+        keys.append("round")
+
+    groups = grenade_data.groupby(keys, sort=False, as_index=False)
+    first = groups.first()
+    last = groups.last()
+
+    positions = rounds.round_positions(first["tick"].to_numpy())
+    freeze_end_ticks = np.array([r["freeze_end_tick"] for r in rounds])
+
+    for i, (thrown, landed) in enumerate(zip(first.itertuples(), last.itertuples())):
+        name = grenade_name(thrown.grenade_type)
+        side = side_name(thrown.team_name)
+
+        if name is None or side is None or positions[i] < 0 or \
+                thrown.tick - freeze_end_ticks[positions[i]] > seconds * rounds.tick_rate:
+            continue
+
+        buy = BUY_TYPES[rounds.buy_codes(side)[positions[i]]]
+
+        grenades.setdefault(side, {}).setdefault(buy, {}).setdefault(thrown.name, []).append({
+            "type": name,
+            "X1": thrown.X,
+            "Y1": thrown.Y,
+            "Z1": thrown.Z,
+            "X2": landed.X,
+            "Y2": landed.Y,
+            "Z2": landed.Z,
+        })
+
+    return grenades
+
+
+def merge_grenades(grenade_info: dict, map_name: str, grenades: dict):
+    """
+    Adds one demo's grenades to the grenades for every demo on the map
+
+    :param grenade_info: {map_name: {side: {buy: {player: [grenade]}}}}, updated in place
+    :param map_name: Name of the map the demo was played on
+    :param grenades: Grenades from extract_round_grenades
+    :return: Nothing
+    """
+    map_grenades = grenade_info.setdefault(map_name, {})
+
+    for side, buys in grenades.items():
+        for buy, players in buys.items():
+            for player, throws in players.items():
+                map_grenades.setdefault(side, {}).setdefault(buy, {}).setdefault(player, []).extend(throws)
+
+
+def merge_positions(position_info: dict, map_name: str, positions: PositionStore):
+    """
+    Adds one demo's positions to the positions for every demo on the map
+
+    :param position_info: {map_name: PositionStore}, updated in place
+    :param map_name: Name of the map the demo was played on
+    :param positions: PositionStore for the demo
+    :return: Nothing
+    """
+    if map_name not in position_info.keys():
+        position_info[map_name] = positions
+    else:
+        position_info[map_name].merge(positions)
+
+
+def get_map_tick_data(team_name: str, season: int = 13, parser_factory=None, download_workers: int = 4,
+                      extract_workers: int = 2, parse_workers: int = 2, queue_size: int = 2,
+                      manifest: DemoManifest = None, progress=None, track_store: TrackStore = None,
+                      sketch_store: SketchStore = None, round_dir: str = "rounds", grenade_info: dict = None,
+                      maps: list = None):
+    """
+    Downloads, extracts and parses every demo a team played in, and sorts the team's positions by map. The stages run
+    concurrently with bounded queues between them, so demos download while earlier ones are parsed.
+
+    :param team_name: Team name
+    :param season: CSC Season number
+    :param parser_factory: Function taking a demo file path and returning a parser, demoparser2.DemoParser by default
+    :param download_workers: Demos downloaded at once
+    :param extract_workers: Demos extracted at once
+    :param parse_workers: Demos parsed at once
+    :param queue_size: Demos that can wait between two stages
+    :param manifest: DemoManifest to record the map of every demo in, a DemoManifest at demo_manifest.json by default
+    :param progress: Optional function called with a status message after each demo is added
+    :param track_store: Optional TrackStore to save each demo's movement tracks in, if it doesn't have them yet
+    :param sketch_store: Optional SketchStore to save a Sketch of each demo in, if it doesn't have one yet
+    :param round_dir: Folder to keep each demo's RoundIndex in, as <round_dir>/<archive key>/<member>.rounds.json, or
+    None to build them every time. The demos themselves are only kept until they are parsed
+    :param grenade_info: Optional dictionary to fill with the team's grenades thrown in the first 12 seconds of each
+    round, as {map_name: {side: {buy: {player: [grenade]}}}}, see extract_round_grenades. Costs another pass over
+    each demo
+    :param maps: Only keep demos played on these maps, or None for every map. Archives the manifest has only seen
+    other maps in aren't downloaded, and members it has recorded on other maps aren't extracted or parsed
+    :return: {map_name: PositionStore}
+    """
+    if parser_factory is None:
+        from demoparser2 import DemoParser
+        parser_factory = DemoParser
+
+    if manifest is None:
+        manifest = DemoManifest()
+
+    client = get_demos_client()
+
+    files = get_team_demo_keys(client, season, team_name)
+
+    if maps is not None:
+        files = [key for key in files if not manifest.members(key) or manifest.maps(key) & set(maps)]
+
+    def wanted(key):
+        members = manifest.members(key)
+
+        return lambda member: maps is None or member not in members.keys() or members[member]["map_name"] in maps
+
+    position_info = {}
+    parsed = [0]
+
+    def download(key):
+        with metrics.timed("download"):
+            yield key, client.get_object(Bucket='cscdemos', Key=key)["Body"].read()
+
+    def extract(item):
+        key, demo = item
+
+        with metrics.timed("extract"), zipfile.ZipFile(io.BytesIO(demo)) as zipped:
+            yield from extract_demos(key, zipped, wanted(key))
 
-            positions = {
-                "TERRORIST": {
-                    "Pistol": {},
-                    "Full Eco": {},
-                    "Semi Eco": {},
-                    "Semi Buy": {},
-                    "Full Buy": {},
-                },
-                "CT": {
-                    "Pistol": {},
-                    "Full Eco": {},
-                    "Semi Eco": {},
-                    "Semi Buy": {},
-                    "Full Buy": {},
-                },
-            }
-
-            for _, row in tick_data.iterrows():
-                tick = row["tick"]
-
-                if freeze_time_end_ticks.index(tick) in [0, 12]:
-                    if row["name"] not in positions[row["team_name"]]["Pistol"].keys():
-                        positions[row["team_name"]]["Pistol"][row["name"]] = []
-
-                    positions[row["team_name"]]["Pistol"][row["name"]].append({"x": row["X"], "y": row["Y"], "z": row["Z"]})
-                    continue
-
-                buy_type = ""
-
-                if buy_types[row["team_name"]][row["tick"] - 12 * tick_rate] < 5000:
-                    buy_type = "Full Eco"
-                elif buy_types[row["team_name"]][row["tick"] - 12 * tick_rate] < 10000:
-                    buy_type = "Semi Eco"
-                elif buy_types[row["team_name"]][row["tick"] - 12 * tick_rate] < 20000:
-                    buy_type = "Semi Buy"
+    def parse(extracted):
+        with extracted:
+            parser = parser_factory(extracted.path)
+
+            with metrics.timed("parse"):
+                if round_dir is not None:
+                    rounds = load_index(os.path.join(round_dir, extracted.name), lambda: RoundIndex.from_parser(parser))
                 else:
-                    buy_type = "Full Buy"
+                    rounds = RoundIndex.from_parser(parser)
+
+            manifest.add(extracted.key, extracted.member, rounds.map_name, os.path.getsize(extracted.path),
+                         len(rounds))
+
+            if maps is not None and rounds.map_name not in maps:
+                return
+
+            if track_store is not None and not track_store.has(extracted.name):
+                track_store.save(extracted.name, extract_tracks(parser, rounds, team_name, extracted.name))
+
+            positions = extract_round_positions(parser, rounds, team_name, extracted.name)
+
+            if sketch_store is not None and not sketch_store.has(team_name, season, extracted.name):
+                from zones import get_zone_mask
+
+                sketch_store.save(team_name, season, Sketch.from_demo(team_name, extracted.name, rounds, positions,
+                                                                      get_zone_mask(rounds.map_name)))
+
+            grenades = None
+
+            if grenade_info is not None:
+                grenades = extract_round_grenades(parser, rounds, team_name)
+
+            yield rounds.map_name, positions, grenades
 
-                if row["name"] not in positions[row["team_name"]][buy_type].keys():
-                    positions[row["team_name"]][buy_type][row["name"]] = []
+    def aggregate(item):
+        map_name, positions, grenades = item
 
-                positions[row["team_name"]][buy_type][row["name"]].append({"x": row["X"], "y": row["Y"], "z": row["Z"]})
+        with metrics.timed("aggregate"):
+            merge_positions(position_info, map_name, positions)
 
-            if map_name not in position_info.keys():
-                position_info[map_name] = positions
-            else:
-                for side in positions.keys():
-                    for buy in positions[side].keys():
-                        for player in positions[side][buy].keys():
-                            if player not in position_info[map_name][side][buy].keys():
-                                position_info[map_name][side][buy][player] = positions[side][buy][player]
-                            else:
-                                position_info[map_name][side][buy][player] += positions[side][buy][player]
+            if grenades is not None:
+                merge_grenades(grenade_info, map_name, grenades)
+
+        parsed[0] += 1
+
+        if progress is not None:
+            progress(f"Parsed {parsed[0]} demo(s) from {len(files)} match(es)")
+
+        yield from ()
+
+    Pipeline([
+        Stage("download", download, download_workers),
+        Stage("extract", extract, extract_workers),
+        Stage("parse", parse, parse_workers, discard=ExtractedDemo.cleanup),
+        Stage("aggregate", aggregate),
+    ], queue_size).run(files)
 
     return position_info
 
-# map_position_info: {"t": {"Pistol": player_positions, "Full Eco": {}, "Semi Eco": {}, ...}, "ct": {}}
+
 def get_map_buy_pictures(
-        map_name: str, map_position_info: dict, players
+        map_name: str, map_position_info: PositionStore, players, grenades_info: dict = None,
+        image_dir: str = "./temp-images", fast: bool = False
 ):
     """
     Saves plots with player and grenade positions 12 seconds into every round for each buy type for each side
 
     :param map_name: Name of map
-    :param map_position_info: Dictionary with positions for each player on the given map 12 seconds into each round
-    :param grenades_info: Dictionary with grenade trajectories for grenades thrown in the first 12 seconds of every
-    round for the given team, on the given map
+    :param map_position_info: PositionStore with positions for each player on the given map 12 seconds into each round
     :param players: List of all players plotted so far. Used to keep colors on plots for players consistent
+    :param grenades_info: Optional dictionary of sides to buy types to grenades thrown by each player, drawn with
+    plot_grenades. Sides can be from SIDES or "t" and "ct" as from main.get_scouting_info
+    :param image_dir: Folder to save the plots and legend in
+    :param fast: Draw the plots straight onto a pre-rendered map with raster.render_panel, using matplotlib only for
+    the legend
     :return: Updated list of players plotted so far
     """
-    for side in map_position_info.keys():
-        for buy in map_position_info[side].keys():
+    if grenades_info is not None:
+        grenades_info = grenades_by_side(grenades_info)
+
+    if fast:
+        return get_map_buy_rasters(map_name, map_position_info, players, grenades_info, image_dir)
+
+    import matplotlib.pyplot as plt
+    from matplotlib import pylab
+
+    for side in SIDES:
+        for buy in BUY_TYPES:
+            grenades = None
+
+            if grenades_info is not None:
+                grenades = grenades_info.get(side, {}).get(buy)
+
             figure, axes, players = get_single_plot(
                 map_name,
-                map_position_info[side][buy],
+                map_position_info.by_player(side, buy),
                 players,
+                grenades,
             )
 
             plt.savefig(
-                "./temp-images/" + side + "_" + buy + ".png",
+                os.path.join(image_dir, side + "_" + buy + ".png"),
                 bbox_inches="tight",
                 dpi=300,
             )
@@ -259,7 +619,7 @@ def get_map_buy_pictures(
                 # pylab.figlegend(*axes.get_legend_handles_labels())
 
                 fig_legend.savefig(
-                    "./temp-images/legend.png", bbox_inches="tight", dpi=300
+                    os.path.join(image_dir, "legend.png"), bbox_inches="tight", dpi=300
                 )
                 plt.close()
 
@@ -268,17 +628,61 @@ def get_map_buy_pictures(
     return players
 
 
-# player positions: {player1: [{"x": 0, "y": 0, "z": 0}, ...], player2: [], ...}
+def get_map_buy_rasters(
+        map_name: str, map_position_info: PositionStore, players, grenades_info: dict = None,
+        image_dir: str = "./temp-images"
+):
+    """
+    Saves the same pictures as get_map_buy_pictures, composited with raster.render_panel instead of matplotlib. The
+    legend has every player on any of the map's plots
+
+    :param map_name: Name of map
+    :param map_position_info: PositionStore with positions for each player on the given map 12 seconds into each round
+    :param players: List of all players plotted so far. Used to keep colors on plots for players consistent
+    :param grenades_info: Optional dictionary of sides to buy types to grenades thrown by each player, see
+    get_map_buy_pictures
+    :param image_dir: Folder to save the plots and legend in
+    :return: Updated list of players plotted so far
+    """
+    import raster
+
+    if grenades_info is not None:
+        grenades_info = grenades_by_side(grenades_info)
+
+    plotted = []
+
+    for side in SIDES:
+        for buy in BUY_TYPES:
+            grenades = None
+
+            if grenades_info is not None:
+                grenades = grenades_info.get(side, {}).get(buy)
+
+            player_positions = map_position_info.by_player(side, buy)
+
+            with metrics.timed("render.panel"):
+                image, players = raster.render_panel(map_name, player_positions, players, grenades)
+                raster.save_panel(image, os.path.join(image_dir, side + "_" + buy + ".png"))
+
+            plotted += [player for player in player_positions.keys() if player not in plotted]
+
+    with metrics.timed("render.legend"):
+        raster.save_legend(players, plotted, os.path.join(image_dir, "legend.png"))
+
+    return players
+
+
+# player positions: {player1: (x_array, y_array, z_array), player2: (...), ...}
 def get_single_plot(
-        map_name: str, player_positions: dict, players: list
+        map_name: str, player_positions: dict, players: list, grenades: dict = None
 ):
     """
     Creates and saves a plot with player positions and grenade trajectories
 
     :param map_name: Name of map
-    :param player_positions: Dictionary with a list of positions for each player
-    # :param grenades: Dictionary with a list of grenades thrown for each player
+    :param player_positions: Dictionary with X, Y and Z coordinate arrays for each player
     :param players: List of players plotted so far. Used to keep colors on plots for players consistent
+    :param grenades: Optional dictionary with a list of grenades thrown for each player
     :return: The figure and axes for the plot, and an updated list of plotted players
     """
     figure, axes = plot_map(map_name=map_name)
@@ -286,7 +690,7 @@ def get_single_plot(
     total_dots = 0
 
     for key in player_positions.keys():
-        total_dots += len(player_positions[key])
+        total_dots += len(player_positions[key][0])
 
     if map_name in ("de_vertigo", "de_nuke"):
         if total_dots > 50:
@@ -299,69 +703,23 @@ def get_single_plot(
         else:
             dot_size = 40
 
-    # for player in grenades.keys():
-    #     if player not in players:
-    #         players.append(player)
-    #     for grenade in grenades[player]:
-    #         if grenade["type"] == "Decoy Grenade":
-    #             continue
-    #
-    #         if map_name not in ("de_vertigo", "de_nuke"):
-    #             x1, y1, z1 = position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z1"])
-    #             )
-    #             x2, y2, z2 = position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #         elif map_name == "de_vertigo":
-    #             # Don't plot a grenade that went off the map
-    #             if grenade["Z2"] < 10000:
-    #                 continue
-    #
-    #             x1, y1, z1 = position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z2"])
-    #             )
-    #             x2, y2, z2 = position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #         else:
-    #             x1, y1, z1 = position_transform_all(
-    #                 map_name, (grenade["X1"], grenade["Y1"], grenade["Z2"])
-    #             )
-    #             x2, y2, z2 = position_transform_all(
-    #                 map_name, (grenade["X2"], grenade["Y2"], grenade["Z2"])
-    #             )
-    #
-    #         # From awpy.visualization.plot.plot_nades()
-    #         g_color = {
-    #             "Incendiary Grenade": "red",
-    #             "Molotov": "red",
-    #             "Smoke Grenade": "gray",
-    #             "HE Grenade": "green",
-    #             "Flashbang": "gold",
-    #         }[grenade["type"]]
-    #
-    #         axes.plot(
-    #             [x1, x2], [y1, y2], color=("C" + str(players.index(player))), alpha=0.1
-    #         )
-    #         axes.scatter(x2, y2, color=g_color, s=dot_size, alpha=0.6, marker="x")
+    if grenades:
+        players = plot_grenades(axes, map_name, grenades, players, dot_size)
 
     for player in player_positions.keys():
         if player not in players:
             players.append(player)
-        for position in player_positions[player]:
-            x, y, z = position_transform_all(
-                map_name, (position["x"], position["y"], position["z"])
-            )
 
-            axes.scatter(
-                x,
-                y,
-                color=("C" + str(players.index(player))),
-                label=player,
-                s=dot_size,
-                zorder=100,
-            )
+        x, y, z = position_transform_array(map_name, *player_positions[player])
+
+        axes.scatter(
+            x,
+            y,
+            color=("C" + str(players.index(player))),
+            label=player,
+            s=dot_size,
+            zorder=100,
+        )
 
     axes.get_xaxis().set_visible(b=False)
     axes.get_yaxis().set_visible(b=False)
@@ -370,7 +728,8 @@ def get_single_plot(
 
     return figure, axes, players
 
-def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file: str):
+
+def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file: str, legend: str = None):
     """
     Creates a pdf based on a html template, and list of map images
 
@@ -379,19 +738,26 @@ def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file:
     :param opponents: List of opponents team has played on map
     :param images: List of file paths to images for the pdf
     :param output_file: File path for pdf output
+    :param legend: File path to the legend image, temp-images/legend.png by default
     :return: Nothing
     """
+    import jinja2
+    import pdfkit
+
     template_loader = jinja2.FileSystemLoader("./")
     template_env = jinja2.Environment(loader=template_loader)
 
     path = str(pathlib.Path(__file__).parent.resolve())
 
+    if legend is None:
+        legend = path + "/temp-images/legend.png"
+
     context = {
                   "Team": team,
                   "Map": map_name,
                   "Opponents": opponents,
                   "Date": datetime.datetime.now().date,
-                  "Legend": (path + "/temp-images/legend.png"),
+                  "Legend": legend,
               } | images
 
     template = template_env.get_template("map-template.html")
@@ -418,46 +784,102 @@ def to_pdf(team: str, map_name: str, opponents: str, images: dict, output_file:
     )
 
 
-def get_all_demos_tick_data(season: int, team: str):
-    team = team.replace(" ", "")
+def buy_images(image_dir: str):
+    """
+    :param image_dir: Folder get_map_buy_pictures saved the plots in
+    :return: Dictionary of map-template.html image names to the plots' absolute file paths
+    """
+    image_dir = str(pathlib.Path(image_dir).resolve())
 
-    session = boto3.session.Session()
-    client = session.client(
-        's3',
-        region_name='nyc3',
-        endpoint_url='https://nyc3.digitaloceanspaces.com',
-        config=Config(signature_version=UNSIGNED)
-    )
+    images = {}
 
-    # Get a list of all the relevant demos
-    response = client.list_objects(Bucket='cscdemos', Prefix='s13/', Delimiter='/')
+    for side, prefix in (("TERRORIST", "t_"), ("CT", "ct_")):
+        for buy in BUY_TYPES:
+            images[prefix + buy.replace(" ", "")] = os.path.join(image_dir, side + "_" + buy + ".png")
 
-    files = []
+    return images
 
-    for prefix in response["CommonPrefixes"]:
-        if "Combine" not in prefix["Prefix"] and "P" not in prefix["Prefix"]:
 
-            response = client.list_objects(Bucket='cscdemos', Prefix=prefix["Prefix"])
+def build_scouting_report(team: str, season: int, output_file: str, work_dir: str = None, progress=None,
+                          fast: bool = True, grenades: bool = True, **kwargs):
+    """
+    Builds a team's scouting report pdf from every demo they played in a season. Plots and per map pdfs go in their own
+    folder, so several reports can be built at once.
+
+    :param team: Team name
+    :param season: CSC Season number
+    :param output_file: File path for the merged pdf
+    :param work_dir: Folder for the plots and per map pdfs, a new temp folder (removed afterwards) by default
+    :param progress: Optional function called with a status message as the report is built
+    :param fast: Render the plots with raster.render_panel instead of matplotlib, see get_map_buy_pictures
+    :param grenades: Draw the utility the team threw in the first 12 seconds of each round
+    :param kwargs: Passed on to get_map_tick_data
+    :return: The output file path
+    """
+    import shutil
+    import tempfile
 
-            for file in response["Contents"]:
-                if team in file["Key"]:
-                    files.append(file["Key"])
+    import pypdf
+
+    def report(message: str):
+        if progress is not None:
+            progress(message)
+
+    temp_dir = None
+
+    if work_dir is None:
+        work_dir = temp_dir = tempfile.mkdtemp(prefix="report-")
+
+    try:
+        report("Downloading demos")
+        grenade_info = {} if grenades else None
+        position_info = get_map_tick_data(team, season, progress=progress, grenade_info=grenade_info, **kwargs)
 
-    demo = client.get_object(Bucket='cscdemos', Key=files[0])["Body"].read()
+        if not position_info:
+            raise Exception(f"No demos found for {team} in season {season}")
 
-    zip_file = zipfile.ZipFile(io.BytesIO(demo))
+        images = buy_images(work_dir)
+        legend = os.path.join(str(pathlib.Path(work_dir).resolve()), "legend.png")
 
-    filename = "tempdemo.dem"
+        merger = pypdf.PdfMerger()
+        players = []
 
-    with (
-        zipfile.ZipFile(io.BytesIO(demo)) as zipped,
-        open(filename, "wb") as output,
-    ):
-        with zipped.open(zipped.filelist[0]) as f:
-            output.write(f.read())
+        for i, m in enumerate(position_info.keys()):
+            report(f"Rendering {m} ({i + 1}/{len(position_info)})")
+
+            with metrics.timed("render"):
+                players = get_map_buy_pictures(m, position_info[m], players,
+                                               grenade_info.get(m) if grenade_info is not None else None,
+                                               image_dir=work_dir, fast=fast)
+
+            with metrics.timed("pdf"):
+                to_pdf(team, m, "Opponents go here", images, os.path.join(work_dir, m + ".pdf"), legend)
+
+            merger.append(os.path.join(work_dir, m + ".pdf"))
+
+        merger.write(output_file)
+        merger.close()
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return output_file
+
+
+def get_all_demos_tick_data(season: int, team: str):
+    """
+    Gets a team's positions from every demo they played in a season
+
+    :param season: CSC Season number
+    :param team: Team name
+    :return: {map_name: PositionStore}, see get_map_tick_data
+    """
+    return get_map_tick_data(team, season)
 
 
 def plot_tick_data(tick_data, map_name):
+    import matplotlib.pyplot as plt
+
     total_dots = 0
 
     if map_name in ("de_vertigo", "de_nuke"):
@@ -496,36 +918,17 @@ def plot_tick_data(tick_data, map_name):
 
 
 if __name__ == "__main__":
-    team = "The Watchers"
-
-    position_info = get_map_tick_data(team)
+    import profiling
 
-    merger = pypdf.PdfMerger()
+    metrics_enabled = metrics.enable_from_env()
+    profiling_enabled = profiling.enable_from_env()
 
-    path = str(pathlib.Path(__file__).parent.resolve())
-
-    images = {
-        "t_Pistol": path + "/temp-images/TERRORIST_Pistol.png",
-        "t_FullEco": path + "/temp-images/TERRORIST_Full Eco.png",
-        "t_SemiEco": path + "/temp-images/TERRORIST_Semi Eco.png",
-        "t_SemiBuy": path + "/temp-images/TERRORIST_Semi Buy.png",
-        "t_FullBuy": path + "/temp-images/TERRORIST_Full Buy.png",
-        "ct_Pistol": path + "/temp-images/CT_Pistol.png",
-        "ct_FullEco": path + "/temp-images/CT_Full Eco.png",
-        "ct_SemiEco": path + "/temp-images/CT_Semi Eco.png",
-        "ct_SemiBuy": path + "/temp-images/CT_Semi Buy.png",
-        "ct_FullBuy": path + "/temp-images/CT_Full Buy.png",
-    }
-
-    players = []
-
-    for m in position_info.keys():
-        players = get_map_buy_pictures(m, position_info[m], players)
-
-        to_pdf(team, m, "Opponents go here", images, "./temp-pdfs/" + m + ".pdf")
+    team = "The Watchers"
 
-        merger.append("./temp-pdfs/" + m + ".pdf")
+    build_scouting_report(team, 13, "output/Scouting.pdf", work_dir="temp-images")
 
-    merger.write("output/Scouting.pdf")
-    merger.close()
+    if metrics_enabled:
+        print(metrics.summary())
 
+    if profiling_enabled:
+        print(profiling.summary())
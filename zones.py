@@ -0,0 +1,206 @@
+import functools
+import json
+import os
+
+import numpy as np
+
+from positions import BUY_TYPES, SIDES, PositionStore
+
+
+# Rough, hand traced de_mirage callouts for trying zones out. Reports only use zones from the file in ZONE_DATA, so
+# nothing is reported from the sample unless it's configured on purpose
+SAMPLE_ZONE_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zone_data.sample.json")
+
+# Radar pixels per zone mask cell, must divide the 1024 pixel radar. At 1 a cell is one radar pixel, 3.5 to 7 game
+# units on the current maps
+CELL_SIZE = 1
+
+# Code of positions that aren't in any zone
+NO_ZONE = 0
+
+
+def load_zone_data(path: str = SAMPLE_ZONE_DATA_PATH):
+    """
+    Loads zone definitions. Each map has named zones, each a polygon of game X and Y coordinates (as from getpos) and,
+    on maps with a lower level, the level it is on:
+
+    {"de_nuke": {"Ramp": {"points": [[x, y], ...], "level": "lower"}, ...}, ...}
+
+    :param path: File path to the zone json
+    :return: Dictionary of map names to zone names to zones
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+class ZoneMask:
+    """
+    Named zones of one map rasterized into an integer mask aligned with the radar image, so zones are assigned to
+    arrays of positions with one index operation instead of a point in polygon test per point. Zones listed later are
+    drawn over earlier ones, so list large areas before the smaller ones inside them.
+    """
+
+    def __init__(self, map_name: str, names: list, mask, cell_size: int = CELL_SIZE):
+        """
+        :param map_name: Name of the map
+        :param names: Zone names, indexed by zone code. Code NO_ZONE is None
+        :param mask: Array of zone codes, one per cell of the radar image
+        :param cell_size: Radar pixels per cell, must divide 1024 so the lower level starts on a row of cells
+        """
+        if 1024 % cell_size != 0:
+            raise ValueError(f"Zone mask cell size must divide 1024, got {cell_size}")
+
+        self.map_name = map_name
+        self.names = names
+        self.mask = mask
+        self.cell_size = cell_size
+
+    @classmethod
+    def from_zones(cls, map_name: str, zones: dict, cell_size: int = CELL_SIZE):
+        """
+        Rasterizes zones by testing the game coordinates of the center of every cell inside each zone's bounds
+
+        :param map_name: Name of the map
+        :param zones: Dictionary of zone names to zones, see load_zone_data
+        :param cell_size: Radar pixels per cell, must divide 1024
+        :return: ZoneMask
+        """
+        if 1024 % cell_size != 0:
+            raise ValueError(f"Zone mask cell size must divide 1024, got {cell_size}")
+
+        import shapely
+
+        from visualization import MAP_DATA
+
+        current_map_data = MAP_DATA[map_name]
+        scale = current_map_data["scale"]
+        levels = 2 if "z_cutoff" in current_map_data else 1
+
+        size = 1024 // cell_size
+        mask = np.full((size * levels, size), NO_ZONE, dtype=np.uint8 if len(zones) < 255 else np.uint16)
+        names = [None]
+
+        for name, zone in zones.items():
+            polygon = shapely.Polygon(zone["points"])
+            names.append(name)
+
+            # Radar pixel bounds of the polygon, as cell indexes
+            min_x, min_y, max_x, max_y = polygon.bounds
+            first_column = max(int((min_x - current_map_data["pos_x"]) / scale // cell_size), 0)
+            last_column = min(int((max_x - current_map_data["pos_x"]) / scale // cell_size) + 1, size)
+            first_row = max(int((current_map_data["pos_y"] - max_y) / scale // cell_size), 0)
+            last_row = min(int((current_map_data["pos_y"] - min_y) / scale // cell_size) + 1, size)
+
+            if first_column >= last_column or first_row >= last_row:
+                continue
+
+            rows, columns = np.mgrid[first_row:last_row, first_column:last_column]
+            x = current_map_data["pos_x"] + (columns + 0.5) * cell_size * scale
+            y = current_map_data["pos_y"] - (rows + 0.5) * cell_size * scale
+
+            inside = shapely.contains_xy(polygon, x, y)
+
+            if zone.get("level", "upper") == "lower" and levels == 2:
+                rows = rows + size
+
+            mask[rows[inside], columns[inside]] = len(names) - 1
+
+        return cls(map_name, names, mask, cell_size)
+
+    def lookup(self, x, y, z):
+        """
+        :param x: Array of game X coordinates
+        :param y: Array of game Y coordinates
+        :param z: Array of game Z coordinates, used to pick the level on maps with a lower level
+        :return: Array of zone codes, indexes into names
+        """
+        from visualization import position_transform_array
+
+        radar_x, radar_y, _ = position_transform_array(self.map_name, x, y, z)
+
+        columns = np.floor(radar_x / self.cell_size).astype(np.int64)
+        rows = np.floor(radar_y / self.cell_size).astype(np.int64)
+
+        inside = (rows >= 0) & (rows < self.mask.shape[0]) & (columns >= 0) & (columns < self.mask.shape[1])
+
+        codes = np.full(len(columns), NO_ZONE, dtype=self.mask.dtype)
+        codes[inside] = self.mask[rows[inside], columns[inside]]
+
+        return codes
+
+    def zone_names(self, codes):
+        """
+        :param codes: Array of zone codes
+        :return: Array of zone names, None where there was no zone
+        """
+        return np.array(self.names, dtype=object)[codes]
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone_mask(map_name: str, path: str = None, cell_size: int = CELL_SIZE):
+    """
+    Rasterizes a map's zones once and keeps the mask
+
+    :param map_name: Name of the map
+    :param path: File path to the zone json, the ZONE_DATA environment variable by default
+    :param cell_size: Radar pixels per cell
+    :return: ZoneMask, or None if no zone json is configured or the map has no zones in it
+    """
+    if path is None:
+        path = os.getenv("ZONE_DATA")
+
+    if path is None:
+        return None
+
+    zones = load_zone_data(path).get(map_name)
+
+    if not zones:
+        return None
+
+    return ZoneMask.from_zones(map_name, zones, cell_size)
+
+
+def zone_frequencies(store: PositionStore, zones: ZoneMask, side: str = None, buy: str = None):
+    """
+    Finds how often each player was in each zone, as a share of the rounds they were seen in. A round counts for a
+    zone if any of the player's positions in it were in the zone
+
+    :param store: PositionStore for the map
+    :param zones: ZoneMask for the map
+    :param side: Side name to select, or None for every side
+    :param buy: Buy type to select, or None for every buy type
+    :return: {player: {zone: share of rounds}}, zones sorted from most to least common, without positions outside
+    every zone
+    """
+    mask = store.mask(side, buy)
+
+    player = store.player[mask].astype(np.int64)
+    rounds = store.demo[mask].astype(np.int64) * (np.iinfo(np.int16).max + 1) + store.round[mask]
+    codes = zones.lookup(store.x[mask], store.y[mask], store.z[mask]).astype(np.int64)
+
+    # Distinct rounds per player, and distinct (player, zone, round) visits
+    player_rounds = np.unique(np.column_stack((player, rounds)), axis=0)
+    round_counts = np.bincount(player_rounds[:, 0], minlength=len(store.players))
+
+    visits = np.unique(np.column_stack((player, codes, rounds)), axis=0)
+    visits = visits[visits[:, 1] != NO_ZONE]
+    pairs, counts = np.unique(visits[:, :2], axis=0, return_counts=True)
+
+    frequencies = {}
+
+    for (code, zone), count in zip(pairs, counts):
+        frequencies.setdefault(store.players[code], {})[zones.names[zone]] = float(count / round_counts[code])
+
+    return {
+        player: dict(sorted(shares.items(), key=lambda item: item[1], reverse=True))
+        for player, shares in frequencies.items()
+    }
+
+
+def zone_tables(store: PositionStore, zones: ZoneMask):
+    """
+    :param store: PositionStore for the map
+    :param zones: ZoneMask for the map
+    :return: {side: {buy: {player: {zone: share of rounds}}}}, see zone_frequencies
+    """
+    return {side: {buy: zone_frequencies(store, zones, side, buy) for buy in BUY_TYPES} for side in SIDES}